@@ -0,0 +1,92 @@
+import click
+from flask.cli import with_appcontext
+from utils import timelines
+from utils.counters import reconciliar_contadores as reconciliar
+from utils import activity_log
+from utils import likes
+from utils import catalogo
+from utils import crawler
+
+
+@click.command('reconstruir-timelines')
+@click.option('--usuario', type=int, default=None, help='Reconstruye solo el timeline de este usuario.')
+@with_appcontext
+def reconstruir_timelines(usuario):
+    """Rellena los timelines del feed en Redis a partir de Postgres."""
+    if usuario is not None:
+        timelines.reconstruir(usuario)
+        click.echo(f"Timeline del usuario {usuario} reconstruido")
+    else:
+        total = timelines.reconstruir_todos()
+        click.echo(f"{total} timelines reconstruidos")
+
+
+@click.command('reconciliar-contadores')
+@with_appcontext
+def reconciliar_contadores():
+    """Recalcula los contadores de likes, comentarios y guardados de las publicaciones."""
+    for columna, filas in reconciliar().items():
+        click.echo(f"{columna}: {filas} publicaciones corregidas")
+
+
+@click.command('reenviar-actividad')
+@with_appcontext
+def reenviar_actividad():
+    """Reenvía a MongoDB los logs de actividad derramados a disco."""
+    total = activity_log.reenviar_derramados()
+    click.echo(f"{total} eventos reenviados")
+
+
+@click.command('volcar-likes')
+@with_appcontext
+def volcar_likes():
+    """Vuelca a Postgres los likes acumulados en Redis (modo LIKES_BUFFERED)."""
+    total = likes.volcar()
+    click.echo(f"Likes de {total} publicaciones volcados")
+
+
+@click.command('importar-catalogo')
+@click.option('--zalando', default=catalogo.EXPORTS['Zalando'], help='CSV o Excel exportado por ZalandoScraper.')
+@click.option('--shein', default=catalogo.EXPORTS['Shein'], help='CSV o Excel exportado por SheinScraper.')
+@with_appcontext
+def importar_catalogo(zalando, shein):
+    """Carga en el catálogo local los productos exportados por los scrapers."""
+    total = catalogo.importar_exports({'Zalando': zalando, 'Shein': shein})
+    click.echo(f"{total} productos importados")
+
+
+@click.command('rastrear-catalogo')
+@click.argument('tienda', type=click.Choice(['zalando', 'shein']))
+@click.option('--salida', default=None, help='CSV de destino (por defecto, el que lee importar-catalogo).')
+@click.option('--categoria', multiple=True, help='Categoría (solo Zalando); repetible.')
+@click.option('--palabra', multiple=True, help='Palabra clave; repetible.')
+@click.option('--paginas', type=int, default=10, help='Máximo de páginas por búsqueda.')
+@click.option('--tam-pagina', type=int, default=60)
+@click.option('--hilos', type=int, default=4)
+@click.option('--rps', type=float, default=2.0, help='Peticiones por segundo en total.')
+@click.option('--reintentos', type=int, default=4)
+@click.option('--url', default=None, help='URL alternativa del catálogo (p. ej. un servidor local de pruebas).')
+def rastrear_catalogo(tienda, salida, categoria, palabra, paginas, tam_pagina, hilos, rps, reintentos, url):
+    """Rastrea el catálogo de Zalando o Shein y añade los productos nuevos al CSV."""
+    total = crawler.rastrear(
+        tienda,
+        salida or crawler.SALIDAS[tienda],
+        list(categoria) if tienda == 'zalando' else [],
+        list(palabra),
+        max_paginas=paginas,
+        tam_pagina=tam_pagina,
+        hilos=hilos,
+        por_segundo=rps,
+        reintentos=reintentos,
+        url=url
+    )
+    click.echo(f"{total} productos nuevos guardados")
+
+
+def register_commands(app):
+    app.cli.add_command(reconstruir_timelines)
+    app.cli.add_command(reconciliar_contadores)
+    app.cli.add_command(reenviar_actividad)
+    app.cli.add_command(volcar_likes)
+    app.cli.add_command(importar_catalogo)
+    app.cli.add_command(rastrear_catalogo)
@@ -31,10 +31,22 @@ class BaseConfig:
     TEMP_UPLOAD_FOLDER = os.path.join(os.getcwd(), 'app', 'static', 'temp_uploads')
     BASE_URL = os.getenv("BASE_URL", "http://localhost:5000")
 
+    # Envío de imágenes: '' (Flask), 'nginx' (X-Accel-Redirect) o 'sendfile' (X-Sendfile)
+    STATIC_SENDFILE_MODE = os.getenv("STATIC_SENDFILE_MODE", "")
+    STATIC_ACCEL_PREFIX = os.getenv("STATIC_ACCEL_PREFIX", "/protected")
+    USE_X_SENDFILE = STATIC_SENDFILE_MODE == "sendfile"
+
     # Create upload directories if they don't exist
     for folder in [UPLOAD_FOLDER, PROFILE_IMAGE_FOLDER, TEMP_UPLOAD_FOLDER]:
         os.makedirs(folder, exist_ok=True)
 
+    # Cola de mensajes de Socket.IO (p. ej. redis://localhost:6379/0) para
+    # repartir las salas entre varios workers; sin ella todo va en un proceso
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+
+    # Token para /api/metricas (cabecera X-Metrics-Token); sin él la ruta no existe
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
     # Flask-Mail settings
     MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
     MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
@@ -80,6 +80,10 @@ class Seguimiento(db.Model):
     seguidor = db.relationship('User', foreign_keys=[id_seguidor], backref='seguidos')
     seguido = db.relationship('User', foreign_keys=[id_seguido], backref='seguidores')
 
+    __table_args__ = (
+        db.Index('ix_seguimientos_seguido_estado', 'id_seguido', 'estado'),
+    )
+
 class Post(db.Model):
     __tablename__ = 'publicaciones'
 
@@ -90,11 +94,20 @@ class Post(db.Model):
     fecha_publicacion = db.Column(db.DateTime(timezone=True), default=func.now())
     visibilidad = db.Column(db.String(20), nullable=False, default='publico')
 
+    # Contadores desnormalizados (se mantienen en la misma transacción que el cambio)
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comentarios_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    guardados_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     usuario = db.relationship('User', backref='publicaciones')
 
     #Relación con los likes
     likes = db.relationship('Like', backref='post', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_publicaciones_usuario_fecha', 'id_usuario', 'fecha_publicacion', 'id'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -104,7 +117,7 @@ class Post(db.Model):
             "usuario": self.usuario.username,
             "foto_perfil": f"{current_app.config['BASE_URL']}{self.usuario.foto_perfil}" if self.usuario.foto_perfil else None,
             "ha_dado_like": False,
-            "likes_count": len(self.likes),
+            "likes_count": self.likes_count,
             "tipo_relacion": "",
             "guardado": False,
             "id_usuario": self.id_usuario
@@ -172,6 +185,10 @@ class Comentario(db.Model):
     usuario = db.relationship('User', backref='comentarios')
     publicacion = db.relationship('Post', backref='comentarios')
 
+    __table_args__ = (
+        db.Index('ix_comentarios_publicacion_fecha', 'id_publicacion', 'fecha_comentario', 'id'),
+    )
+
 
 class Like(db.Model):
     __tablename__ = 'likes'
@@ -196,6 +213,9 @@ class MensajeIndividual(db.Model):
     mensaje = db.Column(db.Text, nullable=True)
     id_publicacion = db.Column(db.Integer, db.ForeignKey('publicaciones.id'), nullable=True)
     fecha_envio = db.Column(db.DateTime, default=datetime.utcnow)
+    # Confirmaciones del receptor (se aplican por lotes)
+    fecha_entrega = db.Column(db.DateTime, nullable=True)
+    fecha_lectura = db.Column(db.DateTime, nullable=True)
 
     # Relaciones opcionales
     emisor = db.relationship('User', foreign_keys=[id_emisor], backref='mensajes_enviados')
@@ -210,11 +230,46 @@ class MensajeIndividual(db.Model):
             "mensaje": self.mensaje,
             "id_publicacion": self.id_publicacion,
             "fecha_envio": self.fecha_envio.isoformat() if self.fecha_envio else None,
+            "fecha_entrega": self.fecha_entrega.isoformat() if self.fecha_entrega else None,
+            "fecha_lectura": self.fecha_lectura.isoformat() if self.fecha_lectura else None,
             "publicacion": self.publicacion.to_dict() if self.publicacion else None
 
         }
 
 
+# Ambos sentidos de una conversación comparten la clave (least, greatest)
+db.Index(
+    'ix_mensajes_individuales_conversacion',
+    func.least(MensajeIndividual.id_emisor, MensajeIndividual.id_receptor),
+    func.greatest(MensajeIndividual.id_emisor, MensajeIndividual.id_receptor),
+    MensajeIndividual.fecha_envio
+)
+
+
+class Conversacion(db.Model):
+    """
+    Resumen de cada conversación directa para la bandeja de entrada. El par
+    se guarda ordenado (id_usuario_a < id_usuario_b) y se actualiza en la
+    misma transacción que el mensaje.
+    """
+    __tablename__ = 'conversaciones'
+
+    id_usuario_a = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), primary_key=True)
+    id_usuario_b = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), primary_key=True)
+    id_ultimo_mensaje = db.Column(db.Integer, db.ForeignKey('mensajes_individuales.id', ondelete='SET NULL'), nullable=True)
+    id_emisor_ultimo = db.Column(db.Integer, nullable=True)
+    ultimo_mensaje = db.Column(db.String(200), nullable=True)
+    fecha_ultimo_mensaje = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    no_leidos_a = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    no_leidos_b = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.CheckConstraint('id_usuario_a < id_usuario_b', name='ck_conversaciones_par_ordenado'),
+        db.Index('ix_conversaciones_a_fecha', 'id_usuario_a', 'fecha_ultimo_mensaje'),
+        db.Index('ix_conversaciones_b_fecha', 'id_usuario_b', 'fecha_ultimo_mensaje'),
+    )
+
+
 class MensajeGrupo(db.Model):
     __tablename__ = 'mensajes_grupo'
 
@@ -229,16 +284,23 @@ class MensajeGrupo(db.Model):
     usuario = db.relationship('User', backref='mensajes_grupo')
     publicacion = db.relationship('Post')
 
-    def to_dict(self):
-        return {
+    __table_args__ = (
+        db.Index('ix_mensajes_grupo_grupo_fecha', 'id_grupo', 'fecha_envio', 'id'),
+    )
+
+    def to_dict(self, incluir_autor=True):
+        datos = {
             'id': self.id,
             'id_grupo': self.id_grupo,
             'id_usuario': self.id_usuario,
             'mensaje': self.mensaje,
             'fecha_envio': self.fecha_envio.isoformat(),
-            'autor': self.usuario.username if self.usuario else "Anónimo",
             'publicacion': self.publicacion.to_dict() if self.publicacion else None
         }
+        # En el historial paginado los autores van en una tabla aparte
+        if incluir_autor:
+            datos['autor'] = self.usuario.username if self.usuario else "Anónimo"
+        return datos
 
 
 class Favorito(db.Model):
@@ -326,6 +388,8 @@ class Prenda(db.Model):
     solicitable = db.Column(db.Boolean, default=False)
     tipo = db.Column(PgEnum(TipoPrendaEnum, name='tipo_prenda_enum'), nullable=False, default=TipoPrendaEnum.Otro)
     emocion = db.Column(PgEnum(EmocionEnum, name='emocion_enum'), nullable=True)
+    # 'procesando' mientras se elimina el fondo en segundo plano, 'listo' o 'error'
+    estado_imagen = db.Column(db.String(20), nullable=False, default='listo', server_default='listo')
 
     usuario = db.relationship('User', backref='prendas')
 
@@ -343,8 +407,8 @@ class Prenda(db.Model):
             'fecha_modificacion': self.fecha_modificacion.isoformat() if self.fecha_modificacion else None,
             'solicitable': self.solicitable,
             'tipo': self.tipo.value if self.tipo else None,
-            'emocion': self.emocion.value if self.emocion else None
-
+            'emocion': self.emocion.value if self.emocion else None,
+            'estado_imagen': self.estado_imagen
         }
 
 class Categoria(db.Model):
@@ -390,6 +454,10 @@ class SolicitudPrenda(db.Model):
     fecha_inicio = db.Column(db.DateTime)
     fecha_fin = db.Column(db.DateTime)
 
+    __table_args__ = (
+        db.Index('ix_solicitudes_prenda_prenda_estado', 'id_prenda', 'estado'),
+    )
+
 
 class CaracteristicasPublicacion(db.Model):
     __tablename__ = 'caracteristicas_publicacion'
@@ -405,3 +473,45 @@ class CaracteristicasPublicacion(db.Model):
 
     publicacion = db.relationship("Post", backref=db.backref("caracteristicas", uselist=False, cascade="all, delete-orphan"))
 
+
+class Blob(db.Model):
+    """Fichero subido, direccionado por su sha256 y con contador de referencias."""
+    __tablename__ = 'blobs'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    extension = db.Column(db.String(10), nullable=False)
+    tamano = db.Column(db.Integer, nullable=False)
+    referencias = db.Column(db.Integer, nullable=False, default=0)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ProductoCatalogo(db.Model):
+    """Producto de tienda importado de los exports de los scrapers (Zalando, Shein)."""
+    __tablename__ = 'productos_catalogo'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tienda = db.Column(db.String(30), nullable=False)
+    nombre = db.Column(db.String(300), nullable=False)
+    precio = db.Column(db.Numeric(10, 2))
+    precio_texto = db.Column(db.String(50))
+    imagen = db.Column(db.Text)
+    enlace = db.Column(db.Text, unique=True, nullable=False)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        # Mismo formato que los resultados de SerpApi en /api/search-prendas
+        return {
+            "store": self.tienda,
+            "product": self.nombre,
+            "price": self.precio_texto or (f"{self.precio} €" if self.precio is not None else "0 €"),
+            "imagen": self.imagen or "",
+            "link": self.enlace
+        }
+
+
+# Índice invertido de los nombres de producto para la búsqueda de texto
+db.Index(
+    'ix_productos_catalogo_nombre',
+    func.to_tsvector('simple', ProductoCatalogo.nombre),
+    postgresql_using='gin'
+)
@@ -10,8 +10,10 @@ from flask_jwt_extended import (
 from flask_mail import Message
 from datetime import timedelta, datetime
 from models import User
-from extensions import db, mail, logs_collection
+from extensions import db, mail
+from utils.activity_log import log_event
 from utils.helpers import is_strong_password, is_valid_email
+from utils import search
 import secrets
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -85,13 +87,12 @@ def register():
 
     db.session.add(nuevo_usuario)
     db.session.commit()
+    search.invalidar_indices()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "registro",
-            "usuario": email,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "registro",
+        usuario=email
+    )
 
     enviar_email_verificacion(nuevo_usuario)
 
@@ -124,13 +125,11 @@ def verify_email_mobile():
         db.session.commit()
 
         # Log de verificación
-        if logs_collection is not None:
-            logs_collection.insert_one({
-                "evento": "verificacion_email",
-                "usuario_id": user.id,
-                "email": user.email,
-                "timestamp": datetime.utcnow()
-            })
+        log_event(
+            "verificacion_email",
+            usuario_id=user.id,
+            email=user.email
+        )
 
         return jsonify({'message': 'Cuenta verificada correctamente'}), 200
 
@@ -153,37 +152,31 @@ def login():
 
     if not user or not check_password_hash(user.contraseña, password):
         # Log de intento fallido
-        if logs_collection is not None:
-            logs_collection.insert_one({
-                "evento": "login_fallido",
-                "usuario": email,
-                "motivo": "Credenciales inválidas",
-                "timestamp": datetime.utcnow()
-            })
+        log_event(
+            "login_fallido",
+            usuario=email,
+            motivo="Credenciales inválidas"
+        )
         return jsonify({"error": "Credenciales inválidas"}), 401
 
     if not user.verificado:
         # Log de intento fallido por cuenta no verificada
-        if logs_collection is not None:
-            logs_collection.insert_one({
-                "evento": "login_fallido",
-                "usuario": email,
-                "motivo": "Cuenta no verificada",
-                "timestamp": datetime.utcnow()
-            })
+        log_event(
+            "login_fallido",
+            usuario=email,
+            motivo="Cuenta no verificada"
+        )
         return jsonify({"error": "Tu cuenta no ha sido verificada. Revisa tu correo."}), 403
 
     access_token = create_access_token(identity=str(user.id))
     refresh_token = create_refresh_token(identity=str(user.id))
 
     # Log de login exitoso
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "login_exitoso",
-            "usuario": email,
-            "usuario_id": user.id,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "login_exitoso",
+        usuario=email,
+        usuario_id=user.id
+    )
 
     return jsonify({
         "message": "Login exitoso",
@@ -240,13 +233,11 @@ def forgot_password():
         mail.send(mensaje)
 
         # Log de solicitud de reseteo
-        if logs_collection is not None:
-            logs_collection.insert_one({
-                "evento": "solicitud_reset_password",
-                "usuario_id": user.id,
-                "email": user.email,
-                "timestamp": datetime.utcnow()
-            })
+        log_event(
+            "solicitud_reset_password",
+            usuario_id=user.id,
+            email=user.email
+        )
 
         return jsonify({"message": "Correo de recuperación enviado"}), 200
     except Exception as e:
@@ -281,11 +272,9 @@ def reset_password():
     db.session.commit()
 
     # Log de reseteo exitoso
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "reset_password_exitoso",
-            "usuario_id": user.id,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "reset_password_exitoso",
+        usuario_id=user.id
+    )
 
     return jsonify({"message": "Contraseña actualizada. Ya puedes iniciar sesión."}), 200
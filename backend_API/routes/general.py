@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Grupo, GrupoUsuario, Seguimiento, Prenda
-import requests
+from models import db, User, Grupo, Prenda
 from fastapi import UploadFile, File
+import hmac
 import os
 import shutil
+from utils import realtime, activity_log, search, relaciones, shopping, catalogo
+from utils.pagination import leer_limite
 
 
 general_bp = Blueprint('general', __name__, url_prefix='/api')
@@ -17,49 +19,45 @@ def buscar():
         return jsonify({'error': 'Término de búsqueda vacío'}), 400
 
     user_id = int(get_jwt_identity())
+    limite = leer_limite(request.args.get('limit'))
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'offset no válido'}), 400
 
-    # Buscar usuarios
-    usuarios = User.query.filter(User.username.ilike(f'%{query}%')).all()
-    resultados_usuarios = []
-
-    for u in usuarios:
-        if u.id == user_id:
-            continue  # evitar que te muestres a ti mismo
-
-        seguimiento = Seguimiento.query.filter_by(
-            id_seguidor=user_id,
-            id_seguido=u.id
-        ).first()
-
-        tipo = seguimiento.tipo if seguimiento else None
-        estado = seguimiento.estado if seguimiento else None
-        estado_seguidor = estado if seguimiento and tipo == 'seguidor' else None
-
-        resultados_usuarios.append({
-            'id': u.id,
-            'username': u.username,
-            'foto_perfil': u.foto_perfil,
-            'tipo': tipo,
-            'estado': estado,
-            'estado_seguidor': estado_seguidor
-        })
+    # Buscar usuarios (por prefijo o similitud, sin incluirte a ti mismo)
+    usuarios = search.buscar_usuarios(query, user_id, limite, offset)
+    hay_mas = len(usuarios) > limite
+    usuarios = usuarios[:limite]
 
     # Buscar grupos con info de si pertenece
-    grupos = Grupo.query.filter(Grupo.nombre.ilike(f'%{query}%')).all()
-    resultados_grupos = []
-
-    for g in grupos:
-        es_miembro = GrupoUsuario.query.filter_by(id_usuario=user_id, id_grupo=g.id).first() is not None
-        resultados_grupos.append({
-            'id': g.id,
-            'nombre': g.nombre,
-            'imagen': g.imagen,
-            'es_miembro': es_miembro
-        })
+    grupos = search.buscar_grupos(query, user_id, limite, offset)
+    hay_mas = hay_mas or len(grupos) > limite
+    grupos = grupos[:limite]
+
+    # Relación con cada usuario y pertenencia a cada grupo: dos consultas en total
+    seguimientos, mis_grupos = relaciones.anotar(
+        user_id, [u.id for u in usuarios], [g.id for g in grupos]
+    )
+
+    resultados_usuarios = [{
+        'id': u.id,
+        'username': u.username,
+        'foto_perfil': u.foto_perfil,
+        **relaciones.campos_relacion(seguimientos, u.id)
+    } for u in usuarios]
+
+    resultados_grupos = [{
+        'id': g.id,
+        'nombre': g.nombre,
+        'imagen': g.imagen,
+        'es_miembro': g.id in mis_grupos
+    } for g in grupos]
 
     return jsonify({
         'usuarios': resultados_usuarios,
-        'grupos': resultados_grupos
+        'grupos': resultados_grupos,
+        'next_offset': offset + limite if hay_mas else None
     }), 200
 
 
@@ -71,39 +69,18 @@ def search_prendas():
     if not query:
         return jsonify([])
 
+    # Primero el catálogo local; SerpApi solo si no hay resultados
     try:
-        import os
-        api_key = os.getenv('SERPAPI_KEY')
-
-        params = {
-            "engine": "google",
-            "q": query,
-            "tbm": "shop",
-            "api_key": api_key,
-            "num": 30,
-            "async": "true"
-        }
-
-        response = requests.get(
-            "https://serpapi.com/search",
-            params=params,
-            timeout=10  # previene cuelgues
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        productos = data.get("shopping_results", [])
-
-        prendas = [{
-            "store": p.get("source", "Tienda"),
-            "product": p.get("title", "Producto"),
-            "price": p.get("price", "0 €"),
-            "imagen": p.get("thumbnail", ""),
-            "link": p.get("link") or p.get("product_link", "")
-        } for p in productos if p.get("link") or p.get("product_link")]
-
-        return jsonify(prendas)
+        locales = catalogo.buscar(query)
+    except Exception as e:
+        print(f"Error en búsqueda en el catálogo local: {e}")
+        db.session.rollback()
+        locales = []
+    if locales:
+        return jsonify([p.to_dict() for p in locales])
 
+    try:
+        return jsonify(shopping.buscar(query))
     except Exception as e:
         print(f"Error en búsqueda SerpApi: {e}")
         return jsonify([]), 500
@@ -154,3 +131,17 @@ def obtener_evolucion_gastos_diaria():
         {"dia": dia, "total": float(total)} for dia, total in resultados if total is not None
     ])
 
+
+@general_bp.route('/metricas', methods=['GET'])
+def metricas():
+    # Métricas de este proceso: tiempo real (salas y bytes emitidos) y logs de
+    # actividad. Solo para monitorización interna con la cabecera X-Metrics-Token
+    esperado = current_app.config.get('METRICS_TOKEN')
+    recibido = request.headers.get('X-Metrics-Token', '')
+    if not esperado or not hmac.compare_digest(recibido, esperado):
+        return jsonify({'error': 'No encontrado'}), 404
+
+    return jsonify({
+        'tiempo_real': realtime.estadisticas(),
+        'actividad': activity_log.estadisticas()
+    }), 200
@@ -3,10 +3,11 @@ import os
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Grupo, GrupoUsuario, MensajeGrupo, User
-from werkzeug.utils import secure_filename
-import uuid
 from datetime import datetime
-from extensions import logs_collection
+from utils.activity_log import log_event
+from utils.image_jobs import encolar_variantes
+from utils.static_files import enviar_subida
+from utils import media, search
 
 
 
@@ -34,36 +35,35 @@ def crear_grupo():
         return jsonify({"error": "El nombre del grupo es obligatorio"}), 400
 
     id_creador = get_jwt_identity()
-    filename = None
+    imagen_url = None
 
     if imagen_file:
+        # Validar extensión (misma lista que las publicaciones y el perfil)
         extension = imagen_file.filename.rsplit('.', 1)[-1].lower()
-        filename = f"{uuid.uuid4()}.{extension}"
-
-        upload_folder = os.path.join(current_app.root_path, 'static', 'group_images')
-        os.makedirs(upload_folder, exist_ok=True)
-
-        path = os.path.join(upload_folder, filename)
-        imagen_file.save(path)
+        if extension not in ['jpg', 'jpeg', 'png', 'gif']:
+            return jsonify({"error": "Extensión de imagen no válida"}), 400
+        imagen_url = media.guardar(imagen_file.read(), extension)
 
     nuevo_grupo = Grupo(
         nombre=nombre,
         descripcion=None,
-        imagen=f"/groups/images/{filename}" if filename else None,
+        imagen=imagen_url,
         creador=id_creador
     )
 
     db.session.add(nuevo_grupo)
     db.session.commit()
+    search.invalidar_indices()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "grupo_creado",
-            "grupo_id": nuevo_grupo.id,
-            "nombre": nombre,
-            "creador_id": id_creador,
-            "timestamp": datetime.utcnow()
-        })
+    if imagen_url:
+        encolar_variantes(imagen_url)
+
+    log_event(
+        "grupo_creado",
+        grupo_id=nuevo_grupo.id,
+        nombre=nombre,
+        creador_id=id_creador
+    )
 
     return jsonify(nuevo_grupo.to_dict()), 201
 
@@ -80,25 +80,6 @@ def eliminar_grupo(group_id):
     if grupo.creador != user_id:
         return jsonify({"error": "Solo el creador puede eliminar el grupo"}), 403
 
-    # Eliminar imagen del grupo si existe
-    if grupo.imagen:
-        try:
-            from pathlib import Path
-            from urllib.parse import urlparse
-
-            # Convertir la URL relativa a ruta de archivo
-            relative_path = grupo.imagen.replace('/groups/images/', 'static/group_images/')
-            image_path = Path(current_app.root_path) / relative_path
-
-            if image_path.exists():
-                image_path.unlink()
-                print(f"🗑 Imagen del grupo eliminada: {image_path}")
-            else:
-                print(f"Imagen no encontrada: {image_path}")
-
-        except Exception as e:
-            print(f"Error eliminando imagen del grupo: {e}")
-
     # Eliminar relaciones con usuarios
     GrupoUsuario.query.filter_by(id_grupo=group_id).delete()
 
@@ -109,16 +90,17 @@ def eliminar_grupo(group_id):
     print(f"🧪 user_id del token: {user_id}")
     print(f"🧪 grupo.creador: {grupo.creador}")
 
+    imagen_url = grupo.imagen
     db.session.delete(grupo)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "grupo_eliminado",
-            "grupo_id": group_id,
-            "usuario_id": user_id,
-            "timestamp": datetime.utcnow()
-        })
+    media.liberar_imagen(imagen_url, 'group_images')
+
+    log_event(
+        "grupo_eliminado",
+        grupo_id=group_id,
+        usuario_id=user_id
+    )
 
     return jsonify({"msg": "Grupo eliminado correctamente"}), 200
 
@@ -127,9 +109,9 @@ def eliminar_grupo(group_id):
 
 @groups_bp.route('/images/<filename>')
 def serve_group_image(filename):
-    from flask import current_app, send_from_directory
+    from flask import current_app
     uploads_dir = os.path.join(current_app.root_path, 'static', 'group_images')
-    return send_from_directory(uploads_dir, filename)
+    return enviar_subida(uploads_dir, filename)
 
 
 
@@ -168,13 +150,11 @@ def abandonar_grupo(group_id):
     db.session.delete(miembro)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "grupo_abandonado",
-            "grupo_id": group_id,
-            "usuario_id": user_id,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "grupo_abandonado",
+        grupo_id=group_id,
+        usuario_id=user_id
+    )
 
     return jsonify({"msg": "Has abandonado el grupo"}), 200
 
@@ -195,13 +175,11 @@ def unirse_a_grupo(group_id):
     db.session.add(nuevo)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "grupo_unido",
-            "grupo_id": group_id,
-            "usuario_id": user_id,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "grupo_unido",
+        grupo_id=group_id,
+        usuario_id=user_id
+    )
 
     return jsonify({'message': 'Te has unido al grupo correctamente'}), 200
 
@@ -0,0 +1,42 @@
+import os
+import re
+from flask import Blueprint, Response, request, abort
+from models import Blob
+from utils.storage import get_storage, clave_de, TIPOS_MIME
+from utils.static_files import enviar_imagen, CACHE_INMUTABLE, CACHE_PROVISIONAL
+
+media_bp = Blueprint('media', __name__, url_prefix='/media')
+
+# <sha256>.<ext> o, para las variantes, <sha256>_<ancho>.<ext>
+PATRON_NOMBRE = re.compile(r'^(?P<hash>[0-9a-f]{64})(?P<ancho>_\d+)?\.(?P<ext>jpg|png|gif|webp)$')
+
+
+@media_bp.route('/<nombre>')
+def servir_media(nombre):
+    coincidencia = PATRON_NOMBRE.match(nombre)
+    if not coincidencia:
+        abort(404)
+
+    storage = get_storage()
+    inmutable = True
+    if not storage.exists(clave_de(nombre)):
+        # Variante todavía no generada: se sirve la original
+        blob = Blob.query.get(coincidencia.group('hash'))
+        if not blob or not coincidencia.group('ancho'):
+            abort(404)
+        nombre = f"{blob.hash}.{blob.extension}"
+        inmutable = False
+
+    # El nombre deriva del contenido, así que sirve como ETag fuerte
+    etag = os.path.splitext(nombre)[0]
+
+    ruta = storage.local_path(clave_de(nombre))
+    if ruta:
+        return enviar_imagen(os.path.dirname(ruta), nombre, etag=etag, inmutable=inmutable)
+
+    respuesta = Response(storage.get(clave_de(nombre)), mimetype=TIPOS_MIME[nombre.rsplit('.', 1)[-1]])
+    respuesta.set_etag(etag)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = CACHE_INMUTABLE if inmutable else CACHE_PROVISIONAL
+    respuesta.cache_control.immutable = inmutable
+    return respuesta.make_conditional(request, accept_ranges=True)
@@ -1,9 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, MensajeIndividual, User, MensajeGrupo, GrupoUsuario, Grupo
-from extensions import socketio
+from models import db, MensajeIndividual, User, MensajeGrupo, GrupoUsuario, Grupo, Post
+from utils.realtime import emitir
+from utils import presence
 from datetime import datetime
-from extensions import logs_collection
+from utils.activity_log import log_event
+from utils.pagination import leer_limite, codificar_cursor, decodificar_cursor
+from utils.conversaciones import registrar_mensaje, marcar_leida, bandeja_de_entrada
+from utils.feed import relaciones_del_usuario
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import joinedload
 
 mensajes_bp = Blueprint('mensajes', __name__, url_prefix='/mensajes')
 
@@ -27,20 +33,24 @@ def enviar_mensaje_directo():
     )
 
     db.session.add(nuevo_mensaje)
+    db.session.flush()
+    # Resumen de la bandeja de entrada en la misma transacción
+    registrar_mensaje(nuevo_mensaje)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "mensaje_directo_enviado",
-            "emisor_id": id_emisor,
-            "receptor_id": id_receptor,
-            "mensaje": mensaje,
-            "mensaje_id": nuevo_mensaje.id,
-            "post_id": id_publicacion,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "mensaje_directo_enviado",
+        emisor_id=id_emisor,
+        receptor_id=id_receptor,
+        mensaje=mensaje,
+        mensaje_id=nuevo_mensaje.id,
+        post_id=id_publicacion
+    )
 
-    socketio.emit('nuevo_mensaje', nuevo_mensaje.to_dict(), to=str(id_receptor))
+    # Solo se omite el emit si Redis confirma que no hay dispositivos
+    # conectados: el mensaje llegará con el historial
+    if not presence.desconectado(int(id_receptor)):
+        emitir('nuevo_mensaje', nuevo_mensaje.to_dict(), str(id_receptor))
 
     return jsonify(nuevo_mensaje.to_dict()), 201
 
@@ -49,14 +59,45 @@ def enviar_mensaje_directo():
 @mensajes_bp.route('/directo/<int:otro_usuario_id>', methods=['GET'])
 @jwt_required()
 def obtener_mensajes_directos(otro_usuario_id):
-    usuario_actual_id = get_jwt_identity()
+    usuario_actual_id = int(get_jwt_identity())
+    limite = leer_limite(request.args.get('limit'), por_defecto=50, maximo=100)
+
+    cursor = None
+    if request.args.get('before'):
+        try:
+            cursor = decodificar_cursor(request.args['before'])
+        except ValueError:
+            return jsonify({'error': 'Cursor no válido'}), 400
+
+    # Ambos sentidos de la conversación salen del índice (least, greatest, fecha_envio)
+    consulta = MensajeIndividual.query.filter(
+        func.least(MensajeIndividual.id_emisor, MensajeIndividual.id_receptor) == min(usuario_actual_id, otro_usuario_id),
+        func.greatest(MensajeIndividual.id_emisor, MensajeIndividual.id_receptor) == max(usuario_actual_id, otro_usuario_id)
+    )
+
+    if cursor is not None:
+        consulta = consulta.filter(
+            tuple_(MensajeIndividual.fecha_envio, MensajeIndividual.id) < tuple_(*cursor)
+        )
 
-    mensajes = MensajeIndividual.query.filter(
-        ((MensajeIndividual.id_emisor == usuario_actual_id) & (MensajeIndividual.id_receptor == otro_usuario_id)) |
-        ((MensajeIndividual.id_emisor == otro_usuario_id) & (MensajeIndividual.id_receptor == usuario_actual_id))
-    ).order_by(MensajeIndividual.fecha_envio.asc()).all()
+    # Los mensajes más recientes primero, con la publicación compartida y su autor precargados
+    mensajes = consulta.options(joinedload(MensajeIndividual.publicacion).joinedload(Post.usuario))\
+        .order_by(MensajeIndividual.fecha_envio.desc(), MensajeIndividual.id.desc())\
+        .limit(limite + 1).all()
 
-    return jsonify([m.to_dict() for m in mensajes]), 200
+    hay_mas = len(mensajes) > limite
+    mensajes = mensajes[:limite]
+
+    # Abrir la conversación marca como leídos los mensajes recibidos
+    if cursor is None and marcar_leida(usuario_actual_id, otro_usuario_id):
+        db.session.commit()
+
+    # La página se devuelve en orden cronológico, como espera el chat
+    respuesta = jsonify([m.to_dict() for m in reversed(mensajes)])
+    if hay_mas:
+        # `mensajes` aún está en orden descendente: el último es el más antiguo
+        respuesta.headers['X-Next-Cursor'] = codificar_cursor(mensajes[-1].fecha_envio, mensajes[-1].id)
+    return respuesta, 200
 
 
 @mensajes_bp.route('/grupo/<int:id_grupo>', methods=['POST'])
@@ -82,17 +123,15 @@ def enviar_mensaje_grupo(id_grupo):
     db.session.add(nuevo)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "mensaje_grupo_enviado",
-            "grupo_id": id_grupo,
-            "usuario_id": id_usuario,
-            "mensaje": mensaje,
-            "id_publicacion": id_publicacion,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "mensaje_grupo_enviado",
+        grupo_id=id_grupo,
+        usuario_id=id_usuario,
+        mensaje=mensaje,
+        id_publicacion=id_publicacion
+    )
 
-    socketio.emit('nuevo_mensaje_grupo', nuevo.to_dict(), to=f'grupo_{id_grupo}')
+    emitir('nuevo_mensaje_grupo', nuevo.to_dict(), f'grupo_{id_grupo}')
 
     return jsonify(nuevo.to_dict()), 201
 
@@ -110,10 +149,47 @@ def obtener_mensajes_grupo(id_grupo):
     if not miembro:
         return jsonify({'error': 'No perteneces a este grupo'}), 403
 
-    mensajes = MensajeGrupo.query.filter_by(id_grupo=id_grupo)\
-        .order_by(MensajeGrupo.fecha_envio.asc()).all()
+    # Paginación por cursor sobre (fecha_envio, id), de más reciente a más antiguo
+    limite = leer_limite(request.args.get('limit'), por_defecto=50, maximo=100)
+    consulta = MensajeGrupo.query.filter_by(id_grupo=id_grupo)
+
+    if request.args.get('before'):
+        try:
+            cursor = decodificar_cursor(request.args['before'])
+        except ValueError:
+            return jsonify({'error': 'Cursor no válido'}), 400
+        consulta = consulta.filter(tuple_(MensajeGrupo.fecha_envio, MensajeGrupo.id) < tuple_(*cursor))
+
+    # Autores y publicaciones compartidas (con su autor) en la misma consulta
+    mensajes = consulta.options(
+        joinedload(MensajeGrupo.usuario),
+        joinedload(MensajeGrupo.publicacion).joinedload(Post.usuario)
+    ).order_by(MensajeGrupo.fecha_envio.desc(), MensajeGrupo.id.desc())\
+        .limit(limite + 1).all()
+
+    hay_mas = len(mensajes) > limite
+    mensajes = mensajes[:limite]
+
+    next_cursor = None
+    if hay_mas:
+        ultimo = mensajes[-1]
+        next_cursor = codificar_cursor(ultimo.fecha_envio, ultimo.id)
+
+    # Cada autor aparece una sola vez por página
+    base_url = current_app.config['BASE_URL']
+    autores = {}
+    for m in mensajes:
+        if m.usuario and str(m.id_usuario) not in autores:
+            autores[str(m.id_usuario)] = {
+                'username': m.usuario.username,
+                'foto_perfil': f"{base_url}{m.usuario.foto_perfil}" if m.usuario.foto_perfil else None
+            }
 
-    return jsonify([m.to_dict() for m in mensajes]), 200
+    return jsonify({
+        'mensajes': [m.to_dict(incluir_autor=False) for m in reversed(mensajes)],
+        'autores': autores,
+        'next_cursor': next_cursor
+    }), 200
 
 
 @mensajes_bp.route('/usuarios-conversacion', methods=['GET'])
@@ -121,45 +197,26 @@ def obtener_mensajes_grupo(id_grupo):
 def obtener_usuarios_con_actividad_de_mensajes():
     user_id = int(get_jwt_identity())
 
-    mensajes = MensajeIndividual.query.filter(
-        (MensajeIndividual.id_emisor == user_id) | (MensajeIndividual.id_receptor == user_id)
-    ).all()
-
-    ids_relacionados = set()
-    for m in mensajes:
-        if m.id_emisor != user_id:
-            ids_relacionados.add(m.id_emisor)
-        if m.id_receptor != user_id:
-            ids_relacionados.add(m.id_receptor)
-
-    usuarios = User.query.filter(User.id.in_(ids_relacionados)).all()
+    # Bandeja servida desde el resumen de conversaciones, ordenada por última actividad
+    conversaciones = bandeja_de_entrada(user_id)
+    _, _, tipo_relacion = relaciones_del_usuario(user_id)
+    en_linea = presence.en_linea_varios(u.id for _, u, _ in conversaciones)
+    base_url = current_app.config['BASE_URL']
 
     resultado = []
-    for u in usuarios:
+    for conversacion, u, no_leidos in conversaciones:
         resultado.append({
             'id': u.id,
             'username': u.username,
             'nombre': u.nombre,
             'apellido': u.apellido,
-            'foto_perfil': f"{current_app.config['BASE_URL']}{u.foto_perfil}" if u.foto_perfil else None,
-            'tipo': tipo_de_relacion(user_id, u.id)
+            'foto_perfil': f"{base_url}{u.foto_perfil}" if u.foto_perfil else None,
+            'tipo': tipo_relacion.get(u.id, 'desconocido'),
+            'ultimo_mensaje': conversacion.ultimo_mensaje,
+            'ultimo_mensaje_propio': conversacion.id_emisor_ultimo == user_id,
+            'fecha_ultimo_mensaje': conversacion.fecha_ultimo_mensaje.isoformat(),
+            'no_leidos': no_leidos,
+            'en_linea': u.id in en_linea
         })
 
     return jsonify(resultado), 200
-
-
-def tipo_de_relacion(id1, id2):
-    from models import Seguimiento
-
-    relaciones = Seguimiento.query.filter(
-        ((Seguimiento.id_seguidor == id1) & (Seguimiento.id_seguido == id2)) |
-        ((Seguimiento.id_seguidor == id2) & (Seguimiento.id_seguido == id1))
-    ).filter(Seguimiento.estado == 'aceptada').all()
-
-    for r in relaciones:
-        if r.tipo == 'amigo':
-            return 'amigo'
-        elif r.tipo == 'seguidor' and r.id_seguidor == id1:
-            return 'seguido'
-
-    return 'desconocido'
@@ -1,13 +1,21 @@
 import os
-import uuid
-from flask import Blueprint, request, jsonify, send_from_directory, current_app, url_for
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
-from extensions import socketio
-from extensions import db, logs_collection
-from models import Post, User, Seguimiento, Comentario, Like, Favorito, CaracteristicasPublicacion
-from sqlalchemy import select, union_all
-from datetime import datetime
+from utils.realtime import emitir, sala_post
+from extensions import db
+from utils.activity_log import log_event
+from models import Post, User, Seguimiento, Comentario, Favorito, CaracteristicasPublicacion
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+from utils.feed import relaciones_del_usuario, consulta_feed, serializar_feed, hidratar, puede_ver
+from utils import timelines
+from utils.counters import actualizar_contador
+from utils.likes import alternar_like
+from utils.image_jobs import encolar_variantes
+from utils.image_variants import variante_solicitada, variant_url, ANCHOS
+from utils.static_files import enviar_subida
+from utils import media
+from utils.pagination import leer_limite, codificar_cursor, decodificar_cursor
 
 
 posts_bp = Blueprint('posts', __name__, url_prefix='/posts')
@@ -46,19 +54,8 @@ def crear_post_mobile():
         if file_size > 5 * 1024 * 1024:
             return jsonify({'error': 'La imagen excede el tamaño máximo (5 MB)'}), 400
 
-        # Crear nombre seguro y único
-        filename = secure_filename(imagen_file.filename)
-        unique_name = f"{uuid.uuid4().hex}.{ext}"
-
-        # Ruta de destino
-        upload_path = os.path.join(current_app.root_path, 'static', 'uploads')
-        os.makedirs(upload_path, exist_ok=True)
-
-        image_path = os.path.join(upload_path, unique_name)
-        imagen_file.save(image_path)
-
-        # URL accesible desde Flutter
-        imagen_url = f"/posts/uploads/{unique_name}"
+        # Guardado por contenido: si la imagen ya existe solo suma una referencia
+        imagen_url = media.guardar(imagen_file.read(), ext)
 
     except Exception as e:
         return jsonify({'error': f'Error al guardar imagen: {str(e)}'}), 500
@@ -74,16 +71,17 @@ def crear_post_mobile():
     db.session.add(nueva_post)
     db.session.commit()
 
+    timelines.publicar(nueva_post)
+    encolar_variantes(imagen_url)
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "publicacion_creada",
-            "usuario_id": usuario_id,
-            "contenido": contenido,
-            "visibilidad": visibilidad,
-            "imagen_url": imagen_url,
-            "timestamp": datetime.utcnow()
-        })
+
+    log_event(
+        "publicacion_creada",
+        usuario_id=usuario_id,
+        contenido=contenido,
+        visibilidad=visibilidad,
+        imagen_url=imagen_url
+    )
 
     return jsonify({'message': 'Publicación creada con éxito'}), 201
 
@@ -94,131 +92,110 @@ def crear_post_mobile():
 def feed_general():
     user_id = int(get_jwt_identity())
 
-    # Obtener IDs de seguidos
-    seguidos_ids = db.session.query(Seguimiento.id_seguido).filter(
-        Seguimiento.id_seguidor == user_id,
-        Seguimiento.tipo == 'seguidor',
-        Seguimiento.estado == 'aceptada'
-    ).subquery()
-
-    # Obtener IDs de amigos bidireccionales únicos
-    amigos_1 = db.session.query(Seguimiento.id_seguidor).filter(
-        Seguimiento.id_seguido == user_id,
-        Seguimiento.tipo == 'amigo',
-        Seguimiento.estado == 'aceptada'
-    )
-
-    amigos_2 = db.session.query(Seguimiento.id_seguido).filter(
-        Seguimiento.id_seguidor == user_id,
-        Seguimiento.tipo == 'amigo',
-        Seguimiento.estado == 'aceptada'
-    )
-
-    amigos_ids = [row[0] for row in amigos_1.union_all(amigos_2).all()]
+    # Seguidos, amigos y tipo de relación con cada autor en una sola consulta
+    seguidos, amigos, tipo_relacion = relaciones_del_usuario(user_id)
 
-    # --- Construir los tres subconjuntos según visibilidad ---
-
-    publicaciones_publicas = Post.query.join(User).filter(
-        ((Post.id_usuario.in_(select(seguidos_ids.c.id_seguido))) |
-         (Post.id_usuario.in_(amigos_ids))),
-        Post.visibilidad == 'publico'
-    )
-
-    publicaciones_seguidores = Post.query.join(User).filter(
-        Post.id_usuario.in_(select(seguidos_ids.c.id_seguido)),
-        Post.visibilidad == 'seguidores'
-    )
-
-    publicaciones_amigos = Post.query.join(User).filter(
-        Post.id_usuario.in_(amigos_ids),
-        Post.visibilidad == 'amigos'
-    )
-
-    # Unir todo y ordenar
-    publicaciones = publicaciones_publicas.union_all(
-        publicaciones_seguidores
-    ).union_all(
-        publicaciones_amigos
-    ).order_by(Post.fecha_publicacion.desc()).all()
-
-    # Construir respuesta
-    posts_data = []
-    for p in publicaciones:
-        autor_id = p.id_usuario
-
-        tipo_relacion = ''
-        seguimientos = Seguimiento.query.filter(
-            ((Seguimiento.id_seguidor == user_id) & (Seguimiento.id_seguido == autor_id)) |
-            ((Seguimiento.id_seguidor == autor_id) & (Seguimiento.id_seguido == user_id))
-        ).filter(Seguimiento.estado == 'aceptada').all()
-
-        for s in seguimientos:
-            if s.tipo == 'amigo':
-                tipo_relacion = 'amigo'
-                break
-            elif s.tipo == 'seguidor' and s.id_seguidor == user_id:
-                tipo_relacion = 'seguido'
-
-        posts_data.append({
-            'id': p.id,
-            'id_usuario': autor_id,
-            'contenido': p.contenido,
-            'visibilidad': p.visibilidad,
-            'imagen_url': f"{current_app.config['BASE_URL']}{p.imagen_url}" if p.imagen_url else None,
-            'fecha': p.fecha_publicacion.isoformat(),
-            'usuario': p.usuario.username,
-            'foto_perfil': f"{current_app.config['BASE_URL']}{p.usuario.foto_perfil}" if p.usuario.foto_perfil else None,
-            'likes_count': Like.query.filter_by(id_publicacion=p.id).count(),
-
-            'ha_dado_like': any(l.id_usuario == user_id for l in p.likes),
-            'tipo_relacion': tipo_relacion,
-            'guardado': Favorito.query.filter_by(id_usuario=user_id, id_publicacion=p.id).first() is not None
-        })
+    # Paginación por cursor sobre (fecha_publicacion, id)
+    limite = leer_limite(request.args.get('limit'))
+    cursor = None
+    if request.args.get('before'):
+        try:
+            cursor = decodificar_cursor(request.args['before'])
+        except ValueError:
+            return jsonify({'error': 'Cursor no válido'}), 400
 
-    return jsonify({"posts": posts_data}), 200
+    # Timeline precalculado en Redis; se pide un elemento de más para saber
+    # si hay página siguiente
+    publicaciones = []
+    hay_mas = False
+    ids, frio = timelines.leer(user_id, cursor[1] if cursor else None, limite)
+    if ids:
+        hay_mas = len(ids) > limite
+        publicaciones = hidratar(ids[:limite], seguidos, amigos)
 
+    if not publicaciones and (ids is None or hay_mas):
+        # Timeline frío o no disponible: unir los tres subconjuntos según
+        # visibilidad y ordenar
+        publicaciones = consulta_feed(seguidos, amigos, cursor=cursor, limite=limite + 1)\
+            .options(joinedload(Post.usuario))\
+            .order_by(Post.fecha_publicacion.desc(), Post.id.desc())\
+            .limit(limite + 1).all()
 
+        hay_mas = len(publicaciones) > limite
+        publicaciones = publicaciones[:limite]
 
+        if frio:
+            timelines.reconstruir(user_id, seguidos, amigos)
 
+    next_cursor = None
+    if hay_mas and publicaciones:
+        ultima = publicaciones[-1]
+        next_cursor = codificar_cursor(ultima.fecha_publicacion, ultima.id)
 
+    posts_data = serializar_feed(publicaciones, user_id, tipo_relacion, variante_solicitada(request))
 
+    return jsonify({"posts": posts_data, "next_cursor": next_cursor}), 200
 
 
 @posts_bp.route('/uploads/<filename>')
 def serve_uploaded_image(filename):
     uploads_dir = os.path.join(current_app.root_path, 'static', 'uploads')
-    return send_from_directory(uploads_dir, filename)
+    return enviar_subida(uploads_dir, filename)
 
 
 @posts_bp.route('/<int:post_id>/comments', methods=['GET'])
 @jwt_required()
 def obtener_comentarios(post_id):
-    comentarios = Comentario.query.filter_by(id_publicacion=post_id).order_by(Comentario.fecha_comentario.desc()).all()
+    post = Post.query.get(post_id)
+    if not post or not puede_ver(int(get_jwt_identity()), post):
+        return jsonify({'error': 'Publicación no encontrada'}), 404
 
-    comentarios_json = []
-    for c in comentarios:
-        usuario = User.query.get(c.id_usuario)
+    # Paginación por cursor sobre (fecha_comentario, id), de más reciente a más antiguo
+    limite = leer_limite(request.args.get('limit'))
+    consulta = Comentario.query.filter_by(id_publicacion=post_id)
 
-        username = usuario.username if usuario else "Desconocido"
+    if request.args.get('before'):
+        try:
+            fecha, id_ = decodificar_cursor(request.args['before'])
+        except ValueError:
+            return jsonify({'error': 'Cursor no válido'}), 400
+        consulta = consulta.filter(tuple_(Comentario.fecha_comentario, Comentario.id) < (fecha, id_))
+
+    # Autores en la misma consulta
+    comentarios = consulta.options(joinedload(Comentario.usuario))\
+        .order_by(Comentario.fecha_comentario.desc(), Comentario.id.desc())\
+        .limit(limite + 1).all()
 
-        # Extraer nombre de archivo de foto
-        if usuario and usuario.foto_perfil:
-            filename = usuario.foto_perfil.replace("/usuarios/profile-images/", "")
-            foto_url = url_for("users.serve_profile_image", filename=filename, _external=True)
-        else:
-            foto_url = url_for("users.serve_profile_image", filename="default.png", _external=True)
+    hay_mas = len(comentarios) > limite
+    comentarios = comentarios[:limite]
+
+    base_url = current_app.config['BASE_URL']
+    avatar_defecto = f"{base_url}/usuarios/profile-images/default.png"
+    variante = variante_solicitada(request)
+
+    comentarios_json = []
+    for c in comentarios:
+        usuario = c.usuario
 
         comentarios_json.append({
             'id': c.id,
             'post_id': c.id_publicacion,
-            'autor': username,
+            'autor': usuario.username if usuario else "Desconocido",
             'contenido': c.texto,
             'fecha': c.fecha_comentario.isoformat(),
-            'foto_autor': foto_url
+            'foto_autor': f"{base_url}{variant_url(usuario.foto_perfil, variante, ANCHOS[0])}"
+            if usuario and usuario.foto_perfil else avatar_defecto
         })
 
-    return jsonify(comentarios_json), 200
+    # El total sale del contador de la publicación ya cargada, sin contar filas
+    total = post.comentarios_count or 0
 
+    respuesta = jsonify(comentarios_json)
+    respuesta.headers['X-Total-Count'] = str(total)
+    if hay_mas:
+        ultimo = comentarios[-1]
+        respuesta.headers['X-Next-Cursor'] = codificar_cursor(ultimo.fecha_comentario, ultimo.id)
+    return respuesta, 200
 
 
 @posts_bp.route('/<int:post_id>/comments', methods=['POST'])
@@ -237,6 +214,7 @@ def crear_comentario(post_id):
         texto=texto
     )
     db.session.add(nuevo_comentario)
+    actualizar_contador(post_id, 'comentarios_count', 1)
     db.session.commit()
 
     comentario_dict = {
@@ -247,16 +225,15 @@ def crear_comentario(post_id):
         'fecha': nuevo_comentario.fecha_comentario.isoformat()
     }
 
-    socketio.emit(f'nuevo_comentario_{post_id}', comentario_dict)
+    # Solo a los clientes suscritos a esta publicación
+    emitir(f'nuevo_comentario_{post_id}', comentario_dict, sala_post(post_id), metrica='nuevo_comentario')
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "comentario_creado",
-            "usuario_id": user_id,
-            "post_id": post_id,
-            "contenido": texto,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "comentario_creado",
+        usuario_id=user_id,
+        post_id=post_id,
+        contenido=texto
+    )
 
     return jsonify({'message': 'Comentario creado exitosamente'}), 201
 
@@ -266,53 +243,19 @@ def crear_comentario(post_id):
 def toggle_like(post_id):
     user_id = int(get_jwt_identity())
 
-    # Verifica si la publicación existe
-    publicacion = Post.query.get(post_id)
-    if not publicacion:
+    # Una sola sentencia (o el búfer de Redis) decide el nuevo estado y el contador
+    resultado = alternar_like(user_id, post_id, current_app._get_current_object())
+    if resultado is None:
         return jsonify({'error': 'Publicación no encontrada'}), 404
+    nuevo_estado, total_likes = resultado
 
-    # Comprueba si ya existe un like
-    like_existente = Like.query.filter_by(
-        id_usuario=user_id,
-        id_publicacion=post_id
-    ).first()
-
-    if like_existente:
-        db.session.delete(like_existente)
-        db.session.commit()
-
-        # Log correcto
-        if logs_collection is not None:
-            logs_collection.insert_one({
-                "evento": "like_eliminado",
-                "usuario_id": user_id,
-                "post_id": post_id,
-                "timestamp": datetime.utcnow()
-            })
-
-        nuevo_estado = False
-    else:
-        nuevo_like = Like(
-            id_usuario=user_id,
-            id_publicacion=post_id,
-            fecha_creacion=datetime.utcnow()
-        )
-        db.session.add(nuevo_like)
-        db.session.commit()
-
-        # Log correcto
-        if logs_collection is not None:
-            logs_collection.insert_one({
-                "evento": "like_añadido",
-                "usuario_id": user_id,
-                "post_id": post_id,
-                "timestamp": datetime.utcnow()
-            })
-
-        nuevo_estado = True
+    log_event(
+        "like_añadido" if nuevo_estado else "like_eliminado",
+        usuario_id=user_id,
+        post_id=post_id
+    )
 
-    # Contar likes actuales
-    total_likes = Like.query.filter_by(id_publicacion=post_id).count()
+    emitir('likes_actualizados', {'post_id': post_id, 'likes_count': total_likes}, sala_post(post_id))
 
     return jsonify({
         'message': 'Like actualizado',
@@ -332,11 +275,13 @@ def toggle_guardado_publicacion(post_id):
 
     if favorito:
         db.session.delete(favorito)
+        actualizar_contador(post_id, 'guardados_count', -1)
         db.session.commit()
         return jsonify({'message': 'Desguardado', 'guardado': False}), 200
     else:
         nuevo = Favorito(id_usuario=user_id, id_publicacion=post_id)
         db.session.add(nuevo)
+        actualizar_contador(post_id, 'guardados_count', 1)
         db.session.commit()
         return jsonify({'message': 'Guardado', 'guardado': True}), 201
 
@@ -351,26 +296,20 @@ def eliminar_publicacion(post_id):
     if not publicacion:
         return jsonify({'error': 'Publicación no encontrada o no autorizada'}), 404
 
-    # Eliminar imagen física si existe
-    if publicacion.imagen_url:
-        try:
-            nombre_archivo = publicacion.imagen_url.split('/')[-1]
-            ruta_imagen = os.path.join(current_app.root_path, 'static', 'uploads', nombre_archivo)
-            if os.path.exists(ruta_imagen):
-                os.remove(ruta_imagen)
-        except Exception as e:
-            print(f" Error al eliminar imagen: {e}")
+    timelines.retirar(publicacion)
 
+    imagen_url = publicacion.imagen_url
     db.session.delete(publicacion)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "publicacion_eliminada",
-            "usuario_id": user_id,
-            "post_id": post_id,
-            "timestamp": datetime.utcnow()
-        })
+    # La imagen se libera tras confirmar el borrado: otras entidades pueden compartirla
+    media.liberar_imagen(imagen_url, 'uploads')
+
+    log_event(
+        "publicacion_eliminada",
+        usuario_id=user_id,
+        post_id=post_id
+    )
 
     return jsonify({'message': 'Publicación eliminada correctamente'}), 200
 
@@ -395,20 +334,24 @@ def editar_publicacion(post_id):
     if nueva_visibilidad not in ['publico', 'privado', 'seguidores', 'amigos']:
         return jsonify({'error': 'Visibilidad no válida'}), 400
 
+    visibilidad_anterior = publicacion.visibilidad
     publicacion.contenido = nuevo_contenido
     publicacion.visibilidad = nueva_visibilidad
 
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "publicacion_editada",
-            "usuario_id": user_id,
-            "post_id": post_id,
-            "nuevo_contenido": nuevo_contenido,
-            "nueva_visibilidad": nueva_visibilidad,
-            "timestamp": datetime.utcnow()
-        })
+    # Las lecturas descartan lo que deja de ser visible; si se amplía la
+    # visibilidad hay que repartirla a los nuevos lectores
+    if nueva_visibilidad != visibilidad_anterior:
+        timelines.publicar(publicacion)
+
+    log_event(
+        "publicacion_editada",
+        usuario_id=user_id,
+        post_id=post_id,
+        nuevo_contenido=nuevo_contenido,
+        nueva_visibilidad=nueva_visibilidad
+    )
 
 
     return jsonify({'message': 'Publicación actualizada con éxito'}), 200
@@ -1,12 +1,15 @@
 import os
-import uuid
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
-from extensions import db, logs_collection
+from extensions import db
+from utils.activity_log import log_event
 from models import Prenda, User, SolicitudPrenda, PrendaCategoria, Categoria, Favorito
 from datetime import datetime
-from utils.image_processing import remove_background_and_white_bg
+from utils.image_processing import procesar_prenda_bytes
+from utils.image_jobs import encolar_eliminacion_fondo, encolar_variantes
+from utils.image_variants import variante_solicitada, variant_url
+from utils.static_files import enviar_subida
+from utils import media
 from sqlalchemy import text
 from pytz import timezone
 
@@ -51,20 +54,13 @@ def crear_prenda():
         return jsonify({'error': 'Extensión de imagen no válida'}), 400
 
     try:
-        nombre_seguro = secure_filename(imagen_file.filename)
-        nombre_final = f"{uuid.uuid4().hex}.{ext}"
+        datos = imagen_file.read()
+        imagen_url = None
 
-        temp_path = os.path.join(current_app.root_path, 'static', 'temp_uploads', nombre_final)
-        final_path = os.path.join(current_app.root_path, 'static', 'prendas_images', nombre_final)
-
-        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-        os.makedirs(os.path.dirname(final_path), exist_ok=True)
-
-        imagen_file.save(temp_path)
-        remove_background_and_white_bg(temp_path, final_path, eliminar_fondo=eliminar_fondo)
-        os.remove(temp_path)
-
-        imagen_url = f"/prendas/uploads/{nombre_final}"
+        # La prenda se guarda siempre como JPEG sobre fondo blanco. Sin
+        # eliminación de fondo basta con recodificar la imagen
+        if not eliminar_fondo:
+            imagen_url = media.guardar(procesar_prenda_bytes(datos, eliminar_fondo=False), 'jpg')
 
     except Exception as e:
         return jsonify({'error': f'Error al procesar imagen: {str(e)}'}), 500
@@ -76,7 +72,9 @@ def crear_prenda():
         precio=precio,
         talla=talla,
         color=color,
+        # Con eliminación de fondo la imagen se asigna al terminar el trabajo
         imagen_url=imagen_url,
+        estado_imagen='procesando' if eliminar_fondo else 'listo',
         fecha_agregado=datetime.utcnow(),
         fecha_modificacion=datetime.utcnow(),
         solicitable=solicitable,
@@ -108,17 +106,22 @@ def crear_prenda():
 
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "prenda_creada",
-            "usuario_id": usuario_id,
-            "nombre": nombre,
-            "precio": precio,
-            "imagen_url": imagen_url,
-            "emocion": emocion,
-            "timestamp": datetime.utcnow()
-        })
+    if eliminar_fondo:
+        encolar_eliminacion_fondo(current_app._get_current_object(), nueva_prenda.id, datos)
+    else:
+        encolar_variantes(imagen_url)
+
+    log_event(
+        "prenda_creada",
+        usuario_id=usuario_id,
+        nombre=nombre,
+        precio=precio,
+        imagen_url=imagen_url,
+        emocion=emocion
+    )
 
+    # La prenda ya existe aunque la imagen siga procesándose en segundo plano;
+    # el cliente lo sabe por 'estado_imagen' y /<id>/estado-imagen
     return jsonify(nueva_prenda.to_dict()), 201
 
 
@@ -126,7 +129,23 @@ def crear_prenda():
 @prendas_bp.route('/uploads/<filename>')
 def serve_uploaded_prenda(filename):
     uploads_dir = os.path.join(current_app.root_path, 'static', 'prendas_images')
-    return send_from_directory(uploads_dir, filename)
+    return enviar_subida(uploads_dir, filename)
+
+
+@prendas_bp.route('/<int:prenda_id>/estado-imagen', methods=['GET'])
+@jwt_required()
+def estado_imagen_prenda(prenda_id):
+    usuario_id = int(get_jwt_identity())
+    prenda = Prenda.query.filter_by(id=prenda_id, id_usuario=usuario_id).first()
+
+    if not prenda:
+        return jsonify({'error': 'Prenda no encontrada o no autorizada'}), 404
+
+    return jsonify({
+        'id': prenda.id,
+        'estado_imagen': prenda.estado_imagen,
+        'imagen_url': f"{current_app.config['BASE_URL']}{prenda.imagen_url}" if prenda.imagen_url else None
+    }), 200
 
 
 @prendas_bp.route('/mis-prendas', methods=['GET'])
@@ -134,6 +153,8 @@ def serve_uploaded_prenda(filename):
 def obtener_mis_prendas():
     usuario_id = int(get_jwt_identity())
 
+    variante = variante_solicitada(request)
+
     prendas = Prenda.query.filter_by(id_usuario=usuario_id).order_by(Prenda.fecha_agregado.desc()).all()
 
     return jsonify([
@@ -145,12 +166,13 @@ def obtener_mis_prendas():
             'talla': p.talla,
             'color': p.color,
             'tipo': p.tipo.value if p.tipo else None,
-            'imagen_url': f"{current_app.config['BASE_URL']}{p.imagen_url}" if p.imagen_url else None,
+            'imagen_url': f"{current_app.config['BASE_URL']}{variant_url(p.imagen_url, variante)}" if p.imagen_url else None,
             'solicitable': p.solicitable,
             'fecha_agregado': p.fecha_agregado.isoformat(),
             'estacion': p.prendas_categorias[0].estacion.value if p.prendas_categorias else None,
             'categorias': [rel.categoria.nombre for rel in p.prendas_categorias],
             'emocion': p.emocion.value if p.emocion else None,
+            'estado_imagen': p.estado_imagen,
         } for p in prendas
     ]), 200
 
@@ -216,19 +238,12 @@ def eliminar_prenda(prenda_id):
     from models import PrendaCategoria
     PrendaCategoria.query.filter_by(prenda_id=prenda_id).delete()
 
-    #Eliminar imagen física
-    if prenda.imagen_url:
-        try:
-            nombre_archivo = prenda.imagen_url.split("/")[-1]
-            ruta_imagen = os.path.join(current_app.root_path, 'static', 'prendas_images', nombre_archivo)
-            if os.path.exists(ruta_imagen):
-                os.remove(ruta_imagen)
-        except Exception as e:
-            print(f"Error al eliminar imagen física: {e}")
-
+    imagen_url = prenda.imagen_url
     db.session.delete(prenda)
     db.session.commit()
 
+    media.liberar_imagen(imagen_url, 'prendas_images')
+
     return jsonify({'message': 'Prenda eliminada correctamente'}), 200
 
 
@@ -240,6 +255,8 @@ def obtener_prendas_usuario(user_id):
     if not usuario:
         return jsonify({'error': 'Usuario no encontrado'}), 404
 
+    variante = variante_solicitada(request)
+
     prendas = Prenda.query.filter_by(id_usuario=user_id).order_by(Prenda.fecha_agregado.desc()).all()
 
     return jsonify([
@@ -251,7 +268,7 @@ def obtener_prendas_usuario(user_id):
             'talla': p.talla,
             'color': p.color,
             'tipo': p.tipo.value if p.tipo else None,
-            'imagen_url': f"{current_app.config['BASE_URL']}{p.imagen_url}" if p.imagen_url else None,
+            'imagen_url': f"{current_app.config['BASE_URL']}{variant_url(p.imagen_url, variante)}" if p.imagen_url else None,
             'solicitable': p.solicitable,
             'fecha_agregado': p.fecha_agregado.isoformat(),
             'estacion': p.prendas_categorias[0].estacion.value if p.prendas_categorias else None,
@@ -300,17 +317,15 @@ def solicitar_prenda(prenda_id):
     db.session.add(solicitud)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "solicitud_prenda",
-            "id_solicitud": solicitud.id,
-            "id_prenda": prenda_id,
-            "id_remitente": usuario_id,
-            "fecha_inicio": fecha_inicio.isoformat(),
-            "fecha_fin": fecha_fin.isoformat(),
-            "timestamp": datetime.utcnow(),
-            "estado": "pendiente"
-        })
+    log_event(
+        "solicitud_prenda",
+        id_solicitud=solicitud.id,
+        id_prenda=prenda_id,
+        id_remitente=usuario_id,
+        fecha_inicio=fecha_inicio.isoformat(),
+        fecha_fin=fecha_fin.isoformat(),
+        estado="pendiente"
+    )
 
     return jsonify({'message': 'Solicitud de prenda registrada'}), 201
 
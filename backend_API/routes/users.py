@@ -2,10 +2,19 @@ from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, User, Seguimiento, Post, Favorito, SolicitudPrenda, Like, Prenda
 from datetime import datetime
-from extensions import logs_collection
+from utils.activity_log import log_event
+from utils import timelines
+from utils import grafo
+from utils.feed import likes_del_usuario
+from utils.likes import likes_pendientes
+from sqlalchemy import Integer, literal, tuple_, union_all
+from sqlalchemy.orm import joinedload
+from utils.pagination import leer_limite, codificar_cursor, decodificar_cursor
+from utils.image_jobs import encolar_variantes
+from utils.image_variants import variante_solicitada, variant_url, ANCHOS
+from utils.static_files import enviar_subida
+from utils import media
 import os
-from werkzeug.utils import secure_filename
-import uuid
 
 users_bp = Blueprint('users', __name__, url_prefix='/usuarios')
 
@@ -45,14 +54,12 @@ def enviar_solicitud():
     db.session.add(nueva)
     db.session.commit()
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "solicitud_enviada",
-            "tipo": tipo,
-            "emisor_id": id_emisor,
-            "receptor_id": id_receptor,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "solicitud_enviada",
+        tipo=tipo,
+        emisor_id=id_emisor,
+        receptor_id=id_receptor
+    )
 
     return jsonify({'message': f'Solicitud de {tipo} enviada correctamente'}), 201
 
@@ -82,15 +89,14 @@ def rechazar_solicitud():
 
     db.session.delete(solicitud)
     db.session.commit()
+    grafo.invalidar(id_emisor, id_receptor)
 
-    if logs_collection is not None:
-        logs_collection.insert_one({
-            "evento": "solicitud_rechazada",
-            "tipo": tipo,
-            "usuario_id": id_receptor,
-            "otro_usuario_id": id_emisor,
-            "timestamp": datetime.utcnow()
-        })
+    log_event(
+        "solicitud_rechazada",
+        tipo=tipo,
+        usuario_id=id_receptor,
+        otro_usuario_id=id_emisor
+    )
 
     return jsonify({'message': f'Solicitud de {tipo} rechazada correctamente'}), 200
 
@@ -140,6 +146,13 @@ def aceptar_solicitud():
             db.session.add(reciproco)
 
     db.session.commit()
+    grafo.invalidar(id_emisor, id_receptor)
+
+    # El feed de quien empieza a seguir (o de ambos amigos) cambia
+    if tipo == 'amigo':
+        timelines.invalidar(id_emisor, id_receptor)
+    else:
+        timelines.invalidar(id_emisor)
 
     return jsonify({'message': f'Solicitud de {tipo} aceptada'}), 200
 
@@ -168,14 +181,15 @@ def eliminar_relacion():
             db.session.delete(relacion)
             db.session.commit()
 
-            if logs_collection is not None:
-                logs_collection.insert_one({
-                    "evento": "relacion_eliminada",
-                    "tipo": "seguidor",
-                    "usuario_id": id_emisor,
-                    "otro_usuario_id": id_receptor,
-                    "timestamp": datetime.utcnow()
-                })
+            grafo.invalidar(id_emisor, id_receptor)
+            timelines.invalidar(id_emisor)
+
+            log_event(
+                "relacion_eliminada",
+                tipo="seguidor",
+                usuario_id=id_emisor,
+                otro_usuario_id=id_receptor
+            )
 
             return jsonify({'message': 'Dejaste de seguir al usuario'}), 200
         else:
@@ -194,14 +208,15 @@ def eliminar_relacion():
                 db.session.delete(r)
             db.session.commit()
 
-            if logs_collection is not None:
-                logs_collection.insert_one({
-                    "evento": "relacion_eliminada",
-                    "tipo": "amigo",
-                    "usuario_id": id_emisor,
-                    "otro_usuario_id": id_receptor,
-                    "timestamp": datetime.utcnow()
-                })
+            grafo.invalidar(id_emisor, id_receptor)
+            timelines.invalidar(id_emisor, id_receptor)
+
+            log_event(
+                "relacion_eliminada",
+                tipo="amigo",
+                usuario_id=id_emisor,
+                otro_usuario_id=id_receptor
+            )
 
             return jsonify({'message': 'Amistad eliminada'}), 200
         else:
@@ -213,48 +228,84 @@ def eliminar_relacion():
 @jwt_required()
 def solicitudes_recibidas():
     id_actual = int(get_jwt_identity())
-    resultado = []
-
-    #  1. Solicitudes de seguimiento / amistad
-    seguimientos = Seguimiento.query.filter_by(
-        id_seguido=id_actual,
-        estado='pendiente'
-    ).all()
-
-    for s in seguimientos:
-        emisor = User.query.get(s.id_seguidor)
-        if not emisor:
-            continue
-        resultado.append({
-            'id': emisor.id,
-            'username': emisor.username,
-            'foto_perfil': emisor.foto_perfil,
-            'tipo': s.tipo,  # 'amigo' o 'seguidor'
-            'fecha': s.fecha_inicio.isoformat()
-        })
-
-    #  2. Solicitudes de prendas
-    solicitudes_prenda = SolicitudPrenda.query.filter_by(estado='pendiente').all()
+    limite = leer_limite(request.args.get('limit'))
+
+    # Seguimientos y solicitudes de prenda pendientes en una sola consulta,
+    # ordenadas por fecha. `clave` desempata entre ambos orígenes sin colisiones
+    seguimientos = db.session.query(
+        literal('seguimiento').label('origen'),
+        (Seguimiento.id * 2).label('clave'),
+        Seguimiento.id.label('id_solicitud'),
+        Seguimiento.fecha_inicio.label('fecha'),
+        Seguimiento.tipo.label('tipo'),
+        literal(None, Integer).label('id_prenda'),
+        User.id.label('id_usuario'),
+        User.username,
+        User.foto_perfil
+    ).join(User, User.id == Seguimiento.id_seguidor)\
+        .filter(Seguimiento.id_seguido == id_actual, Seguimiento.estado == 'pendiente')
+
+    # Solo las solicitudes de prendas del usuario actual, filtradas en SQL
+    solicitudes_prenda = db.session.query(
+        literal('prenda').label('origen'),
+        (SolicitudPrenda.id * 2 + 1).label('clave'),
+        SolicitudPrenda.id.label('id_solicitud'),
+        SolicitudPrenda.fecha_solicitud.label('fecha'),
+        literal('prenda').label('tipo'),
+        SolicitudPrenda.id_prenda.label('id_prenda'),
+        User.id.label('id_usuario'),
+        User.username,
+        User.foto_perfil
+    ).join(Prenda, Prenda.id == SolicitudPrenda.id_prenda)\
+        .join(User, User.id == SolicitudPrenda.id_remitente)\
+        .filter(Prenda.id_usuario == id_actual, SolicitudPrenda.estado == 'pendiente')
+
+    pendientes = union_all(seguimientos, solicitudes_prenda).subquery()
+    consulta = db.session.query(pendientes)
+
+    if request.args.get('before'):
+        try:
+            cursor = decodificar_cursor(request.args['before'])
+        except ValueError:
+            return jsonify({'error': 'Cursor no válido'}), 400
+        consulta = consulta.filter(tuple_(pendientes.c.fecha, pendientes.c.clave) < tuple_(*cursor))
+
+    filas = consulta.order_by(pendientes.c.fecha.desc(), pendientes.c.clave.desc())\
+        .limit(limite + 1).all()
+
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    # Las prendas de la página, en una única consulta
+    ids_prendas = [f.id_prenda for f in filas if f.id_prenda is not None]
+    prendas = {p.id: p for p in Prenda.query.filter(Prenda.id.in_(ids_prendas))} if ids_prendas else {}
 
-    for sp in solicitudes_prenda:
-        prenda = Prenda.query.get(sp.id_prenda)
-        if not prenda or prenda.id_usuario != id_actual:
-            continue  # Solo se muestran solicitudes de prendas del usuario actual
-
-        remitente = User.query.get(sp.id_remitente)
-        if not remitente:
-            continue
-
-        resultado.append({
-            'id': sp.id,  # ID de la solicitud
-            'username': remitente.username,
-            'foto_perfil': remitente.foto_perfil,
-            'tipo': 'prenda',
-            'fecha': sp.fecha_solicitud.isoformat(),
-            'prenda': prenda.to_dict() if prenda else None
-        })
+    resultado = []
+    for f in filas:
+        if f.origen == 'seguimiento':
+            resultado.append({
+                'id': f.id_usuario,
+                'username': f.username,
+                'foto_perfil': f.foto_perfil,
+                'tipo': f.tipo,  # 'amigo' o 'seguidor'
+                'fecha': f.fecha.isoformat()
+            })
+        else:
+            prenda = prendas.get(f.id_prenda)
+            resultado.append({
+                'id': f.id_solicitud,  # ID de la solicitud
+                'username': f.username,
+                'foto_perfil': f.foto_perfil,
+                'tipo': 'prenda',
+                'fecha': f.fecha.isoformat(),
+                'prenda': prenda.to_dict() if prenda else None
+            })
 
-    return jsonify(resultado), 200
+    respuesta = jsonify(resultado)
+    if hay_mas:
+        ultima = filas[-1]
+        respuesta.headers['X-Next-Cursor'] = codificar_cursor(ultima.fecha, ultima.clave)
+    return respuesta, 200
 
 
 
@@ -271,13 +322,7 @@ def obtener_usuario_por_id(user_id):
 @users_bp.route('/<int:user_id>/seguidores', methods=['GET'])
 @jwt_required()
 def obtener_seguidores(user_id):
-    relaciones = Seguimiento.query.filter_by(
-        id_seguido=user_id,
-        estado='aceptada'
-    ).filter(Seguimiento.tipo != 'amigo').all()
-
-    seguidores = [r.id_seguidor for r in relaciones]
-    usuarios = User.query.filter(User.id.in_(seguidores)).all()
+    usuarios = User.query.filter(User.id.in_(grafo.seguidores(user_id))).all()
     return jsonify([u.to_dict() for u in usuarios]), 200
 
 
@@ -285,13 +330,7 @@ def obtener_seguidores(user_id):
 @users_bp.route('/<int:user_id>/seguidos', methods=['GET'])
 @jwt_required()
 def obtener_seguidos(user_id):
-    relaciones = Seguimiento.query.filter_by(
-        id_seguidor=user_id,
-        estado='aceptada'
-    ).filter(Seguimiento.tipo != 'amigo').all()
-
-    seguidos = [r.id_seguido for r in relaciones]
-    usuarios = User.query.filter(User.id.in_(seguidos)).all()
+    usuarios = User.query.filter(User.id.in_(grafo.seguidos(user_id))).all()
     return jsonify([u.to_dict() for u in usuarios]), 200
 
 
@@ -299,24 +338,8 @@ def obtener_seguidos(user_id):
 @users_bp.route('/<int:user_id>/amigos', methods=['GET'])
 @jwt_required()
 def obtener_amigos(user_id):
-    relaciones_yo = Seguimiento.query.filter_by(
-        id_seguidor=user_id,
-        tipo='amigo',
-        estado='aceptada'
-    ).all()
-
-    posibles_amigos_ids = [r.id_seguido for r in relaciones_yo]
-
-    # Verifica reciprocidad
-    relaciones_ellos = Seguimiento.query.filter(
-        Seguimiento.id_seguidor.in_(posibles_amigos_ids),
-        Seguimiento.id_seguido == user_id,
-        Seguimiento.tipo == 'amigo',
-        Seguimiento.estado == 'aceptada'
-    ).all()
-
-    amigos_ids = [r.id_seguidor for r in relaciones_ellos]
-    usuarios = User.query.filter(User.id.in_(amigos_ids)).all()
+    # La caché del grafo ya comprueba la reciprocidad
+    usuarios = User.query.filter(User.id.in_(grafo.amigos(user_id))).all()
     return jsonify([u.to_dict() for u in usuarios]), 200
 
 
@@ -348,30 +371,16 @@ def subir_imagen_perfil():
         if file_size > 5 * 1024 * 1024:
             return jsonify({'error': 'La imagen excede el tamaño máximo (5 MB)'}), 400
 
-        # Eliminar foto anterior si existe
-        if usuario.foto_perfil:
-            try:
-                from pathlib import Path
-                relative_path = usuario.foto_perfil.replace('/usuarios/profile-images/', 'static/profile_images/')
-                old_path = Path(current_app.root_path) / relative_path
-                if old_path.exists():
-                    old_path.unlink()
-            except Exception as e:
-                print(f"Error eliminando imagen anterior: {e}")
-
-        # Crear nombre único y ruta
-        filename = secure_filename(imagen_file.filename)
-        unique_name = f"{uuid.uuid4().hex}.{ext}"
-
-        upload_path = os.path.join(current_app.root_path, 'static', 'profile_images')
-        os.makedirs(upload_path, exist_ok=True)
-
-        image_path = os.path.join(upload_path, unique_name)
-        imagen_file.save(image_path)
-
-        # Actualizar usuario
-        usuario.foto_perfil = f"/usuarios/profile-images/{unique_name}"
+        foto_anterior = usuario.foto_perfil
+
+        # Guardado por contenido: si la imagen ya existe solo suma una referencia
+        usuario.foto_perfil = media.guardar(imagen_file.read(), ext)
         db.session.commit()
+        encolar_variantes(usuario.foto_perfil)
+
+        # Liberar la foto anterior una vez guardada la nueva
+        if foto_anterior:
+            media.liberar_imagen(foto_anterior, 'profile_images')
 
         return jsonify({'foto_perfil': usuario.foto_perfil}), 200
 
@@ -382,9 +391,9 @@ def subir_imagen_perfil():
 
 @users_bp.route('/profile-images/<filename>')
 def serve_profile_image(filename):
-    from flask import current_app, send_from_directory
+    from flask import current_app
     upload_path = os.path.join(current_app.root_path, 'static', 'profile_images')
-    return send_from_directory(upload_path, filename)
+    return enviar_subida(upload_path, filename)
 
 
 @users_bp.route('/mis-publicaciones', methods=['GET'])
@@ -393,17 +402,21 @@ def publicaciones_propias():
     user_id = int(get_jwt_identity())
     usuario = User.query.get(user_id)
 
+    variante = variante_solicitada(request)
+
     publicaciones = Post.query.filter_by(id_usuario=user_id).order_by(Post.fecha_publicacion.desc()).all()
+    mis_likes = likes_del_usuario(user_id, [p.id for p in publicaciones])
+    likes_sin_volcar = likes_pendientes([p.id for p in publicaciones])
 
     return jsonify([{
         'id': p.id,
         'contenido': p.contenido,
-        'imagen_url': f"{current_app.config['BASE_URL']}{p.imagen_url}" if p.imagen_url else None,
+        'imagen_url': f"{current_app.config['BASE_URL']}{variant_url(p.imagen_url, variante)}" if p.imagen_url else None,
         'fecha': p.fecha_publicacion.isoformat(),
-        'usuario': p.usuario.username,
-        'foto_perfil': f"{current_app.config['BASE_URL']}{usuario.foto_perfil}" if usuario.foto_perfil else None,
-        'likes_count': Like.query.filter_by(id_publicacion=p.id).count(),
-        'ha_dado_like': any(l.id_usuario == user_id for l in p.likes),
+        'usuario': usuario.username,
+        'foto_perfil': f"{current_app.config['BASE_URL']}{variant_url(usuario.foto_perfil, variante, ANCHOS[0])}" if usuario.foto_perfil else None,
+        'likes_count': p.likes_count + likes_sin_volcar.get(p.id, 0),
+        'ha_dado_like': p.id in mis_likes,
         'visibilidad': p.visibilidad,
         'tipo_relacion': 'propia',
         'id_usuario': p.id_usuario
@@ -415,25 +428,29 @@ def publicaciones_propias():
 def publicaciones_guardadas():
     user_id = int(get_jwt_identity())
 
+    variante = variante_solicitada(request)
+
     favoritos = Favorito.query.filter_by(id_usuario=user_id).filter(Favorito.id_publicacion != None).all()
     publicaciones = [f.id_publicacion for f in favoritos]
 
-    from models import Post
-    posts = Post.query.filter(Post.id.in_(publicaciones)).order_by(Post.fecha_publicacion.desc()).all()
+    posts = Post.query.options(joinedload(Post.usuario))\
+        .filter(Post.id.in_(publicaciones)).order_by(Post.fecha_publicacion.desc()).all()
+    mis_likes = likes_del_usuario(user_id, [p.id for p in posts])
+    likes_sin_volcar = likes_pendientes([p.id for p in posts])
 
     return jsonify([{
         'id': p.id,
         'contenido': p.contenido,
-        'imagen_url': f"{current_app.config['BASE_URL']}{p.imagen_url}" if p.imagen_url else None,
+        'imagen_url': f"{current_app.config['BASE_URL']}{variant_url(p.imagen_url, variante)}" if p.imagen_url else None,
         'fecha': p.fecha_publicacion.isoformat(),
         'usuario': p.usuario.username,
         'id_usuario': p.id_usuario,
-        'foto_perfil': f"{current_app.config['BASE_URL']}{p.usuario.foto_perfil}" if p.usuario.foto_perfil else None,
-        'likes_count': len(p.likes),
+        'foto_perfil': f"{current_app.config['BASE_URL']}{variant_url(p.usuario.foto_perfil, variante, ANCHOS[0])}" if p.usuario.foto_perfil else None,
+        'likes_count': p.likes_count + likes_sin_volcar.get(p.id, 0),
         'visibilidad': p.visibilidad,
-        'ha_dado_like': any(l.id_usuario == user_id for l in p.likes),
+        'ha_dado_like': p.id in mis_likes,
         'tipo_relacion': 'guardado',
-        'guardado': Favorito.query.filter_by(id_usuario=user_id, id_publicacion=p.id).first() is not None
+        'guardado': True  # vienen de los favoritos del usuario
     } for p in posts]), 200
 
 
@@ -442,6 +459,8 @@ def publicaciones_guardadas():
 def prendas_guardadas():
     user_id = int(get_jwt_identity())
 
+    variante = variante_solicitada(request)
+
     favoritos = Favorito.query.filter_by(id_usuario=user_id).filter(Favorito.id_prenda != None).all()
     id_prendas = [f.id_prenda for f in favoritos]
 
@@ -457,7 +476,7 @@ def prendas_guardadas():
             'talla': p.talla,
             'color': p.color,
             'tipo': p.tipo.value,
-            'imagen_url': f"{current_app.config['BASE_URL']}{p.imagen_url}" if p.imagen_url else None,
+            'imagen_url': f"{current_app.config['BASE_URL']}{variant_url(p.imagen_url, variante)}" if p.imagen_url else None,
             'solicitable': p.solicitable,
             'fecha_agregado': p.fecha_agregado.isoformat(),
             'estacion': p.prendas_categorias[0].estacion.value if p.prendas_categorias else None,
@@ -476,17 +495,20 @@ def publicaciones_de_usuario(user_id):
     if not usuario:
         return jsonify({'error': 'Usuario no encontrado'}), 404
 
+    variante = variante_solicitada(request)
+
     publicaciones = Post.query.filter_by(id_usuario=user_id).order_by(Post.fecha_publicacion.desc()).all()
+    likes_sin_volcar = likes_pendientes([p.id for p in publicaciones])
 
     return jsonify([{
         'id': p.id,
         'contenido': p.contenido,
-        'imagen_url': f"{current_app.config['BASE_URL']}{p.imagen_url}" if p.imagen_url else None,
+        'imagen_url': f"{current_app.config['BASE_URL']}{variant_url(p.imagen_url, variante)}" if p.imagen_url else None,
         'fecha': p.fecha_publicacion.isoformat(),
         'usuario': usuario.username,
-        'foto_perfil': f"{current_app.config['BASE_URL']}{usuario.foto_perfil}" if usuario.foto_perfil else None,
+        'foto_perfil': f"{current_app.config['BASE_URL']}{variant_url(usuario.foto_perfil, variante, ANCHOS[0])}" if usuario.foto_perfil else None,
         'visibilidad': p.visibilidad,
-        'likes_count': len(p.likes),
+        'likes_count': p.likes_count + likes_sin_volcar.get(p.id, 0),
         'ha_dado_like': False,
         'id_usuario': p.id_usuario
     } for p in publicaciones]), 200
@@ -497,39 +519,35 @@ def publicaciones_de_usuario(user_id):
 def obtener_relacion_usuario(user_id):
     actual_id = int(get_jwt_identity())
 
-    amistad = Seguimiento.query.filter(
-        ((Seguimiento.id_seguidor == actual_id) & (Seguimiento.id_seguido == user_id)) |
-        ((Seguimiento.id_seguidor == user_id) & (Seguimiento.id_seguido == actual_id)),
-        Seguimiento.tipo == 'amigo',
-        Seguimiento.estado == 'aceptada'
-    ).first()
-
-    seguimiento = Seguimiento.query.filter_by(
-        id_seguidor=actual_id,
-        id_seguido=user_id,
-        tipo='seguidor'
-    ).first()
-
     response = {}
 
-    if amistad:
+    relacion = grafo.relacion(actual_id, user_id)
+
+    # Las solicitudes pendientes no están en la caché; con un seguimiento
+    # ya aceptado no puede haber otra pendiente
+    pendiente = None
+    if relacion != 'seguido':
+        pendiente = Seguimiento.query.filter_by(
+            id_seguidor=actual_id,
+            id_seguido=user_id,
+            tipo='seguidor',
+            estado='pendiente'
+        ).first()
+
+    if relacion == 'amigo':
         response['relacion'] = 'amigo'
         response['estado'] = 'aceptada'
-    elif seguimiento:
+    elif relacion == 'seguido':
         response['relacion'] = 'seguidor'
-        response['estado'] = seguimiento.estado
+        response['estado'] = 'aceptada'
+    elif pendiente:
+        response['relacion'] = 'seguidor'
+        response['estado'] = 'pendiente'
     else:
         response['relacion'] = None
         response['estado'] = None
 
-    solicitud_seguidor = Seguimiento.query.filter_by(
-        id_seguidor=actual_id,
-        id_seguido=user_id,
-        tipo='seguidor',
-        estado='pendiente'
-    ).first()
-
-    if solicitud_seguidor:
+    if pendiente:
         response['estado_seguidor'] = 'pendiente'
 
     return jsonify(response), 200
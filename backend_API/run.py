@@ -11,19 +11,22 @@ from routes.groups import groups_bp
 from routes.users import users_bp
 from routes.general import general_bp
 from routes.prendas import prendas_bp
+from routes.media import media_bp
+from commands import register_commands
 from flask_cors import CORS
 
 
 def create_app():
     app = Flask(__name__, static_folder='app/static')
     app.config.from_object(Config)
-    CORS(app, supports_credentials=True)
+    # Las listas paginadas devuelven el cursor y el total en cabeceras
+    CORS(app, supports_credentials=True, expose_headers=['X-Next-Cursor', 'X-Total-Count'])
 
     # Inicializa extensiones
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
-    socketio.init_app(app)
+    socketio.init_app(app, message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
 
     # Registra blueprints
     app.register_blueprint(auth_bp)
@@ -33,6 +36,10 @@ def create_app():
     app.register_blueprint(users_bp)
     app.register_blueprint(general_bp)
     app.register_blueprint(prendas_bp)
+    app.register_blueprint(media_bp)
+
+    # Comandos de mantenimiento (flask <comando>)
+    register_commands(app)
 
     return app
 
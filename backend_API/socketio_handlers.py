@@ -1,35 +1,133 @@
-from flask_socketio import join_room, emit
+from flask import request, session, current_app
+from flask_jwt_extended import decode_token
+from flask_socketio import join_room, leave_room, emit, disconnect
 from extensions import socketio
+from models import GrupoUsuario, Post
+from utils.realtime import sala_post
+from utils.feed import puede_ver
+from utils import presence
+from utils.message_acks import confirmar, ENTREGADO, LEIDO
+
+
+def _usuario_del_token(token):
+    """Id del usuario de un JWT de acceso válido, o None."""
+    if not token:
+        return None
+    try:
+        return int(decode_token(token)['sub'])
+    except Exception:
+        return None
+
+
+def _token_de_la_conexion(auth):
+    # Se acepta el token en el `auth` del handshake, en la cabecera
+    # Authorization o en el parámetro ?token= de la URL
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    cabecera = request.headers.get('Authorization', '')
+    if cabecera.startswith('Bearer '):
+        return cabecera[len('Bearer '):]
+    return request.args.get('token')
+
+
+def usuario_autenticado():
+    return session.get('user_id')
+
 
 @socketio.on('connect')
-def on_connect():
-    print('Usuario conectado vía Socket.IO')
+def on_connect(auth=None):
+    user_id = _usuario_del_token(_token_de_la_conexion(auth))
+    if user_id is not None:
+        session['user_id'] = user_id
+        join_room(str(user_id))
+        presence.conectar(user_id, request.sid)
+    print(f'Usuario conectado vía Socket.IO (id={user_id})')
 
 @socketio.on('disconnect')
 def on_disconnect():
-    print('Usuario desconectado')
+    user_id = usuario_autenticado()
+    if user_id is not None:
+        presence.desconectar(user_id, request.sid)
+    print(f'Usuario desconectado (id={user_id})')
 
 @socketio.on('join')
 def on_join(data):
-    user_id = str(data['user_id'])
-    join_room(user_id)
+    # La sala personal se decide por el JWT, no por el id que envía el cliente
+    user_id = _usuario_del_token((data or {}).get('token')) or usuario_autenticado()
+    if user_id is None:
+        emit('error_autenticacion', {'error': 'Token no válido'})
+        disconnect()
+        return
+
+    session['user_id'] = user_id
+    join_room(str(user_id))
+    presence.conectar(user_id, request.sid)
     print(f'Usuario {user_id} se unió a su sala')
 
+@socketio.on('latido')
+def on_latido(data=None):
+    # Cada dispositivo renueva su presencia periódicamente
+    user_id = usuario_autenticado()
+    if user_id is not None:
+        presence.latido(user_id, request.sid)
+
+@socketio.on('mensajes_entregados')
+def on_mensajes_entregados(data):
+    user_id = usuario_autenticado()
+    if user_id is not None:
+        confirmar(current_app._get_current_object(), user_id, list(data.get('ids', [])), ENTREGADO)
+
+@socketio.on('mensajes_leidos')
+def on_mensajes_leidos(data):
+    user_id = usuario_autenticado()
+    if user_id is not None:
+        confirmar(current_app._get_current_object(), user_id, list(data.get('ids', [])), LEIDO)
+
 @socketio.on('mensaje_directo')
 def on_mensaje_directo(data):
+    user_id = usuario_autenticado()
+    if user_id is None:
+        return
+
     receptor_id = str(data['id_receptor'])
-    emit('nuevo_mensaje', data, to=receptor_id)
+    emit('nuevo_mensaje', {**data, 'id_emisor': user_id}, to=receptor_id)
     print(f' Emitiendo mensaje a usuario {receptor_id}')
 
 @socketio.on('join_group')
 def on_join_group(data):
-    group_id = f'grupo_{data["grupo_id"]}'
+    user_id = usuario_autenticado()
+    grupo_id = data.get('grupo_id')
+    if user_id is None or not GrupoUsuario.query.filter_by(id_grupo=grupo_id, id_usuario=user_id).first():
+        emit('error_grupo', {'grupo_id': grupo_id, 'error': 'No perteneces a este grupo'})
+        return
+
+    group_id = f'grupo_{grupo_id}'
     join_room(group_id)
-    print(f'Usuario se unió a grupo {group_id}')
+    print(f'Usuario {user_id} se unió a grupo {group_id}')
 
 
 @socketio.on('mensaje_grupo')
 def on_mensaje_grupo(data):
-    grupo_id = f'grupo_{data["grupo_id"]}'
-    emit('nuevo_mensaje_grupo', data, to=grupo_id)
-    print(f'Emitiendo mensaje al grupo {grupo_id}')
+    user_id = usuario_autenticado()
+    grupo_id = data.get('grupo_id')
+    if user_id is None or not GrupoUsuario.query.filter_by(id_grupo=grupo_id, id_usuario=user_id).first():
+        return
+
+    emit('nuevo_mensaje_grupo', {**data, 'id_usuario': user_id}, to=f'grupo_{grupo_id}')
+    print(f'Emitiendo mensaje al grupo grupo_{grupo_id}')
+
+
+@socketio.on('suscribir_post')
+def on_suscribir_post(data):
+    # Solo los suscritos a una publicación reciben sus comentarios y likes
+    # Misma regla de visibilidad que los comentarios de la publicación
+    user_id = usuario_autenticado()
+    post = Post.query.get(data.get('post_id')) if user_id is not None else None
+    if post is None or not puede_ver(user_id, post):
+        return
+    join_room(sala_post(post.id))
+
+
+@socketio.on('desuscribir_post')
+def on_desuscribir_post(data):
+    leave_room(sala_post(data.get('post_id')))
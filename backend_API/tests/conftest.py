@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+# La aplicación corre parcheada por gevent (ver run.py); los tests igual
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+# Los módulos se importan como en la aplicación: `from utils import ...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def servidor_http():
+    """
+    Arranca servidores HTTP locales en hilos. Se llama con una función
+    `responder(handler)` que atiende cada GET y devuelve la URL base.
+    """
+    servidores = []
+
+    def arrancar(responder):
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                responder(self)
+
+            def log_message(self, *args):
+                pass
+
+        servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores.append(servidor)
+        return f"http://127.0.0.1:{servidor.server_port}/"
+
+    yield arrancar
+
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def responder_json(handler, datos, estado=200, cabeceras=None):
+    import json
+
+    cuerpo = json.dumps(datos).encode('utf-8')
+    handler.send_response(estado)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Content-Length', str(len(cuerpo)))
+    for nombre, valor in (cabeceras or {}).items():
+        handler.send_header(nombre, valor)
+    handler.end_headers()
+    handler.wfile.write(cuerpo)
@@ -0,0 +1,135 @@
+import csv
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("pandas")
+
+from conftest import responder_json  # noqa: E402
+from utils import crawler  # noqa: E402
+
+
+class CatalogoFalso:
+    """
+    API de artículos de Zalando simulada: `total` productos por búsqueda,
+    un 429 con Retry-After en la primera página y un 503 pasajero en la segunda.
+    """
+
+    def __init__(self, total=25, ruta_csv=None):
+        self.total = total
+        self.ruta_csv = ruta_csv
+        self.lock = threading.Lock()
+        self.peticiones = []
+        self.fallos = {(0, 429): 1, (10, 503): 1}
+        self.filas_al_pedir_tercera = None
+
+    def __call__(self, handler):
+        params = parse_qs(urlparse(handler.path).query)
+        offset, limite = int(params['offset'][0]), int(params['limit'][0])
+        palabra = params.get('q', [''])[0]
+
+        with self.lock:
+            self.peticiones.append((time.monotonic(), offset))
+            for (desde, estado), pendientes in self.fallos.items():
+                if desde == offset and pendientes:
+                    self.fallos[(desde, estado)] -= 1
+                    cabeceras = {'Retry-After': '0.2'} if estado == 429 else {}
+                    return responder_json(handler, {}, estado, cabeceras)
+
+        if offset == 2 * limite and self.ruta_csv:
+            # Lo ya rastreado debe estar en disco antes de terminar
+            with open(self.ruta_csv, newline='', encoding='utf-8') as f:
+                self.filas_al_pedir_tercera = len(list(csv.DictReader(f)))
+
+        articulos = [{
+            "name": f"Camiseta {i}",
+            "price": {"formatted": "19,99 €"},
+            "media": {"images": [{"smallUrl": f"https://img.example/{i}.jpg"}]},
+            "url": f"/camiseta-{palabra}-{i}.html"
+        } for i in range(offset, min(offset + limite, self.total))]
+        responder_json(handler, {"articles": articulos})
+
+
+def _filas(ruta):
+    with open(ruta, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _rastrear(url, ruta, palabras, **opciones):
+    return crawler.rastrear(
+        "zalando", ruta, ["clothing-men"], palabras,
+        max_paginas=10, tam_pagina=10, hilos=2, reintentos=3, espera_base=0.05,
+        url=url, **opciones
+    )
+
+
+def test_recorre_paginas_reintenta_y_escribe_incrementalmente(servidor_http, tmp_path):
+    ruta = str(tmp_path / "productos.csv")
+    catalogo = CatalogoFalso(total=25, ruta_csv=ruta)
+    url = servidor_http(catalogo)
+
+    assert _rastrear(url, ruta, ["negro"], por_segundo=20) == 25
+
+    # 3 páginas con productos + 1 vacía que detiene la paginación + 429 + 503
+    assert [offset for _, offset in catalogo.peticiones] == [0, 0, 10, 10, 20, 30]
+    assert catalogo.filas_al_pedir_tercera == 20
+
+    filas = _filas(ruta)
+    assert len(filas) == 25
+    assert len({f["enlace"] for f in filas}) == 25
+    assert filas[0]["tienda"] == "zalando"
+    assert filas[0]["precio"] == "19,99 €"
+
+
+def test_respeta_el_limite_de_peticiones_por_segundo(servidor_http, tmp_path, monkeypatch):
+    catalogo = CatalogoFalso(total=30)
+    catalogo.fallos = {}
+    url = servidor_http(catalogo)
+
+    # Turnos que reparte el limitador: no dependen de cuándo los hilos
+    # llegan a enviar la petición ni de cuándo la atiende el servidor
+    turnos = []
+    esperar = crawler.Limitador.esperar
+
+    def registrar(limitador):
+        turnos.append(esperar(limitador))
+        return turnos[-1]
+
+    monkeypatch.setattr(crawler.Limitador, 'esperar', registrar)
+
+    _rastrear(url, str(tmp_path / "productos.csv"), ["negro", "blanco", "rojo"], por_segundo=10)
+
+    assert len(turnos) == len(catalogo.peticiones) == 12
+    turnos.sort()
+    assert min(b - a for a, b in zip(turnos, turnos[1:])) >= 0.1 - 1e-9
+
+    # En el servidor, solo el total: los huecos sueltos incluyen el jitter de los hilos
+    llegadas = sorted(t for t, _ in catalogo.peticiones)
+    assert llegadas[-1] - llegadas[0] >= 11 * 0.1 * 0.9
+
+
+def test_no_repite_productos_entre_ejecuciones(servidor_http, tmp_path):
+    ruta = str(tmp_path / "productos.csv")
+    url = servidor_http(CatalogoFalso(total=25))
+
+    assert _rastrear(url, ruta, ["negro"], por_segundo=50) == 25
+    contenido = open(ruta, encoding='utf-8').read()
+
+    url = servidor_http(CatalogoFalso(total=25))
+    assert _rastrear(url, ruta, ["negro"], por_segundo=50) == 0
+    assert open(ruta, encoding='utf-8').read() == contenido
+
+
+def test_abandona_la_busqueda_al_agotar_los_reintentos(servidor_http, tmp_path):
+    ruta = str(tmp_path / "productos.csv")
+    catalogo = CatalogoFalso(total=5)
+    catalogo.fallos = {(0, 503): 100}
+    url = servidor_http(catalogo)
+
+    assert _rastrear(url, ruta, ["negro"], por_segundo=50) == 0
+    # Intento inicial + 3 reintentos
+    assert len(catalogo.peticiones) == 4
+    assert _filas(ruta) == []
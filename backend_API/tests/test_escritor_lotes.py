@@ -0,0 +1,52 @@
+import pytest
+
+gevent = pytest.importorskip("gevent")
+pytest.importorskip("flask_sqlalchemy")
+
+from utils.escritor_lotes import EscritorLotes  # noqa: E402
+
+
+def _escritor(**opciones):
+    lotes = []
+    escritor = EscritorLotes("pruebas", lotes.append, **{'tam_lote': 3, 'intervalo': 0.2, **opciones})
+    return escritor, lotes
+
+
+def test_agrupa_por_tamano_y_por_intervalo():
+    escritor, lotes = _escritor()
+
+    for i in range(4):
+        escritor.encolar(i)
+    gevent.sleep(0.05)
+    # El lote lleno se escribe sin esperar al intervalo
+    assert lotes == [[0, 1, 2]]
+
+    gevent.sleep(0.3)
+    assert lotes == [[0, 1, 2], [3]]
+
+
+def test_cola_llena_y_vaciado_inmediato():
+    escritor, lotes = _escritor(max_cola=2, intervalo=10)
+
+    # Sin ceder al greenlet, la cola no se consume
+    assert [escritor.encolar(i) for i in range(3)] == [True, True, False]
+    assert escritor.pendientes() == 2
+
+    escritor.vaciar()
+    assert lotes == [[0, 1]]
+    assert escritor.pendientes() == 0
+
+
+def test_un_error_al_escribir_no_detiene_el_escritor():
+    lotes = []
+
+    def escribir(lote):
+        if lote == ['falla']:
+            raise RuntimeError("sin conexión")
+        lotes.append(lote)
+
+    escritor = EscritorLotes("pruebas", escribir, tam_lote=1, intervalo=0.05)
+    escritor.encolar('falla')
+    escritor.encolar('bien')
+    gevent.sleep(0.1)
+    assert lotes == [['bien']]
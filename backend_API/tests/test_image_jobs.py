@@ -0,0 +1,38 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+pytest.importorskip("gevent")
+pytest.importorskip("flask")
+
+from utils import image_jobs  # noqa: E402
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Un pool ligero con el mismo ciclo de vida que los de rembg y variantes
+    monkeypatch.setitem(image_jobs.POOLS, 'pruebas', (1, None))
+    yield 'pruebas'
+    image_jobs.cerrar_pools()
+
+
+def test_un_pool_roto_se_vuelve_a_crear(pool):
+    pid = image_jobs._enviar(pool, os.getpid).result(timeout=30)
+
+    # Un hijo que muere rompe el pool entero
+    with pytest.raises(BrokenProcessPool):
+        image_jobs._enviar(pool, os._exit, 1).result(timeout=30)
+
+    nuevo = image_jobs._enviar(pool, os.getpid).result(timeout=30)
+    assert nuevo != pid
+
+
+def test_cerrar_pools_los_descarta(pool):
+    image_jobs._enviar(pool, os.getpid).result(timeout=30)
+    anterior = image_jobs._pools[pool]
+
+    image_jobs.cerrar_pools()
+    assert pool not in image_jobs._pools
+    with pytest.raises(RuntimeError):
+        anterior.submit(os.getpid)
@@ -0,0 +1,141 @@
+import os
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("flask_sqlalchemy")
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+
+from extensions import db  # noqa: E402
+from utils import likes  # noqa: E402
+
+# Postgres con permiso para crear bases de datos; cada test usa una nueva
+# creada con los scripts del repo, como una instalación real
+DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CREATETABLE = os.path.join(RAIZ, 'database', 'createtable.sql')
+MIGRACIONES = os.path.join(RAIZ, 'database', 'migraciones.sql')
+
+
+def _ejecutar(url, *sentencias):
+    conexion = psycopg2.connect(url)
+    conexion.autocommit = True
+    try:
+        with conexion.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+    finally:
+        conexion.close()
+
+
+def _script(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture
+def base_de_datos():
+    """URL de una base de datos vacía que se borra al terminar."""
+    if not DATABASE_URL:
+        pytest.skip("Sin Postgres de pruebas (TEST_DATABASE_URL)")
+    try:
+        _ejecutar(DATABASE_URL, "SELECT 1")
+    except psycopg2.OperationalError:
+        pytest.skip(f"Postgres no disponible en {DATABASE_URL}")
+
+    nombre = f"pruebas_likes_{uuid.uuid4().hex[:12]}"
+    _ejecutar(DATABASE_URL, f'CREATE DATABASE "{nombre}"')
+    partes = urlsplit(DATABASE_URL)
+    try:
+        yield urlunsplit(partes._replace(path=f"/{nombre}"))
+    finally:
+        _ejecutar(DATABASE_URL, f'DROP DATABASE IF EXISTS "{nombre}" WITH (FORCE)')
+
+
+@pytest.fixture
+def app(base_de_datos, monkeypatch):
+    _ejecutar(base_de_datos, _script(CREATETABLE), _script(MIGRACIONES))
+
+    # Escritura directa en Postgres, sin el búfer de Redis
+    monkeypatch.setattr(likes, 'MODO_BUFER', False)
+
+    app = Flask(__name__)
+    # Mismo driver que usa el test para cargar los scripts
+    app.config['SQLALCHEMY_DATABASE_URI'] = make_url(base_de_datos).set(drivername='postgresql+psycopg2')
+    db.init_app(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _publicacion():
+    autor = db.session.execute(text(
+        "INSERT INTO usuarios (username) VALUES (:nombre) RETURNING id"
+    ), {'nombre': f"autor_{uuid.uuid4().hex[:8]}"}).scalar()
+    post_id = db.session.execute(text(
+        "INSERT INTO publicaciones (id_usuario, contenido) VALUES (:autor, 'hola') RETURNING id"
+    ), {'autor': autor}).scalar()
+    db.session.commit()
+    return autor, post_id
+
+
+def _likes(post_id):
+    return db.session.execute(text(
+        "SELECT COUNT(*), (SELECT likes_count FROM publicaciones WHERE id = :post_id) "
+        "FROM likes WHERE id_publicacion = :post_id"
+    ), {'post_id': post_id}).one()
+
+
+def test_alternar_like_con_el_esquema_de_los_scripts(app):
+    autor, post_id = _publicacion()
+
+    assert likes.alternar_like(autor, post_id) == (True, 1)
+    assert _likes(post_id) == (1, 1)
+    assert likes.alternar_like(autor, post_id) == (False, 0)
+    assert _likes(post_id) == (0, 0)
+    assert likes.alternar_like(autor, post_id + 1000) is None
+
+
+def test_volcado_del_bufer_no_duplica_likes(app):
+    autor, post_id = _publicacion()
+
+    likes._escribir(post_id, {autor: True})
+    # Un volcado repetido (p. ej. tras un fallo) choca con unique_like y no cuenta dos veces
+    likes._escribir(post_id, {autor: True})
+    assert _likes(post_id) == (1, 1)
+
+    likes._escribir(post_id, {autor: False})
+    assert _likes(post_id) == (0, 0)
+
+
+def test_migracion_elimina_duplicados_y_crea_la_restriccion(base_de_datos):
+    _ejecutar(
+        base_de_datos,
+        _script(CREATETABLE),
+        # Una base de datos anterior a la restricción, con likes repetidos
+        "ALTER TABLE likes DROP CONSTRAINT unique_like",
+        "INSERT INTO usuarios (id, username) VALUES (1, 'ana'), (2, 'luis')",
+        "INSERT INTO publicaciones (id, id_usuario) VALUES (1, 1)",
+        "INSERT INTO likes (id_usuario, id_publicacion) VALUES (1, 1), (1, 1), (2, 1)",
+        _script(MIGRACIONES),
+        # Se puede ejecutar más de una vez
+        _script(MIGRACIONES),
+    )
+
+    conexion = psycopg2.connect(base_de_datos)
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT id_usuario FROM likes ORDER BY id")
+            assert cursor.fetchall() == [(1,), (2,)]
+            cursor.execute("SELECT likes_count FROM publicaciones WHERE id = 1")
+            assert cursor.fetchone() == (2,)
+            with pytest.raises(psycopg2.errors.UniqueViolation):
+                cursor.execute("INSERT INTO likes (id_usuario, id_publicacion) VALUES (1, 1)")
+    finally:
+        conexion.close()
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+gevent = pytest.importorskip("gevent")
+pytest.importorskip("requests")
+pytest.importorskip("flask")
+
+from conftest import responder_json  # noqa: E402
+from utils import shopping  # noqa: E402
+
+
+class SerpApiFalso:
+    """Sustituto de SerpApi que cuenta las peticiones y tarda `retardo` en responder."""
+
+    def __init__(self, retardo=0.3):
+        self.retardo = retardo
+        self.peticiones = 0
+        self.version = 1
+        self.vacio = False
+        self.lock = threading.Lock()
+
+    def __call__(self, handler):
+        with self.lock:
+            self.peticiones += 1
+            version = self.version
+        time.sleep(self.retardo)
+
+        resultados = [] if self.vacio else [{
+            "title": f"Camiseta negra v{version}",
+            "source": "Tienda",
+            "price": "9,99 €",
+            "link": "https://tienda.example/camiseta"
+        }]
+        responder_json(handler, {"shopping_results": resultados})
+
+
+@pytest.fixture
+def serpapi(servidor_http, monkeypatch):
+    falso = SerpApiFalso()
+    monkeypatch.setattr(shopping, 'SERPAPI_URL', servidor_http(falso))
+    # Caché en memoria del proceso; la de Redis se comporta igual
+    monkeypatch.setattr(shopping, 'redis_client', None)
+    shopping._local.clear()
+    shopping._en_curso.clear()
+    return falso
+
+
+def _envejecer(consulta, segundos):
+    shopping._local[shopping._clave(shopping.normalizar(consulta))]['t'] -= segundos
+
+
+def _producto(prendas):
+    return prendas[0]['product']
+
+
+def test_consultas_identicas_concurrentes_hacen_una_llamada(serpapi):
+    consultas = ["Camiseta negra", "camiseta  NEGRA", " camiseta negra "] * 4
+    greenlets = [gevent.spawn(shopping.buscar, consulta) for consulta in consultas]
+    gevent.joinall(greenlets, raise_error=True)
+
+    assert serpapi.peticiones == 1
+    assert {_producto(g.value) for g in greenlets} == {"Camiseta negra v1"}
+
+
+def test_entrada_caducada_se_sirve_mientras_se_refresca(serpapi, monkeypatch):
+    monkeypatch.setattr(shopping, 'TTL', 5)
+    shopping.buscar("camiseta negra")
+    _envejecer("camiseta negra", 10)
+    serpapi.version = 2
+
+    # Todas reciben al instante el resultado antiguo; solo se lanza un refresco
+    inicio = time.monotonic()
+    greenlets = [gevent.spawn(shopping.buscar, "camiseta negra") for _ in range(5)]
+    gevent.joinall(greenlets, raise_error=True)
+    assert time.monotonic() - inicio < serpapi.retardo
+    assert {_producto(g.value) for g in greenlets} == {"Camiseta negra v1"}
+
+    gevent.sleep(serpapi.retardo * 3)
+    assert serpapi.peticiones == 2
+    assert _producto(shopping.buscar("camiseta negra")) == "Camiseta negra v2"
+    assert serpapi.peticiones == 2
+
+
+def test_pasado_el_ttl_maximo_se_vuelve_a_consultar(serpapi, monkeypatch):
+    monkeypatch.setattr(shopping, 'TTL_MAX', 60)
+    shopping.buscar("camiseta negra")
+    _envejecer("camiseta negra", 120)
+    serpapi.version = 2
+
+    assert _producto(shopping.buscar("camiseta negra")) == "Camiseta negra v2"
+    assert serpapi.peticiones == 2
+
+
+def test_respuesta_vacia_se_recuerda_poco_tiempo(serpapi, monkeypatch):
+    monkeypatch.setattr(shopping, 'TTL_VACIO', 5)
+    serpapi.vacio = True
+
+    assert shopping.buscar("camiseta negra") == []
+    assert shopping.buscar("camiseta negra") == []
+    assert serpapi.peticiones == 1
+
+    # Caducada, se sirve vacía mientras se pide de nuevo
+    _envejecer("camiseta negra", 10)
+    serpapi.vacio = False
+    assert shopping.buscar("camiseta negra") == []
+    gevent.sleep(serpapi.retardo * 3)
+    assert _producto(shopping.buscar("camiseta negra")) == "Camiseta negra v1"
+    assert serpapi.peticiones == 2
@@ -0,0 +1,120 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+redis = pytest.importorskip("redis")
+socketio = pytest.importorskip("socketio")
+jwt = pytest.importorskip("jwt")
+pytest.importorskip("flask_socketio")
+
+# Redis compartido por los workers como cola de mensajes de Socket.IO
+REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+SECRETO = "secreto-de-pruebas-de-socketio-cluster"
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER = "import run; run.socketio.run(run.app, host='127.0.0.1', port={puerto}, use_reloader=False)"
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    try:
+        redis.Redis.from_url(REDIS_URL, socket_connect_timeout=1).ping()
+    except Exception:
+        pytest.skip(f"Redis no disponible en {REDIS_URL} (TEST_REDIS_URL)")
+    return REDIS_URL
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar_puerto(puerto, proceso, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El worker del puerto {puerto} terminó al arrancar")
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El worker del puerto {puerto} no arrancó")
+
+
+@pytest.fixture
+def workers(redis_url):
+    """Dos procesos de la aplicación que solo comparten la cola de Redis."""
+    entorno = {
+        **os.environ,
+        'SOCKETIO_MESSAGE_QUEUE': redis_url,
+        'REDIS_URL': redis_url,
+        'SECRET_KEY': SECRETO,
+        'JWT_SECRET_KEY': SECRETO,
+        'DATABASE_URL': os.getenv('DATABASE_URL', 'sqlite://'),
+    }
+
+    procesos, urls = [], []
+    try:
+        for _ in range(2):
+            puerto = _puerto_libre()
+            proceso = subprocess.Popen(
+                [sys.executable, '-c', WORKER.format(puerto=puerto)],
+                cwd=BACKEND, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            procesos.append(proceso)
+            _esperar_puerto(puerto, proceso)
+            urls.append(f"http://127.0.0.1:{puerto}")
+        yield urls
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.wait(10)
+
+
+def _token(user_id):
+    ahora = int(time.time())
+    return jwt.encode({
+        'sub': str(user_id),
+        'type': 'access',
+        'fresh': False,
+        'jti': uuid.uuid4().hex,
+        'iat': ahora,
+        'nbf': ahora,
+        'exp': ahora + 600,
+    }, SECRETO, algorithm='HS256')
+
+
+def test_emit_de_un_worker_llega_a_un_cliente_de_otro(workers):
+    recibidos = []
+    llegado = threading.Event()
+
+    emisor = socketio.Client()
+    receptor = socketio.Client()
+
+    @receptor.on('nuevo_mensaje')
+    def al_recibir(datos):
+        recibidos.append(datos)
+        llegado.set()
+
+    receptor.connect(workers[1], auth={'token': _token(2)})
+    emisor.connect(workers[0], auth={'token': _token(1)})
+    try:
+        # La suscripción de cada worker a la cola puede tardar un instante
+        for _ in range(20):
+            emisor.emit('mensaje_directo', {'id_receptor': 2, 'mensaje': 'hola'})
+            if llegado.wait(0.5):
+                break
+
+        assert recibidos, "el mensaje no cruzó de un worker a otro"
+        assert recibidos[0]['id_emisor'] == 1
+        assert recibidos[0]['mensaje'] == 'hola'
+    finally:
+        emisor.disconnect()
+        receptor.disconnect()
@@ -0,0 +1,107 @@
+import json
+import os
+from datetime import datetime
+
+from extensions import logs_collection
+from utils.escritor_lotes import EscritorLotes
+
+# Tamaño máximo de la cola en memoria antes de derramar a disco o descartar
+MAX_COLA = int(os.getenv("ACTIVITY_LOG_QUEUE_SIZE", 10000))
+# Se escribe en MongoDB al reunir TAM_LOTE eventos o tras INTERVALO segundos
+TAM_LOTE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", 200))
+INTERVALO = float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL", 1.0))
+# Fichero JSON Lines donde se guardan los eventos que no caben o no se pueden escribir
+RUTA_DERRAME = os.getenv("ACTIVITY_LOG_SPILL_PATH")
+
+_contadores = {
+    "encolados": 0,
+    "escritos": 0,
+    "descartados": 0,
+    "derramados": 0,
+    "errores_escritura": 0,
+}
+
+
+def log_event(evento, **campos):
+    """
+    Registra un evento de actividad sin bloquear la petición. El documento
+    se encola y un greenlet en segundo plano lo escribe por lotes.
+    """
+    if logs_collection is None:
+        return
+
+    documento = {"evento": evento, **campos, "timestamp": datetime.utcnow()}
+
+    if _escritor.encolar(documento):
+        _contadores["encolados"] += 1
+    else:
+        _derramar([documento])
+
+
+def estadisticas():
+    """Contadores del registro de actividad y eventos pendientes en cola."""
+    return {**_contadores, "en_cola": _escritor.pendientes()}
+
+
+def vaciar():
+    """Escribe de inmediato todo lo pendiente (se llama también al salir)."""
+    _escritor.vaciar()
+
+
+def reenviar_derramados():
+    """Reenvía a MongoDB los eventos derramados a disco. Devuelve cuántos se enviaron."""
+    if logs_collection is None or not RUTA_DERRAME or not os.path.exists(RUTA_DERRAME):
+        return 0
+
+    pendiente = f"{RUTA_DERRAME}.reenvio"
+    os.replace(RUTA_DERRAME, pendiente)
+
+    documentos = []
+    with open(pendiente, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                documento = json.loads(linea)
+                documento["timestamp"] = datetime.fromisoformat(documento["timestamp"])
+                documentos.append(documento)
+
+    for i in range(0, len(documentos), TAM_LOTE):
+        logs_collection.insert_many(documentos[i:i + TAM_LOTE], ordered=False)
+
+    os.remove(pendiente)
+    return len(documentos)
+
+
+def _escribir(lote):
+    try:
+        logs_collection.insert_many(lote, ordered=False)
+        _contadores["escritos"] += len(lote)
+    except Exception as e:
+        _contadores["errores_escritura"] += 1
+        print(f"Error escribiendo logs de actividad: {e}")
+        _derramar(lote)
+
+
+def _derramar(documentos):
+    # Sin fichero de derrame configurado, los eventos se descartan
+    if not RUTA_DERRAME:
+        _contadores["descartados"] += len(documentos)
+        return
+
+    try:
+        with open(RUTA_DERRAME, "a", encoding="utf-8") as f:
+            for documento in documentos:
+                documento.pop("_id", None)
+                f.write(json.dumps(documento, default=_serializar, ensure_ascii=False) + "\n")
+        _contadores["derramados"] += len(documentos)
+    except Exception as e:
+        print(f"Error derramando logs de actividad a disco: {e}")
+        _contadores["descartados"] += len(documentos)
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+_escritor = EscritorLotes("logs de actividad", _escribir, TAM_LOTE, INTERVALO, max_cola=MAX_COLA)
@@ -0,0 +1,128 @@
+import csv
+import os
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from extensions import db
+from models import ProductoCatalogo
+from utils.crawler import SALIDAS
+
+# Catálogo local con los productos que exportan los scrapers de tiendas. Se
+# consulta antes que SerpApi en /api/search-prendas. Por defecto se importa
+# lo que deja el crawler (CSV en la raíz del repo).
+EXPORTS = {
+    'Zalando': SALIDAS['zalando'],
+    'Shein': SALIDAS['shein'],
+}
+LIMITE = 30
+TAM_LOTE = 500
+
+_NUMERO = re.compile(r'\d[\d.,]*')
+
+
+def parsear_precio(texto):
+    """'19,99 €', '€1.299,00' o '12.5' -> Decimal; None si no hay número."""
+    if texto is None:
+        return None
+    coincidencia = _NUMERO.search(str(texto))
+    if not coincidencia:
+        return None
+
+    numero = coincidencia.group().rstrip('.,')
+    # El último separador con dos o menos decimales detrás es el decimal
+    ultimo = max(numero.rfind(','), numero.rfind('.'))
+    if ultimo != -1 and len(numero) - ultimo - 1 <= 2:
+        entero, decimales = numero[:ultimo], numero[ultimo + 1:]
+    else:
+        entero, decimales = numero, ''
+    entero = entero.replace(',', '').replace('.', '')
+
+    try:
+        return Decimal(f"{entero or 0}.{decimales or 0}").quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def leer_export(ruta):
+    """Filas {nombre, precio, imagen, enlace} de un CSV o Excel de los scrapers."""
+    if not os.path.exists(ruta) or os.path.getsize(ruta) <= 1:
+        return []
+
+    if ruta.lower().endswith('.csv'):
+        with open(ruta, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+
+    import pandas as pd
+    df = pd.read_excel(ruta, engine="openpyxl")
+    return df.where(df.notna(), None).to_dict('records')
+
+
+def normalizar(tienda, fila):
+    nombre = (fila.get('nombre') or '').strip()
+    enlace = (fila.get('enlace') or '').strip()
+    if not nombre or not enlace:
+        return None
+
+    precio_texto = fila.get('precio')
+    precio_texto = str(precio_texto).strip() if precio_texto is not None else None
+    return {
+        'tienda': tienda,
+        'nombre': nombre[:300],
+        'precio': parsear_precio(precio_texto),
+        'precio_texto': precio_texto[:50] if precio_texto else None,
+        'imagen': fila.get('imagen') or None,
+        'enlace': enlace,
+        'fecha_actualizacion': datetime.utcnow(),
+    }
+
+
+def importar(filas_por_tienda):
+    """
+    Inserta o actualiza (por enlace) los productos de {tienda: filas}.
+    Devuelve el número de productos importados.
+    """
+    total = 0
+    for tienda, filas in filas_por_tienda.items():
+        # Un enlace repetido en el mismo lote haría fallar el ON CONFLICT
+        productos = {}
+        for fila in filas:
+            producto = normalizar(tienda, fila)
+            if producto:
+                productos[producto['enlace']] = producto
+        productos = list(productos.values())
+
+        for i in range(0, len(productos), TAM_LOTE):
+            sentencia = insert(ProductoCatalogo).values(productos[i:i + TAM_LOTE])
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=[ProductoCatalogo.enlace],
+                set_={columna: sentencia.excluded[columna] for columna in
+                      ('tienda', 'nombre', 'precio', 'precio_texto', 'imagen', 'fecha_actualizacion')}
+            )
+            db.session.execute(sentencia)
+        total += len(productos)
+
+    db.session.commit()
+    return total
+
+
+def importar_exports(rutas=None):
+    """Importa los exports de los scrapers (por defecto, los de la raíz del repo)."""
+    rutas = rutas or EXPORTS
+    return importar({tienda: leer_export(ruta) for tienda, ruta in rutas.items()})
+
+
+def buscar(consulta, limite=LIMITE):
+    """
+    Productos del catálogo cuyo nombre contiene todas las palabras de la
+    consulta, usando el índice GIN sobre to_tsvector(nombre).
+    """
+    documento = func.to_tsvector('simple', ProductoCatalogo.nombre)
+    busqueda = func.plainto_tsquery('simple', consulta)
+
+    return ProductoCatalogo.query.filter(documento.op('@@')(busqueda))\
+        .order_by(func.ts_rank(documento, busqueda).desc(), ProductoCatalogo.precio.asc().nullslast())\
+        .limit(limite).all()
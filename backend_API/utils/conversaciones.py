@@ -0,0 +1,96 @@
+from sqlalchemy import case, func, or_, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from extensions import db
+from models import Conversacion, User
+
+# Longitud máxima del texto de vista previa en la bandeja de entrada
+LONGITUD_VISTA_PREVIA = 200
+
+
+def vista_previa(mensaje):
+    if mensaje.mensaje:
+        return mensaje.mensaje[:LONGITUD_VISTA_PREVIA]
+    return "Publicación compartida" if mensaje.id_publicacion else ""
+
+
+def registrar_mensaje(mensaje):
+    """
+    Actualiza el resumen de la conversación con un mensaje ya insertado
+    (con id) y suma un no leído al receptor. No hace commit: debe ir en la
+    misma transacción que el mensaje.
+    """
+    emisor, receptor = int(mensaje.id_emisor), int(mensaje.id_receptor)
+    if emisor == receptor:
+        return
+    a, b = min(emisor, receptor), max(emisor, receptor)
+    receptor_es_a = receptor == a
+
+    valores = {
+        'id_ultimo_mensaje': mensaje.id,
+        'id_emisor_ultimo': emisor,
+        'ultimo_mensaje': vista_previa(mensaje),
+        'fecha_ultimo_mensaje': mensaje.fecha_envio,
+    }
+
+    sentencia = insert(Conversacion).values(
+        id_usuario_a=a,
+        id_usuario_b=b,
+        no_leidos_a=1 if receptor_es_a else 0,
+        no_leidos_b=0 if receptor_es_a else 1,
+        **valores
+    )
+    columna_no_leidos = 'no_leidos_a' if receptor_es_a else 'no_leidos_b'
+
+    # Dos envíos concurrentes pueden confirmarse en desorden: el resumen solo
+    # avanza si el mensaje es posterior (por fecha e id) al que ya tiene; el
+    # id anterior queda a NULL si ese mensaje se borró
+    nuevo = tuple_(sentencia.excluded.fecha_ultimo_mensaje, sentencia.excluded.id_ultimo_mensaje)\
+        > tuple_(Conversacion.fecha_ultimo_mensaje, func.coalesce(Conversacion.id_ultimo_mensaje, 0))
+    resumen = {
+        columna: case((nuevo, sentencia.excluded[columna]), else_=getattr(Conversacion, columna))
+        for columna in ('id_ultimo_mensaje', 'id_emisor_ultimo', 'ultimo_mensaje')
+    }
+    resumen['fecha_ultimo_mensaje'] = func.greatest(
+        Conversacion.fecha_ultimo_mensaje, sentencia.excluded.fecha_ultimo_mensaje
+    )
+
+    db.session.execute(sentencia.on_conflict_do_update(
+        index_elements=[Conversacion.id_usuario_a, Conversacion.id_usuario_b],
+        set_={
+            **resumen,
+            columna_no_leidos: getattr(Conversacion, columna_no_leidos) + 1
+        }
+    ))
+
+
+def marcar_leida(user_id, otro_id):
+    """Pone a cero los no leídos de `user_id` en su conversación con `otro_id`. No hace commit."""
+    a, b = min(user_id, otro_id), max(user_id, otro_id)
+    columna = 'no_leidos_a' if user_id == a else 'no_leidos_b'
+    return db.session.execute(
+        update(Conversacion)
+        .where(
+            Conversacion.id_usuario_a == a,
+            Conversacion.id_usuario_b == b,
+            getattr(Conversacion, columna) > 0
+        )
+        .values({columna: 0})
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def bandeja_de_entrada(user_id):
+    """
+    Conversaciones del usuario con el otro participante y sus no leídos,
+    de la más reciente a la más antigua, en una sola consulta.
+    """
+    es_a = Conversacion.id_usuario_a == user_id
+    otro_id = case((es_a, Conversacion.id_usuario_b), else_=Conversacion.id_usuario_a)
+    no_leidos = case((es_a, Conversacion.no_leidos_a), else_=Conversacion.no_leidos_b)
+
+    return db.session.query(Conversacion, User, no_leidos.label('no_leidos'))\
+        .join(User, User.id == otro_id)\
+        .filter(or_(Conversacion.id_usuario_a == user_id, Conversacion.id_usuario_b == user_id))\
+        .order_by(Conversacion.fecha_ultimo_mensaje.desc())\
+        .all()
@@ -0,0 +1,59 @@
+from sqlalchemy import update, func, text
+from extensions import db
+from models import Post
+
+
+def actualizar_contador(post_id, columna, delta):
+    """
+    Suma `delta` a un contador de la publicación con un único UPDATE atómico
+    dentro de la transacción en curso y devuelve el nuevo valor.
+    """
+    campo = getattr(Post, columna)
+    return db.session.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values({campo: func.greatest(campo + delta, 0)})
+        .returning(campo)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+# Recalcula cada contador y solo reescribe las filas que se han desviado
+_RECONCILIACIONES = {
+    'likes_count': """
+        UPDATE publicaciones p SET likes_count = c.total
+        FROM (
+            SELECT p2.id, COUNT(l.id) AS total
+            FROM publicaciones p2 LEFT JOIN likes l ON l.id_publicacion = p2.id
+            GROUP BY p2.id
+        ) c
+        WHERE c.id = p.id AND p.likes_count <> c.total
+    """,
+    'comentarios_count': """
+        UPDATE publicaciones p SET comentarios_count = c.total
+        FROM (
+            SELECT p2.id, COUNT(co.id) AS total
+            FROM publicaciones p2 LEFT JOIN comentarios co ON co.id_publicacion = p2.id
+            GROUP BY p2.id
+        ) c
+        WHERE c.id = p.id AND p.comentarios_count <> c.total
+    """,
+    'guardados_count': """
+        UPDATE publicaciones p SET guardados_count = c.total
+        FROM (
+            SELECT p2.id, COUNT(f.id) AS total
+            FROM publicaciones p2 LEFT JOIN favoritos f ON f.id_publicacion = p2.id
+            GROUP BY p2.id
+        ) c
+        WHERE c.id = p.id AND p.guardados_count <> c.total
+    """,
+}
+
+
+def reconciliar_contadores():
+    """Corrige en bloque la deriva de los contadores. Devuelve las filas corregidas por contador."""
+    corregidas = {}
+    for columna, sql in _RECONCILIACIONES.items():
+        corregidas[columna] = db.session.execute(text(sql)).rowcount
+    db.session.commit()
+    return corregidas
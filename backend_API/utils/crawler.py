@@ -0,0 +1,200 @@
+import argparse
+import csv
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Rastreo paginado del catálogo de las tiendas reutilizando los scrapers.
+# Cada combinación (categoría, palabra clave) recorre sus páginas en orden y
+# las combinaciones se reparten entre varios hilos. Los productos se añaden
+# al CSV de salida a medida que llegan, sin repetir enlaces ya guardados.
+CAMPOS = ["tienda", "nombre", "precio", "imagen", "enlace"]
+# Salidas por defecto en la raíz del repositorio; `flask importar-catalogo`
+# lee de las mismas rutas
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SALIDAS = {
+    "zalando": os.path.join(RAIZ, "productos_zalando.csv"),
+    "shein": os.path.join(RAIZ, "productos_shein.csv"),
+}
+# Códigos que merece la pena reintentar
+REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+def _scraper(tienda, categoria, palabra, pagina, tam_pagina):
+    """Scraper configurado para la página `pagina` (empezando en 0)."""
+    # Importados aquí: dependen de pandas y la aplicación solo usa SALIDAS
+    from utils.scraper_shein import SheinScraper
+    from utils.scraper_zalando import ZalandoScraper
+
+    if tienda == "zalando":
+        opciones = {"category": categoria} if categoria else {}
+        return ZalandoScraper(keyword=palabra, limit=tam_pagina, offset=pagina * tam_pagina, **opciones)
+    return SheinScraper(keyword=palabra, limit=tam_pagina, page=pagina + 1)
+
+
+class Limitador:
+    """Limita las peticiones por segundo compartidas entre todos los hilos."""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self.siguiente = time.monotonic()
+        self.lock = threading.Lock()
+
+    def esperar(self):
+        """Espera al siguiente turno libre y devuelve el instante asignado."""
+        with self.lock:
+            ahora = time.monotonic()
+            turno = max(self.siguiente, ahora)
+            self.siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+        return turno
+
+
+class SalidaCSV:
+    """CSV de salida en modo append; recuerda los enlaces de ejecuciones anteriores."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.vistos = set()
+
+        nuevo = not os.path.exists(ruta) or os.path.getsize(ruta) <= 1
+        if not nuevo:
+            with open(ruta, newline="", encoding="utf-8") as f:
+                self.vistos = {fila.get("enlace") for fila in csv.DictReader(f)}
+
+        self.fichero = open(ruta, "w" if nuevo else "a", newline="", encoding="utf-8")
+        self.escritor = csv.DictWriter(self.fichero, fieldnames=CAMPOS, extrasaction="ignore")
+        if nuevo:
+            self.escritor.writeheader()
+
+    def escribir(self, tienda, productos):
+        """Añade los productos no vistos y devuelve cuántos eran nuevos."""
+        with self.lock:
+            nuevos = [p for p in productos if p.get("enlace") and p["enlace"] not in self.vistos]
+            for producto in nuevos:
+                self.vistos.add(producto["enlace"])
+                self.escritor.writerow({**producto, "tienda": tienda})
+            self.fichero.flush()
+            return len(nuevos)
+
+    def cerrar(self):
+        self.fichero.close()
+
+
+class Crawler:
+    def __init__(self, tienda, salida, hilos=4, por_segundo=2.0, reintentos=4, espera_base=1.0,
+                 url=None):
+        self.tienda = tienda
+        self.salida = salida
+        self.hilos = hilos
+        self.limitador = Limitador(por_segundo)
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        # Permite apuntar a otro servidor (p. ej. uno local de pruebas)
+        self.url = url
+
+        # Una sola sesión con tantas conexiones como hilos
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=hilos)
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+
+    def _pedir(self, scraper):
+        """GET con limitación de ritmo y reintentos con espera exponencial."""
+        for intento in range(self.reintentos + 1):
+            self.limitador.esperar()
+            try:
+                response = self.session.get(self.url or scraper.base_url, headers=scraper.headers,
+                                            params=scraper.params, timeout=15)
+                if response.status_code not in REINTENTABLES:
+                    response.raise_for_status()
+                    return response.json()
+                espera = response.headers.get("Retry-After")
+                error = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                espera, error = None, str(e)
+
+            if intento == self.reintentos:
+                raise RuntimeError(f"Sin respuesta tras {intento + 1} intentos: {error}")
+
+            try:
+                espera = float(espera)
+            except (TypeError, ValueError):
+                espera = self.espera_base * 2 ** intento + random.uniform(0, self.espera_base)
+            time.sleep(espera)
+
+    def recorrer(self, categoria, palabra, max_paginas, tam_pagina):
+        """Recorre las páginas de una búsqueda hasta que se acaben; devuelve los productos nuevos."""
+        nuevos = 0
+        for pagina in range(max_paginas):
+            scraper = _scraper(self.tienda, categoria, palabra, pagina, tam_pagina)
+            productos = scraper.parse_products(self._pedir(scraper))
+            if not productos:
+                break
+            nuevos += self.salida.escribir(self.tienda, productos)
+        return nuevos
+
+    def ejecutar(self, categorias, palabras, max_paginas=10, tam_pagina=60):
+        busquedas = [(c, p) for c in categorias or [None] for p in palabras or [None]]
+
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            futuros = {
+                pool.submit(self.recorrer, categoria, palabra, max_paginas, tam_pagina): (categoria, palabra)
+                for categoria, palabra in busquedas
+            }
+            for futuro in as_completed(futuros):
+                categoria, palabra = futuros[futuro]
+                try:
+                    nuevos = futuro.result()
+                    total += nuevos
+                    print(f"{categoria or '-'} / {palabra or '-'}: {nuevos} productos nuevos")
+                except Exception as e:
+                    print(f"Error rastreando {categoria or '-'} / {palabra or '-'}: {e}")
+
+        return total
+
+
+def rastrear(tienda, ruta_salida, categorias, palabras, max_paginas=10, tam_pagina=60, **opciones):
+    salida = SalidaCSV(ruta_salida)
+    try:
+        return Crawler(tienda, salida, **opciones).ejecutar(categorias, palabras, max_paginas, tam_pagina)
+    finally:
+        salida.cerrar()
+
+
+# Uso: `flask rastrear-catalogo ...` o, desde backend_API, `python -m utils.crawler ...`
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rastrea el catálogo de Zalando o Shein y lo guarda en CSV.")
+    parser.add_argument("tienda", choices=["zalando", "shein"])
+    parser.add_argument("--salida", help="CSV de destino (por defecto, productos_<tienda>.csv en la raíz del repo)")
+    parser.add_argument("--categoria", action="append", default=[], help="Categoría (solo Zalando); repetible")
+    parser.add_argument("--palabra", action="append", default=[], help="Palabra clave; repetible")
+    parser.add_argument("--paginas", type=int, default=10, help="Máximo de páginas por búsqueda")
+    parser.add_argument("--tam-pagina", type=int, default=60)
+    parser.add_argument("--hilos", type=int, default=4)
+    parser.add_argument("--rps", type=float, default=2.0, help="Peticiones por segundo en total")
+    parser.add_argument("--reintentos", type=int, default=4)
+    parser.add_argument("--url", help="URL alternativa del catálogo (p. ej. un servidor local de pruebas)")
+    args = parser.parse_args()
+
+    total = rastrear(
+        args.tienda,
+        args.salida or SALIDAS[args.tienda],
+        args.categoria if args.tienda == "zalando" else [],
+        args.palabra,
+        max_paginas=args.paginas,
+        tam_pagina=args.tam_pagina,
+        hilos=args.hilos,
+        por_segundo=args.rps,
+        reintentos=args.reintentos,
+        url=args.url
+    )
+    print(f"{total} productos nuevos guardados")
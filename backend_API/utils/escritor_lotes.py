@@ -0,0 +1,92 @@
+import atexit
+import time
+
+import gevent
+from gevent.queue import Queue, Full, Empty
+
+from extensions import db
+
+
+class EscritorLotes:
+    """
+    Cola en memoria que un greenlet en segundo plano vacía por lotes: al
+    reunir `tam_lote` elementos o `intervalo` segundos después del primero.
+
+    `escribir(lote)` recibe la lista de elementos. Si se encoló con una `app`,
+    se llama dentro de su contexto y un error deshace la sesión de la base de
+    datos. Lo pendiente se escribe también al salir del proceso.
+    """
+
+    def __init__(self, nombre, escribir, tam_lote, intervalo, max_cola=None):
+        self.nombre = nombre
+        self.escribir = escribir
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.cola = Queue(maxsize=max_cola)
+        self.app = None
+        self._greenlet = None
+        atexit.register(self.vaciar)
+
+    def encolar(self, elemento, app=None):
+        """Encola sin bloquear y arranca el escritor. False si la cola está llena."""
+        if app is not None:
+            self.app = app
+        self.arrancar()
+        try:
+            self.cola.put_nowait(elemento)
+            return True
+        except Full:
+            return False
+
+    def pendientes(self):
+        return self.cola.qsize()
+
+    def arrancar(self):
+        if self._greenlet is None or self._greenlet.dead:
+            self._greenlet = gevent.spawn(self._bucle)
+
+    def vaciar(self):
+        """Escribe de inmediato todo lo pendiente."""
+        lote = []
+        while True:
+            try:
+                lote.append(self.cola.get_nowait())
+            except Empty:
+                break
+            if len(lote) >= self.tam_lote:
+                self._escribir(lote)
+                lote = []
+        if lote:
+            self._escribir(lote)
+
+    def _bucle(self):
+        while True:
+            lote = [self.cola.get()]
+
+            # Completar el lote hasta tam_lote o hasta que venza el intervalo
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tam_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self.cola.get(timeout=restante))
+                except Empty:
+                    break
+
+            self._escribir(lote)
+
+    def _escribir(self, lote):
+        if self.app is None:
+            self._llamar(lote)
+            return
+        with self.app.app_context():
+            self._llamar(lote)
+
+    def _llamar(self, lote):
+        try:
+            self.escribir(lote)
+        except Exception as e:
+            if self.app is not None:
+                db.session.rollback()
+            print(f"Error escribiendo {self.nombre}: {e}")
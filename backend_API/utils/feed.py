@@ -0,0 +1,167 @@
+from flask import current_app
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models import Post, Like, Favorito
+from utils.image_variants import variant_url, ANCHOS
+from utils.likes import likes_pendientes, estados_pendientes
+from utils import grafo
+
+
+def relaciones_del_usuario(user_id):
+    """
+    A quién sigue el usuario, quiénes son sus amigos y el tipo de relación
+    con cada autor ('amigo' o 'seguido'), desde la caché del grafo social.
+    """
+    v = grafo.vecinos(user_id)
+    seguidos, amigos = set(v.seguidos), set(v.amigos)
+
+    # La amistad tiene prioridad sobre el seguimiento
+    tipo_relacion = {autor_id: 'seguido' for autor_id in seguidos}
+    tipo_relacion.update({autor_id: 'amigo' for autor_id in amigos})
+
+    return seguidos, amigos, tipo_relacion
+
+
+def consulta_feed(seguidos, amigos, cursor=None, limite=None):
+    """
+    Publicaciones visibles para el usuario según la visibilidad de cada una.
+
+    Con `cursor` (fecha, id) y `limite`, cada rama del UNION ALL se filtra,
+    ordena y limita por separado para que Postgres lea solo una página.
+    """
+    seguidos = list(seguidos)
+    amigos = list(amigos)
+
+    def pagina(consulta):
+        if cursor is not None:
+            consulta = consulta.filter(
+                tuple_(Post.fecha_publicacion, Post.id) < tuple_(*cursor)
+            )
+        if limite is not None:
+            consulta = consulta.order_by(
+                Post.fecha_publicacion.desc(), Post.id.desc()
+            ).limit(limite)
+        return consulta
+
+    publicaciones_publicas = pagina(Post.query.filter(
+        Post.id_usuario.in_(seguidos + amigos),
+        Post.visibilidad == 'publico'
+    ))
+
+    publicaciones_seguidores = pagina(Post.query.filter(
+        Post.id_usuario.in_(seguidos),
+        Post.visibilidad == 'seguidores'
+    ))
+
+    publicaciones_amigos = pagina(Post.query.filter(
+        Post.id_usuario.in_(amigos),
+        Post.visibilidad == 'amigos'
+    ))
+
+    return publicaciones_publicas.union_all(
+        publicaciones_seguidores
+    ).union_all(
+        publicaciones_amigos
+    )
+
+
+def likes_del_usuario(user_id, ids):
+    """Ids de las publicaciones, entre `ids`, a las que el usuario ha dado like."""
+    if not ids:
+        return set()
+    con_like = {
+        fila[0] for fila in db.session.query(Like.id_publicacion).filter(
+            Like.id_usuario == user_id,
+            Like.id_publicacion.in_(ids)
+        )
+    }
+
+    # Likes aún en el búfer de Redis (modo LIKES_BUFFERED)
+    for post_id, estado in estados_pendientes(user_id, ids).items():
+        if estado:
+            con_like.add(post_id)
+        else:
+            con_like.discard(post_id)
+    return con_like
+
+
+def es_visible(post, seguidos, amigos):
+    """Comprueba la visibilidad de una publicación con las relaciones actuales."""
+    if post.visibilidad == 'publico':
+        return post.id_usuario in seguidos or post.id_usuario in amigos
+    if post.visibilidad == 'seguidores':
+        return post.id_usuario in seguidos
+    if post.visibilidad == 'amigos':
+        return post.id_usuario in amigos
+    return False
+
+
+def puede_ver(user_id, post):
+    """
+    Si el usuario puede ver una publicación concreta (comentarios, likes y
+    suscripción en tiempo real): el autor siempre; el resto según su visibilidad.
+    """
+    if post.id_usuario == user_id or post.visibilidad == 'publico':
+        return True
+    v = grafo.vecinos(user_id)
+    if post.visibilidad == 'seguidores':
+        return post.id_usuario in v.seguidos or post.id_usuario in v.amigos
+    if post.visibilidad == 'amigos':
+        return post.id_usuario in v.amigos
+    return False
+
+
+def hidratar(ids, seguidos, amigos):
+    """
+    Carga en una consulta las publicaciones de un timeline precalculado,
+    descartando las que ya no existen o han dejado de ser visibles.
+    """
+    if not ids:
+        return []
+
+    publicaciones = Post.query.options(joinedload(Post.usuario))\
+        .filter(Post.id.in_(ids)).all()
+
+    publicaciones = [p for p in publicaciones if es_visible(p, seguidos, amigos)]
+    publicaciones.sort(key=lambda p: (p.fecha_publicacion, p.id), reverse=True)
+    return publicaciones
+
+
+def serializar_feed(publicaciones, user_id, tipo_relacion, variante=None):
+    """
+    Construye la respuesta del feed con dos consultas agrupadas (likes y
+    guardados del usuario) en lugar de varias por post.
+    Las publicaciones deben venir con `usuario` ya cargado. `variante` es el
+    (ancho, formato) de imagen que pide el cliente, si pide alguno.
+    """
+    ids = [p.id for p in publicaciones]
+    if not ids:
+        return []
+
+    mis_likes = likes_del_usuario(user_id, ids)
+    likes_sin_volcar = likes_pendientes(ids)
+
+    mis_guardados = {
+        fila[0] for fila in db.session.query(Favorito.id_publicacion).filter(
+            Favorito.id_usuario == user_id,
+            Favorito.id_publicacion.in_(ids)
+        )
+    }
+
+    base_url = current_app.config['BASE_URL']
+
+    return [{
+        'id': p.id,
+        'id_usuario': p.id_usuario,
+        'contenido': p.contenido,
+        'visibilidad': p.visibilidad,
+        'imagen_url': f"{base_url}{variant_url(p.imagen_url, variante)}" if p.imagen_url else None,
+        'fecha': p.fecha_publicacion.isoformat(),
+        'usuario': p.usuario.username,
+        'foto_perfil': f"{base_url}{variant_url(p.usuario.foto_perfil, variante, ANCHOS[0])}" if p.usuario.foto_perfil else None,
+        'likes_count': p.likes_count + likes_sin_volcar.get(p.id, 0),
+        'ha_dado_like': p.id in mis_likes,
+        'tipo_relacion': tipo_relacion.get(p.id_usuario, ''),
+        'guardado': p.id in mis_guardados
+    } for p in publicaciones]
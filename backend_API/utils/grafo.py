@@ -0,0 +1,137 @@
+import json
+import os
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import or_
+
+from extensions import db, redis_client
+from models import Seguimiento
+
+# Relaciones aceptadas de cada usuario, cacheadas en Redis o, si no está
+# disponible, en un LRU en memoria del proceso (con varios workers, cada uno
+# puede ver datos con hasta TTL segundos de antigüedad)
+TTL = int(os.getenv("GRAPH_CACHE_TTL", 300))
+TAM_LOCAL = int(os.getenv("GRAPH_CACHE_SIZE", 10000))
+
+CLAVE_GRAFO = 'grafo:{}'
+
+Vecinos = namedtuple('Vecinos', ['seguidores', 'seguidos', 'amigos'])
+
+_local = OrderedDict()
+
+
+def vecinos(user_id):
+    """Seguidores, seguidos y amigos (frozensets de ids) de un usuario."""
+    user_id = int(user_id)
+
+    if redis_client is not None:
+        try:
+            datos = redis_client.get(CLAVE_GRAFO.format(user_id))
+            if datos is not None:
+                return _desde_json(datos)
+        except Exception as e:
+            print(f"Error leyendo el grafo social de Redis: {e}")
+
+    entrada = _local.get(user_id)
+    if entrada is not None and entrada[0] > time.monotonic():
+        _local.move_to_end(user_id)
+        return entrada[1]
+
+    resultado = _cargar(user_id)
+    _guardar(user_id, resultado)
+    return resultado
+
+
+def seguidores(user_id):
+    return vecinos(user_id).seguidores
+
+
+def seguidos(user_id):
+    return vecinos(user_id).seguidos
+
+
+def amigos(user_id):
+    return vecinos(user_id).amigos
+
+
+def relacion(id_a, id_b):
+    """Relación de `id_a` con `id_b`: 'amigo', 'seguido' (a sigue a b) o None."""
+    return relaciones(id_a, [id_b])[int(id_b)]
+
+
+def relaciones(id_a, ids):
+    """Como `relacion`, para varios usuarios con una sola lectura de la caché."""
+    v = vecinos(id_a)
+    resultado = {}
+    for id_b in ids:
+        id_b = int(id_b)
+        if id_b in v.amigos:
+            resultado[id_b] = 'amigo'
+        elif id_b in v.seguidos:
+            resultado[id_b] = 'seguido'
+        else:
+            resultado[id_b] = None
+    return resultado
+
+
+def invalidar(*user_ids):
+    """Descarta la caché de los usuarios cuyas relaciones han cambiado."""
+    for user_id in user_ids:
+        _local.pop(int(user_id), None)
+
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(*[CLAVE_GRAFO.format(int(u)) for u in user_ids])
+    except Exception as e:
+        print(f"Error invalidando el grafo social: {e}")
+
+
+def _cargar(user_id):
+    # Una sola consulta con todas las relaciones aceptadas en ambos sentidos
+    filas = db.session.query(
+        Seguimiento.id_seguidor, Seguimiento.id_seguido, Seguimiento.tipo
+    ).filter(
+        or_(Seguimiento.id_seguidor == user_id, Seguimiento.id_seguido == user_id),
+        Seguimiento.estado == 'aceptada'
+    ).all()
+
+    seguidores_, seguidos_, amigo_de, amigo_desde = set(), set(), set(), set()
+    for id_seguidor, id_seguido, tipo in filas:
+        if tipo == 'amigo':
+            if id_seguidor == user_id:
+                amigo_de.add(id_seguido)
+            else:
+                amigo_desde.add(id_seguidor)
+        elif tipo == 'seguidor':
+            if id_seguidor == user_id:
+                seguidos_.add(id_seguido)
+            else:
+                seguidores_.add(id_seguidor)
+
+    # La amistad exige la relación en ambos sentidos
+    return Vecinos(frozenset(seguidores_), frozenset(seguidos_), frozenset(amigo_de & amigo_desde))
+
+
+def _guardar(user_id, v):
+    if redis_client is not None:
+        try:
+            redis_client.setex(CLAVE_GRAFO.format(user_id), TTL, json.dumps({
+                'seguidores': list(v.seguidores),
+                'seguidos': list(v.seguidos),
+                'amigos': list(v.amigos),
+            }))
+            return
+        except Exception as e:
+            print(f"Error guardando el grafo social en Redis: {e}")
+
+    _local[user_id] = (time.monotonic() + TTL, v)
+    _local.move_to_end(user_id)
+    while len(_local) > TAM_LOCAL:
+        _local.popitem(last=False)
+
+
+def _desde_json(datos):
+    d = json.loads(datos)
+    return Vecinos(frozenset(d['seguidores']), frozenset(d['seguidos']), frozenset(d['amigos']))
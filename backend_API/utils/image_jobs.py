@@ -0,0 +1,143 @@
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import gevent
+from flask import current_app
+
+from extensions import db
+from models import Prenda
+from utils import media
+from utils.realtime import emitir
+from utils.image_processing import procesar_prenda_bytes, precargar_modelo
+from utils.image_variants import crear_variantes_blob
+
+# Procesos dedicados a la inferencia de rembg (CPU), fuera de los workers gevent
+NUM_PROCESOS = int(os.getenv("IMAGE_WORKERS", 2))
+# Las variantes solo redimensionan: van en su propio pool, sin cargar el modelo
+NUM_PROCESOS_VARIANTES = int(os.getenv("IMAGE_VARIANT_WORKERS", 1))
+
+# Nombre -> (procesos, inicializador) de cada pool
+POOLS = {
+    'rembg': (NUM_PROCESOS, precargar_modelo),
+    'variantes': (NUM_PROCESOS_VARIANTES, None),
+}
+
+_pools = {}
+
+
+def _get_pool(nombre):
+    pool = _pools.get(nombre)
+    if pool is None:
+        procesos, inicializador = POOLS[nombre]
+        # 'spawn' evita heredar en los hijos el estado parcheado por gevent
+        pool = _pools[nombre] = ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=inicializador
+        )
+    return pool
+
+
+def _descartar(nombre, pool):
+    # Solo si sigue siendo el actual: otro greenlet puede haberlo rehecho ya
+    if _pools.get(nombre) is pool:
+        del _pools[nombre]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _enviar(nombre, funcion, *args):
+    """
+    submit() al pool `nombre`. Un pool roto (murió un hijo o falló el
+    inicializador) ya no acepta trabajos: se descarta y se rehace una vez.
+    """
+    pool = _get_pool(nombre)
+    try:
+        return pool.submit(funcion, *args)
+    except BrokenProcessPool:
+        print(f"Pool de procesos '{nombre}' roto, se vuelve a crear")
+        _descartar(nombre, pool)
+        return _get_pool(nombre).submit(funcion, *args)
+
+
+def cerrar_pools():
+    for nombre, pool in list(_pools.items()):
+        _descartar(nombre, pool)
+
+
+def encolar_eliminacion_fondo(app, prenda_id, datos):
+    """
+    Lanza la eliminación de fondo de una prenda (bytes de la subida) en el
+    pool de procesos y devuelve de inmediato. Al terminar se guarda la imagen,
+    se actualiza la prenda y se avisa al dueño por Socket.IO con el evento
+    'prenda_procesada'.
+    """
+    try:
+        futuro = _enviar('rembg', procesar_prenda_bytes, datos, True)
+    except Exception as e:
+        # Se sigue como si hubiera fallado el proceso: se guarda la original
+        futuro = Future()
+        futuro.set_exception(e)
+    gevent.spawn(_esperar_resultado, app, futuro, prenda_id, datos)
+
+
+def encolar_variantes(imagen_url):
+    """
+    Genera en segundo plano las variantes responsive de una imagen ya
+    guardada. Se llama después del commit: si no se puede encolar, se
+    registra y la petición sigue (se sirve el original).
+    """
+    nombre = imagen_url.rsplit('/', 1)[-1]
+    try:
+        futuro = _enviar('variantes', crear_variantes_blob, nombre)
+    except Exception:
+        current_app.logger.exception(f"No se pudieron encolar las variantes de {imagen_url}")
+        return
+    gevent.spawn(_registrar_error, futuro, imagen_url)
+
+
+def _registrar_error(futuro, imagen_url):
+    try:
+        futuro.result()
+    except Exception as e:
+        print(f"Error generando variantes de {imagen_url}: {e}")
+
+
+def _esperar_resultado(app, futuro, prenda_id, datos):
+    try:
+        resultado = futuro.result()
+        estado = 'listo'
+    except Exception as e:
+        print(f"Error eliminando fondo de la prenda {prenda_id}: {e}")
+        estado = 'error'
+        # Se conserva la imagen original para que la prenda no quede sin foto
+        try:
+            resultado = procesar_prenda_bytes(datos, eliminar_fondo=False)
+        except Exception as e:
+            print(f"Error guardando imagen original de la prenda {prenda_id}: {e}")
+            resultado = None
+
+    with app.app_context():
+        prenda = Prenda.query.get(prenda_id)
+        if not prenda:
+            # La prenda se eliminó mientras se procesaba: no hay nada que guardar
+            return
+
+        if resultado is not None:
+            prenda.imagen_url = media.guardar(resultado, 'jpg')
+        prenda.estado_imagen = estado
+        db.session.commit()
+
+        if prenda.imagen_url:
+            encolar_variantes(prenda.imagen_url)
+
+        emitir('prenda_procesada', {
+            'id': prenda.id,
+            'estado_imagen': prenda.estado_imagen,
+            'imagen_url': f"{app.config['BASE_URL']}{prenda.imagen_url}" if prenda.imagen_url else None
+        }, str(prenda.id_usuario))
+
+
+atexit.register(cerrar_pools)
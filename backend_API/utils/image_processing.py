@@ -1,13 +1,151 @@
-from rembg import remove
+import argparse
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from PIL import Image
 
-def remove_background_and_white_bg(input_path, output_path, eliminar_fondo=True):
-    input_image = Image.open(input_path).convert("RGBA")
+from utils.image_variants import crear_variantes, es_variante
+
+# Modelo de segmentación de rembg; la sesión se carga una vez por proceso
+MODELO_REMBG = os.getenv("REMBG_MODEL", "u2net")
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.webp')
+
+_session = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        from rembg import new_session
+        _session = new_session(MODELO_REMBG)
+    return _session
+
+
+def precargar_modelo():
+    """Inicializador para pools de procesos: carga el modelo antes del primer trabajo."""
+    get_session()
+
+
+def _abrir(imagen):
+    # Acepta bytes, una ruta o una imagen PIL ya abierta
+    if isinstance(imagen, Image.Image):
+        return imagen.convert("RGBA")
+    if isinstance(imagen, (bytes, bytearray)):
+        return Image.open(io.BytesIO(imagen)).convert("RGBA")
+    return Image.open(imagen).convert("RGBA")
+
+
+def segment_image(imagen, eliminar_fondo=True):
+    """Devuelve la prenda sobre fondo blanco como imagen PIL en RGB."""
+    input_image = _abrir(imagen)
+
+    if not eliminar_fondo:
+        return input_image.convert("RGB")
+
+    from rembg import remove
+    output_image = remove(input_image, session=get_session())
+    white_bg = Image.new("RGBA", output_image.size, (255, 255, 255, 255))
+    white_bg.paste(output_image, mask=output_image.split()[3])
+    return white_bg.convert("RGB")
+
+
+def segment_images(imagenes, eliminar_fondo=True):
+    """Procesa una lista de imágenes reutilizando la misma sesión del modelo."""
+    return [segment_image(imagen, eliminar_fondo) for imagen in imagenes]
+
+
+def _formato_de(ruta, formato=None):
+    if formato:
+        return formato.upper()
+    return "WEBP" if ruta.lower().endswith(".webp") else "JPEG"
+
+
+def encode_image(imagen, formato="JPEG", calidad=90):
+    """Codifica una imagen PIL en memoria (JPEG o WebP)."""
+    buffer = io.BytesIO()
+    imagen.save(buffer, format=formato.upper(), quality=calidad)
+    return buffer.getvalue()
+
+
+def save_image(imagen, output_path, formato=None, calidad=90):
+    imagen.save(output_path, format=_formato_de(output_path, formato), quality=calidad)
+    return output_path
+
+
+def remove_background_and_white_bg(input_image, output_path, eliminar_fondo=True):
+    """
+    Elimina el fondo (opcional) y escribe directamente el resultado en
+    `output_path` (JPEG, o WebP si la extensión es .webp). `input_image`
+    puede ser una ruta, bytes o una imagen PIL.
+    """
+    return save_image(segment_image(input_image, eliminar_fondo), output_path)
+
+
+def procesar_prenda(input_image, output_path, eliminar_fondo=True):
+    """Trabajo completo de una prenda: fondo blanco y variantes responsive."""
+    remove_background_and_white_bg(input_image, output_path, eliminar_fondo)
+    crear_variantes(output_path)
+    return output_path
+
+
+def procesar_prenda_bytes(datos, eliminar_fondo=True):
+    """Como procesar_prenda, pero devuelve el JPEG resultante en memoria."""
+    return encode_image(segment_image(datos, eliminar_fondo))
+
+
+def _procesar_lote(rutas, carpeta_salida, formato, eliminar_fondo):
+    extension = ".webp" if formato == "WEBP" else ".jpg"
+    resultados = []
+    for ruta, imagen in zip(rutas, segment_images(rutas, eliminar_fondo)):
+        nombre = os.path.splitext(os.path.basename(ruta))[0] + extension
+        resultados.append(save_image(imagen, os.path.join(carpeta_salida, nombre), formato))
+        crear_variantes(resultados[-1])
+    return resultados
+
+
+def reprocesar_carpeta(carpeta_entrada, carpeta_salida, formato="JPEG", procesos=None,
+                       tam_lote=8, eliminar_fondo=True):
+    """Reprocesa en paralelo todas las imágenes de un armario."""
+    os.makedirs(carpeta_salida, exist_ok=True)
+    rutas = sorted(
+        os.path.join(carpeta_entrada, f) for f in os.listdir(carpeta_entrada)
+        if f.lower().endswith(EXTENSIONES) and not es_variante(f)
+    )
+    lotes = [rutas[i:i + tam_lote] for i in range(0, len(rutas), tam_lote)]
+
+    procesadas = 0
+    with ProcessPoolExecutor(max_workers=procesos, initializer=precargar_modelo) as pool:
+        futuros = [
+            pool.submit(_procesar_lote, lote, carpeta_salida, formato.upper(), eliminar_fondo)
+            for lote in lotes
+        ]
+        for futuro in as_completed(futuros):
+            try:
+                procesadas += len(futuro.result())
+            except Exception as e:
+                print(f"Error procesando lote: {e}")
+            print(f"{procesadas}/{len(rutas)} imágenes procesadas")
+
+    return procesadas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocesa las imágenes de un armario eliminando el fondo.")
+    parser.add_argument("entrada", help="Carpeta con las imágenes originales")
+    parser.add_argument("--salida", help="Carpeta de destino (por defecto, la de entrada)")
+    parser.add_argument("--formato", choices=["jpeg", "webp"], default="jpeg")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, uno por CPU)")
+    parser.add_argument("--lote", type=int, default=8, help="Imágenes por lote")
+    parser.add_argument("--sin-fondo", dest="eliminar_fondo", action="store_false",
+                        help="Solo recodificar, sin eliminar el fondo")
+    args = parser.parse_args()
 
-    if eliminar_fondo:
-        output_image = remove(input_image)
-        white_bg = Image.new("RGBA", output_image.size, (255, 255, 255, 255))
-        white_bg.paste(output_image, mask=output_image.split()[3])
-        white_bg.convert("RGB").save(output_path)
-    else:
-        input_image.convert("RGB").save(output_path)
+    reprocesar_carpeta(
+        args.entrada,
+        args.salida or args.entrada,
+        formato=args.formato,
+        procesos=args.procesos,
+        tam_lote=args.lote,
+        eliminar_fondo=args.eliminar_fondo
+    )
@@ -0,0 +1,127 @@
+import io
+import os
+import re
+
+from PIL import Image
+
+# Anchos de las variantes que se generan para cada imagen subida
+ANCHOS = (160, 480, 1080)
+# Extensión -> formato de Pillow. WebP es el preferido; JPEG queda como alternativa
+FORMATOS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+CALIDAD = 80
+# Extensiones con las que puede haberse subido la imagen original
+EXTENSIONES_ORIGINAL = ('jpg', 'jpeg', 'png', 'gif', 'webp')
+
+_PATRON_VARIANTE = re.compile(r'^(?P<base>.+)_(?P<ancho>\d+)\.(?P<ext>webp|jpg)$')
+
+
+def nombre_variante(nombre, ancho, ext):
+    """'abc.png' -> 'abc_480.webp'"""
+    base = os.path.splitext(nombre)[0]
+    return f"{base}_{ancho}.{ext}"
+
+
+def es_variante(nombre):
+    return _PATRON_VARIANTE.match(nombre) is not None
+
+
+def generar_variantes(datos):
+    """Devuelve {(ancho, ext): bytes} con cada ancho en WebP y JPEG, sin ampliar la imagen."""
+    original = Image.open(io.BytesIO(datos))
+    original = original.convert('RGB')
+
+    variantes = {}
+    for ancho in ANCHOS:
+        imagen = original
+        if original.width > ancho:
+            alto = round(original.height * ancho / original.width)
+            imagen = original.resize((ancho, alto), Image.LANCZOS)
+
+        for ext, formato in FORMATOS.items():
+            buffer = io.BytesIO()
+            imagen.save(buffer, format=formato, quality=CALIDAD)
+            variantes[(ancho, ext)] = buffer.getvalue()
+
+    return variantes
+
+
+def crear_variantes(ruta_original):
+    """Genera las variantes junto a la imagen original (se ejecuta en el pool de procesos)."""
+    with open(ruta_original, 'rb') as f:
+        datos = f.read()
+
+    carpeta, nombre = os.path.split(ruta_original)
+    for (ancho, ext), contenido in generar_variantes(datos).items():
+        with open(os.path.join(carpeta, nombre_variante(nombre, ancho, ext)), 'wb') as f:
+            f.write(contenido)
+
+
+def crear_variantes_blob(nombre):
+    """Como crear_variantes, para una imagen del almacenamiento por contenido."""
+    from utils.storage import get_storage, clave_de
+
+    storage = get_storage()
+    datos = storage.get(clave_de(nombre))
+    for (ancho, ext), contenido in generar_variantes(datos).items():
+        storage.put(clave_de(nombre_variante(nombre, ancho, ext)), contenido)
+
+
+def eliminar_variantes(ruta_original):
+    carpeta, nombre = os.path.split(ruta_original)
+    for ancho in ANCHOS:
+        for ext in FORMATOS:
+            ruta = os.path.join(carpeta, nombre_variante(nombre, ancho, ext))
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def variante_solicitada(request):
+    """
+    Lee `tam` (ancho deseado en píxeles) y `formato` (webp/jpg) de la
+    petición. Sin `formato`, se usa WebP salvo que la cabecera Accept lo
+    excluya. Devuelve None si el cliente no pide variantes.
+    """
+    try:
+        tam = int(request.args.get('tam', ''))
+    except ValueError:
+        return None
+
+    formato = request.args.get('formato', '').lower()
+    if formato not in FORMATOS:
+        aceptados = request.accept_mimetypes
+        formato = 'jpg' if aceptados.provided and not aceptados['image/webp'] else 'webp'
+
+    # El ancho más pequeño que cubra el pedido
+    ancho = next((a for a in ANCHOS if a >= tam), ANCHOS[-1])
+    return ancho, formato
+
+
+def variant_url(ruta, variante, ancho=None):
+    """
+    URL relativa de la variante de una imagen subida. Con `ancho` se fuerza
+    ese tamaño (p. ej. avatares); sin variante se devuelve la original.
+    """
+    if not ruta or not variante:
+        return ruta
+    carpeta, nombre = ruta.rsplit('/', 1)
+    return f"{carpeta}/{nombre_variante(nombre, ancho or variante[0], variante[1])}"
+
+
+def ruta_a_servir(carpeta, filename):
+    """
+    Nombre del fichero a servir. Si se pide una variante que todavía no se ha
+    generado (o una imagen anterior a las variantes), se sirve la original.
+    """
+    if os.path.exists(os.path.join(carpeta, filename)):
+        return filename
+
+    coincidencia = _PATRON_VARIANTE.match(filename)
+    if not coincidencia:
+        return filename
+
+    # Unas pocas comprobaciones por extensión en lugar de listar la carpeta
+    base = coincidencia.group('base')
+    for ext in EXTENSIONES_ORIGINAL:
+        if os.path.exists(os.path.join(carpeta, f"{base}.{ext}")):
+            return f"{base}.{ext}"
+    return filename
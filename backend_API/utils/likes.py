@@ -0,0 +1,267 @@
+import os
+import uuid
+
+from sqlalchemy import text
+
+from extensions import db, redis_client
+from utils.escritor_lotes import EscritorLotes
+
+# Modo con búfer: los likes se acumulan en Redis y se vuelcan a Postgres como
+# mucho LIKES_FLUSH_INTERVAL segundos después. Sin Redis se usa siempre la escritura directa.
+MODO_BUFER = os.getenv("LIKES_BUFFERED", "false").lower() in ("true", "1")
+INTERVALO_VOLCADO = float(os.getenv("LIKES_FLUSH_INTERVAL", 2.0))
+# Se vuelca antes si en ese intervalo llegan muchos likes
+TAM_LOTE_VOLCADO = int(os.getenv("LIKES_FLUSH_BATCH_SIZE", 1000))
+
+# Hash por publicación con el estado deseado de cada usuario ('1' o '0'), su
+# variación pendiente del contador y el conjunto de publicaciones por volcar
+CLAVE_ESTADO = 'likes:estado:{}'
+CLAVE_DELTA = 'likes:delta:{}'
+CLAVE_VOLCANDO = 'likes:volcando:{}'
+CLAVE_DELTA_VOLCANDO = 'likes:delta_volcando:{}'
+CLAVE_PENDIENTES = 'likes:pendientes'
+# Un solo volcado a la vez por publicación, aunque haya varios workers o el
+# comando `volcar-likes` en marcha
+CLAVE_BLOQUEO = 'likes:bloqueo:{}'
+DURACION_BLOQUEO_MS = int(os.getenv("LIKES_FLUSH_LOCK_MS", 30000))
+
+# Un único viaje a Postgres: borra el like si existía o lo inserta si no, y
+# ajusta el contador de la publicación en la misma sentencia
+_SQL_ALTERNAR = text("""
+    WITH borrado AS (
+        DELETE FROM likes
+        WHERE id_usuario = :user_id AND id_publicacion = :post_id
+        RETURNING id
+    ), insertado AS (
+        INSERT INTO likes (id_usuario, id_publicacion, fecha_creacion)
+        SELECT :user_id, :post_id, now() AT TIME ZONE 'utc'
+        WHERE NOT EXISTS (SELECT 1 FROM borrado)
+          AND EXISTS (SELECT 1 FROM publicaciones WHERE id = :post_id)
+        ON CONFLICT ON CONSTRAINT unique_like DO NOTHING
+        RETURNING id
+    )
+    UPDATE publicaciones
+    SET likes_count = greatest(
+        likes_count + (SELECT count(*) FROM insertado) - (SELECT count(*) FROM borrado), 0
+    )
+    WHERE id = :post_id
+    RETURNING likes_count, EXISTS (SELECT 1 FROM insertado) AS ha_dado_like
+""")
+
+# Cambia el estado pendiente de forma atómica. ARGV[2] es el estado en
+# Postgres, que solo se usa si no hay ya un estado pendiente.
+_LUA_ALTERNAR = """
+local actual = redis.call('HGET', KEYS[1], ARGV[1])
+if not actual then
+    actual = redis.call('HGET', KEYS[4], ARGV[1])
+end
+if not actual then
+    actual = ARGV[2]
+end
+local nuevo = actual == '1' and '0' or '1'
+redis.call('HSET', KEYS[1], ARGV[1], nuevo)
+local delta = redis.call('INCRBY', KEYS[2], nuevo == '1' and 1 or -1)
+redis.call('SADD', KEYS[3], ARGV[3])
+return {tonumber(nuevo), delta}
+"""
+
+# Mueve el estado pendiente a las claves de volcado. Si quedaba un volcado
+# anterior sin terminar, se fusiona (el estado más reciente prevalece).
+_LUA_APARTAR = """
+local campos = redis.call('HGETALL', KEYS[1])
+for i = 1, #campos, 2 do
+    redis.call('HSET', KEYS[3], campos[i], campos[i + 1])
+end
+local delta = redis.call('GET', KEYS[2]) or '0'
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('INCRBY', KEYS[4], delta)
+return #campos / 2
+"""
+
+# Libera el bloqueo solo si sigue siendo nuestro
+_LUA_LIBERAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _usa_bufer():
+    return MODO_BUFER and redis_client is not None
+
+
+def alternar_like(user_id, post_id, app=None):
+    """
+    Da o quita el like del usuario. Devuelve (ha_dado_like, likes_count) o
+    None si la publicación no existe.
+    """
+    if _usa_bufer():
+        try:
+            return _alternar_en_bufer(user_id, post_id, app)
+        except Exception as e:
+            print(f"Error usando el búfer de likes, se escribe directamente: {e}")
+
+    fila = db.session.execute(_SQL_ALTERNAR, {'user_id': user_id, 'post_id': post_id}).first()
+    db.session.commit()
+    if fila is None:
+        return None
+    return fila.ha_dado_like, fila.likes_count
+
+
+def _alternar_en_bufer(user_id, post_id, app):
+    fila = db.session.execute(text("""
+        SELECT p.likes_count,
+               EXISTS (SELECT 1 FROM likes WHERE id_usuario = :user_id AND id_publicacion = p.id)
+        FROM publicaciones p WHERE p.id = :post_id
+    """), {'user_id': user_id, 'post_id': post_id}).first()
+    if fila is None:
+        return None
+    likes_count, en_postgres = fila
+
+    nuevo, _ = redis_client.eval(
+        _LUA_ALTERNAR, 4,
+        CLAVE_ESTADO.format(post_id), CLAVE_DELTA.format(post_id),
+        CLAVE_PENDIENTES, CLAVE_VOLCANDO.format(post_id),
+        user_id, '1' if en_postgres else '0', post_id
+    )
+
+    if app is not None:
+        _escritor.encolar(post_id, app)
+
+    return bool(nuevo), max(likes_count + likes_pendientes([post_id]).get(post_id, 0), 0)
+
+
+def likes_pendientes(ids):
+    """Variación del contador aún no volcada a Postgres, por publicación."""
+    if not _usa_bufer() or not ids:
+        return {}
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for post_id in ids:
+            pipe.get(CLAVE_DELTA.format(post_id))
+            pipe.get(CLAVE_DELTA_VOLCANDO.format(post_id))
+        valores = pipe.execute()
+    except Exception as e:
+        print(f"Error leyendo likes pendientes: {e}")
+        return {}
+
+    return {
+        post_id: int(delta or 0) + int(volcando or 0)
+        for post_id, delta, volcando in zip(ids, valores[0::2], valores[1::2])
+        if delta or volcando
+    }
+
+
+def estados_pendientes(user_id, ids):
+    """{post_id: True/False} con los likes del usuario que aún no están en Postgres."""
+    if not _usa_bufer() or not ids:
+        return {}
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for post_id in ids:
+            pipe.hget(CLAVE_ESTADO.format(post_id), user_id)
+            pipe.hget(CLAVE_VOLCANDO.format(post_id), user_id)
+        valores = pipe.execute()
+    except Exception as e:
+        print(f"Error leyendo likes pendientes: {e}")
+        return {}
+
+    estados = {}
+    for post_id, estado, volcando in zip(ids, valores[0::2], valores[1::2]):
+        valor = estado if estado is not None else volcando
+        if valor is not None:
+            estados[post_id] = valor in (b'1', '1')
+    return estados
+
+
+def volcar():
+    """Vuelca a Postgres los likes acumulados en Redis. Devuelve las publicaciones volcadas."""
+    if redis_client is None:
+        return 0
+
+    volcadas = 0
+    ocupadas = []
+    try:
+        while True:
+            post_id = redis_client.spop(CLAVE_PENDIENTES)
+            if post_id is None:
+                return volcadas
+            post_id = int(post_id)
+
+            token = uuid.uuid4().hex
+            if not redis_client.set(CLAVE_BLOQUEO.format(post_id), token, nx=True, px=DURACION_BLOQUEO_MS):
+                # Otro volcado está con ella; se vuelve a marcar al terminar
+                ocupadas.append(post_id)
+                continue
+
+            try:
+                _volcar_publicacion(post_id)
+            finally:
+                redis_client.eval(_LUA_LIBERAR, 1, CLAVE_BLOQUEO.format(post_id), token)
+            volcadas += 1
+    finally:
+        if ocupadas:
+            redis_client.sadd(CLAVE_PENDIENTES, *ocupadas)
+
+
+def _volcar_publicacion(post_id):
+    """Apartar, escribir en Postgres y borrar lo apartado (con el bloqueo de la publicación)."""
+    # Se aparta el estado acumulado hasta ahora; los nuevos likes siguen
+    # llegando a claves limpias mientras se escribe en Postgres
+    redis_client.eval(
+        _LUA_APARTAR, 4,
+        CLAVE_ESTADO.format(post_id), CLAVE_DELTA.format(post_id),
+        CLAVE_VOLCANDO.format(post_id), CLAVE_DELTA_VOLCANDO.format(post_id)
+    )
+
+    estados = redis_client.hgetall(CLAVE_VOLCANDO.format(post_id))
+    try:
+        _escribir(post_id, {
+            int(usuario): valor in (b'1', '1') for usuario, valor in estados.items()
+        })
+    except Exception:
+        # Se reintentará en el siguiente volcado, junto con lo nuevo
+        db.session.rollback()
+        redis_client.sadd(CLAVE_PENDIENTES, post_id)
+        raise
+
+    redis_client.delete(CLAVE_VOLCANDO.format(post_id), CLAVE_DELTA_VOLCANDO.format(post_id))
+
+
+def _escribir(post_id, estados):
+    """Aplica los estados de un lote y ajusta el contador con lo que realmente cambió."""
+    dan_like = [u for u, valor in estados.items() if valor]
+    quitan_like = [u for u, valor in estados.items() if not valor]
+
+    insertados = 0
+    if dan_like:
+        insertados = db.session.execute(text("""
+            INSERT INTO likes (id_usuario, id_publicacion, fecha_creacion)
+            SELECT u, :post_id, now() AT TIME ZONE 'utc' FROM unnest(CAST(:usuarios AS int[])) AS u
+            WHERE EXISTS (SELECT 1 FROM publicaciones WHERE id = :post_id)
+            ON CONFLICT ON CONSTRAINT unique_like DO NOTHING
+        """), {'post_id': post_id, 'usuarios': dan_like}).rowcount
+
+    borrados = 0
+    if quitan_like:
+        borrados = db.session.execute(text("""
+            DELETE FROM likes WHERE id_publicacion = :post_id AND id_usuario = ANY(CAST(:usuarios AS int[]))
+        """), {'post_id': post_id, 'usuarios': quitan_like}).rowcount
+
+    if insertados or borrados:
+        db.session.execute(text("""
+            UPDATE publicaciones SET likes_count = greatest(likes_count + :delta, 0) WHERE id = :post_id
+        """), {'post_id': post_id, 'delta': insertados - borrados})
+    db.session.commit()
+
+
+def _volcar_lote(post_ids):
+    # El lote solo avisa de que hay likes en Redis: volcar() recorre el
+    # conjunto compartido de pendientes, también los de otros workers
+    volcar()
+
+
+_escritor = EscritorLotes("likes en Postgres", _volcar_lote, TAM_LOTE_VOLCADO, INTERVALO_VOLCADO)
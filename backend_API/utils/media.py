@@ -0,0 +1,108 @@
+import os
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from extensions import db
+from models import Blob
+from utils.storage import get_storage, hash_contenido, clave_de
+from utils.image_variants import ANCHOS, FORMATOS, nombre_variante, eliminar_variantes
+
+PREFIJO_URL = '/media/'
+
+
+def es_media(url):
+    return bool(url) and url.startswith(PREFIJO_URL)
+
+
+def guardar(datos, extension):
+    """
+    Guarda el contenido en el almacenamiento direccionado por contenido y
+    suma una referencia al blob en la transacción en curso. Devuelve la URL
+    relativa.
+    """
+    extension = 'jpg' if extension == 'jpeg' else extension
+    hash_ = hash_contenido(datos)
+
+    sentencia = insert(Blob).values(
+        hash=hash_, extension=extension, tamano=len(datos), referencias=1
+    )
+    extension = db.session.execute(
+        sentencia.on_conflict_do_update(
+            index_elements=[Blob.hash],
+            set_={'referencias': Blob.referencias + 1}
+        ).returning(Blob.extension)
+    ).scalar()
+
+    # Se escribe siempre: la clave depende del contenido y la escritura es
+    # atómica, y así un `liberar` concurrente nunca deja el blob sin fichero
+    nombre = f"{hash_}.{extension}"
+    get_storage().put(clave_de(nombre), datos)
+
+    return f"{PREFIJO_URL}{nombre}"
+
+
+def liberar(url):
+    """
+    Resta una referencia al blob y, si era la última, borra el fichero y sus
+    variantes. Se llama después de confirmar el borrado de quien lo usaba:
+    si algo falla, el blob sobra pero nunca se pierde uno en uso.
+    """
+    nombre = url[len(PREFIJO_URL):]
+    hash_ = nombre.split('.', 1)[0]
+
+    restantes = db.session.execute(
+        update(Blob)
+        .where(Blob.hash == hash_)
+        .values(referencias=Blob.referencias - 1)
+        .returning(Blob.referencias)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+    db.session.commit()
+    if restantes is None or restantes > 0:
+        return
+
+    # Borrado físico con la fila bloqueada: un `guardar` concurrente del mismo
+    # contenido espera a que termine y, si ya había sumado una referencia, no
+    # se borra nada
+    blob = db.session.execute(
+        select(Blob).where(Blob.hash == hash_).with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalar()
+    if blob is None or blob.referencias > 0:
+        db.session.commit()
+        return
+
+    try:
+        storage = get_storage()
+        storage.delete(clave_de(nombre))
+        for ancho in ANCHOS:
+            for ext in FORMATOS:
+                storage.delete(clave_de(nombre_variante(nombre, ancho, ext)))
+        db.session.delete(blob)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def liberar_imagen(url, carpeta_legada):
+    """
+    Libera la imagen de una entidad borrada o sustituida. Las imágenes
+    anteriores al almacenamiento por contenido se borran de `carpeta_legada`.
+    """
+    if not url:
+        return
+
+    try:
+        if es_media(url):
+            liberar(url)
+        else:
+            ruta = os.path.join(current_app.root_path, 'static', carpeta_legada, url.split('/')[-1])
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            eliminar_variantes(ruta)
+    except Exception as e:
+        print(f"Error al liberar imagen {url}: {e}")
@@ -0,0 +1,89 @@
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import update, tuple_, func
+
+from extensions import db
+from models import MensajeIndividual
+from utils.conversaciones import marcar_leida
+from utils.escritor_lotes import EscritorLotes
+from utils.realtime import emitir
+
+# Las confirmaciones se agrupan y se aplican con un UPDATE por tipo y lote
+TAM_LOTE = int(os.getenv("ACK_BATCH_SIZE", 500))
+INTERVALO = float(os.getenv("ACK_FLUSH_INTERVAL", 0.5))
+
+ENTREGADO = 'entregado'
+LEIDO = 'leido'
+
+
+def confirmar(app, user_id, ids, tipo):
+    """
+    Encola confirmaciones de entrega o lectura de mensajes recibidos por
+    `user_id`. Se aplican en segundo plano y se avisa a los emisores.
+    """
+    for id_mensaje in ids[:TAM_LOTE]:
+        try:
+            _escritor.encolar((tipo, user_id, int(id_mensaje)), app)
+        except (TypeError, ValueError):
+            continue
+
+
+def aplicar(lote):
+    """Aplica un lote de (tipo, user_id, id_mensaje) y notifica a los emisores."""
+    pares = {tipo: set() for tipo in (ENTREGADO, LEIDO)}
+    for tipo, user_id, id_mensaje in lote:
+        pares[tipo].add((id_mensaje, user_id))
+
+    ahora = datetime.utcnow()
+    cambios = {}
+
+    # Solo el receptor puede confirmar y cada estado se fija una única vez
+    if pares[ENTREGADO]:
+        cambios[ENTREGADO] = db.session.execute(
+            update(MensajeIndividual)
+            .where(
+                tuple_(MensajeIndividual.id, MensajeIndividual.id_receptor).in_(pares[ENTREGADO]),
+                MensajeIndividual.fecha_entrega.is_(None)
+            )
+            .values(fecha_entrega=ahora)
+            .returning(MensajeIndividual.id, MensajeIndividual.id_emisor, MensajeIndividual.id_receptor)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    if pares[LEIDO]:
+        cambios[LEIDO] = db.session.execute(
+            update(MensajeIndividual)
+            .where(
+                tuple_(MensajeIndividual.id, MensajeIndividual.id_receptor).in_(pares[LEIDO]),
+                MensajeIndividual.fecha_lectura.is_(None)
+            )
+            .values(
+                fecha_lectura=ahora,
+                fecha_entrega=func.coalesce(MensajeIndividual.fecha_entrega, ahora)
+            )
+            .returning(MensajeIndividual.id, MensajeIndividual.id_emisor, MensajeIndividual.id_receptor)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        # Leer una conversación deja a cero sus no leídos en la bandeja
+        for id_receptor, id_emisor in {(r, e) for _, e, r in cambios[LEIDO]}:
+            marcar_leida(id_receptor, id_emisor)
+
+    db.session.commit()
+
+    evento = {ENTREGADO: 'mensajes_entregados', LEIDO: 'mensajes_leidos'}
+    for tipo, filas in cambios.items():
+        por_emisor = defaultdict(list)
+        for id_mensaje, id_emisor, id_receptor in filas:
+            por_emisor[(id_emisor, id_receptor)].append(id_mensaje)
+        for (id_emisor, id_receptor), ids in por_emisor.items():
+            emitir(evento[tipo], {
+                'ids': ids,
+                'id_receptor': id_receptor,
+                'fecha': ahora.isoformat()
+            }, str(id_emisor))
+
+
+_escritor = EscritorLotes("confirmaciones de mensajes", aplicar, TAM_LOTE, INTERVALO)
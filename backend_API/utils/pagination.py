@@ -0,0 +1,29 @@
+import base64
+import binascii
+from datetime import datetime
+
+
+def leer_limite(valor, por_defecto=20, maximo=50):
+    """Convierte el parámetro `limit` en un entero acotado entre 1 y `maximo`."""
+    try:
+        limite = int(valor) if valor is not None else por_defecto
+    except (TypeError, ValueError):
+        limite = por_defecto
+    return max(1, min(limite, maximo))
+
+
+def codificar_cursor(fecha, id_):
+    """Cursor opaco para paginar por (fecha, id) en orden descendente."""
+    raw = f"{fecha.isoformat()}|{id_}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha, id) o lanza ValueError si el cursor no es válido."""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        fecha, id_ = raw.rsplit('|', 1)
+        return datetime.fromisoformat(fecha), int(id_)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Cursor no válido') from e
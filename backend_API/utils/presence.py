@@ -0,0 +1,105 @@
+import os
+import time
+
+from extensions import redis_client
+
+# Segundos que un dispositivo se considera conectado desde su último latido
+PRESENCIA_TTL = int(os.getenv("PRESENCE_TTL", 60))
+
+# ZSET por usuario: sid de cada dispositivo -> instante en que caduca
+CLAVE_PRESENCIA = 'presencia:{}'
+
+# Alternativa en memoria cuando Redis no está disponible (solo vale con un
+# único proceso)
+_local = {}
+
+
+def conectar(user_id, sid):
+    latido(user_id, sid)
+
+
+def latido(user_id, sid):
+    """Renueva la presencia de un dispositivo (sid) del usuario."""
+    caduca = time.time() + PRESENCIA_TTL
+
+    if redis_client is not None:
+        try:
+            clave = CLAVE_PRESENCIA.format(user_id)
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zadd(clave, {sid: caduca})
+            pipe.expire(clave, PRESENCIA_TTL)
+            pipe.execute()
+            return
+        except Exception as e:
+            print(f"Error registrando presencia: {e}")
+
+    _local.setdefault(user_id, {})[sid] = caduca
+
+
+def desconectar(user_id, sid):
+    if redis_client is not None:
+        try:
+            redis_client.zrem(CLAVE_PRESENCIA.format(user_id), sid)
+            return
+        except Exception as e:
+            print(f"Error eliminando presencia: {e}")
+
+    _local.get(user_id, {}).pop(sid, None)
+
+
+def en_linea_varios(user_ids):
+    """Subconjunto de `user_ids` con al menos un dispositivo conectado."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+
+    ahora = time.time()
+
+    if redis_client is not None:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id in user_ids:
+                clave = CLAVE_PRESENCIA.format(user_id)
+                pipe.zremrangebyscore(clave, '-inf', ahora)
+                pipe.zcard(clave)
+            resultados = pipe.execute()
+            # Cada usuario aporta dos resultados: (eliminados, dispositivos)
+            return {
+                user_id for user_id, dispositivos in zip(user_ids, resultados[1::2])
+                if dispositivos
+            }
+        except Exception as e:
+            print(f"Error consultando presencia: {e}")
+
+    en_linea = set()
+    for user_id in user_ids:
+        dispositivos = _local.get(user_id, {})
+        for sid in [sid for sid, caduca in dispositivos.items() if caduca <= ahora]:
+            del dispositivos[sid]
+        if dispositivos:
+            en_linea.add(user_id)
+    return en_linea
+
+
+def en_linea(user_id):
+    return user_id in en_linea_varios([user_id])
+
+
+def desconectado(user_id):
+    """
+    True solo si Redis confirma que el usuario no tiene dispositivos. La
+    presencia en memoria no ve las conexiones de otros procesos, así que sin
+    Redis (o si falla) la respuesta es False: puede que esté conectado.
+    """
+    if redis_client is None:
+        return False
+
+    clave = CLAVE_PRESENCIA.format(user_id)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(clave, '-inf', time.time())
+        pipe.zcard(clave)
+        return pipe.execute()[1] == 0
+    except Exception as e:
+        print(f"Error consultando presencia: {e}")
+        return False
@@ -0,0 +1,50 @@
+import json
+from collections import defaultdict
+
+from extensions import socketio
+
+# Métricas de este proceso: con varios workers cada uno cuenta lo que emite
+# a sus propios clientes
+_metricas = defaultdict(lambda: {"emisiones": 0, "destinatarios": 0, "bytes": 0})
+
+
+def sala_post(post_id):
+    return f"post_{post_id}"
+
+
+def _salas_locales(namespace="/"):
+    if socketio.server is None:
+        return {}
+    return socketio.server.manager.rooms.get(namespace, {})
+
+
+def emitir(evento, datos, sala, metrica=None):
+    """
+    Emite `evento` solo a los clientes de `sala` y anota cuántos bytes salen
+    (tamaño del JSON por número de destinatarios conectados a este proceso).
+    """
+    destinatarios = len(_salas_locales().get(sala, ()))
+    carga = len(json.dumps(datos, default=str, ensure_ascii=False).encode("utf-8"))
+
+    registro = _metricas[metrica or evento]
+    registro["emisiones"] += 1
+    registro["destinatarios"] += destinatarios
+    registro["bytes"] += carga * destinatarios
+
+    socketio.emit(evento, datos, to=sala)
+
+
+def estadisticas(top=20):
+    """Bytes emitidos por tipo de evento y tamaño de las salas de publicaciones más grandes."""
+    salas_post = {
+        sala: len(sids) for sala, sids in _salas_locales().items()
+        if sala and sala.startswith("post_")
+    }
+    mayores = sorted(salas_post.items(), key=lambda s: s[1], reverse=True)[:top]
+
+    return {
+        "eventos": dict(_metricas),
+        "salas_post": len(salas_post),
+        "suscripciones_post": sum(salas_post.values()),
+        "salas_post_mayores": dict(mayores),
+    }
@@ -0,0 +1,43 @@
+from extensions import db
+from models import Seguimiento, GrupoUsuario
+
+# Anotación en bloque de listados de usuarios y grupos con la relación del
+# usuario que los ve: una consulta IN por tipo, sea cual sea el tamaño de la
+# página (búsqueda, seguidores, miembros, sugerencias...)
+
+
+def seguimientos_hacia(viewer_id, ids_usuarios):
+    """{id_usuario: (tipo, estado)} de los seguimientos del viewer hacia esos usuarios."""
+    ids = {int(i) for i in ids_usuarios}
+    if not ids:
+        return {}
+
+    filas = db.session.query(Seguimiento.id_seguido, Seguimiento.tipo, Seguimiento.estado)\
+        .filter(Seguimiento.id_seguidor == viewer_id, Seguimiento.id_seguido.in_(ids))
+    return {id_seguido: (tipo, estado) for id_seguido, tipo, estado in filas}
+
+
+def grupos_del_usuario(viewer_id, ids_grupos):
+    """Subconjunto de `ids_grupos` a los que pertenece el viewer."""
+    ids = {int(i) for i in ids_grupos}
+    if not ids:
+        return set()
+
+    filas = db.session.query(GrupoUsuario.id_grupo)\
+        .filter(GrupoUsuario.id_usuario == viewer_id, GrupoUsuario.id_grupo.in_(ids))
+    return {id_grupo for id_grupo, in filas}
+
+
+def anotar(viewer_id, ids_usuarios=(), ids_grupos=()):
+    """Ambas anotaciones a la vez: como mucho dos consultas."""
+    return seguimientos_hacia(viewer_id, ids_usuarios), grupos_del_usuario(viewer_id, ids_grupos)
+
+
+def campos_relacion(seguimientos, user_id):
+    """Campos 'tipo', 'estado' y 'estado_seguidor' de un usuario del listado."""
+    tipo, estado = seguimientos.get(user_id, (None, None))
+    return {
+        'tipo': tipo,
+        'estado': estado,
+        'estado_seguidor': estado if tipo == 'seguidor' else None
+    }
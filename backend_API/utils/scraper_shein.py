@@ -17,36 +17,39 @@ class SheinScraper:
             "page_size": limit
         }
 
-    def fetch_products(self):
+    def fetch_products(self, session=None):
         try:
-            response = requests.get(self.base_url, headers=self.headers, params=self.params)
+            response = (session or requests).get(self.base_url, headers=self.headers, params=self.params,
+                                                 timeout=15)
             if response.status_code != 200:
                 print(f"Error {response.status_code} al obtener datos de SHEIN")
                 print("Contenido devuelto:", response.text[:300])
                 return []
 
-            data = response.json()
-            productos = []
-
-            for item in data.get("goods_list", []):
-                nombre = item.get("goods_name")
-                precio = item.get("retail_price")
-                imagen = item.get("goods_img")
-                enlace = "https://es.shein.com/" + item.get("goods_url", "")
-
-                productos.append({
-                    "nombre": nombre,
-                    "precio": f"{precio} €",
-                    "imagen": imagen,
-                    "enlace": enlace
-                })
-
-            return productos
+            return self.parse_products(response.json())
 
         except Exception as e:
             print("Excepción:", str(e))
             return []
 
+    def parse_products(self, data):
+        productos = []
+
+        for item in data.get("goods_list", []):
+            nombre = item.get("goods_name")
+            precio = item.get("retail_price")
+            imagen = item.get("goods_img")
+            enlace = "https://es.shein.com/" + item.get("goods_url", "")
+
+            productos.append({
+                "nombre": nombre,
+                "precio": f"{precio} €",
+                "imagen": imagen,
+                "enlace": enlace
+            })
+
+        return productos
+
     def to_dataframe(self, productos):
         return pd.DataFrame(productos)
 
@@ -55,6 +58,10 @@ class SheinScraper:
         df.to_excel(nombre_archivo, index=False, engine="openpyxl")
         print(f"Guardado en {nombre_archivo}")
 
+    def save_csv(self, productos, nombre_archivo="productos_shein.csv"):
+        self.to_dataframe(productos).to_csv(nombre_archivo, index=False)
+        print(f"Guardado en {nombre_archivo}")
+
 
 # ======================
 # EJEMPLO DE USO
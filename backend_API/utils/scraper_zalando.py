@@ -22,36 +22,39 @@ class ZalandoScraper:
             self.params["q"] = keyword
 
 
-    def fetch_products(self):
+    def fetch_products(self, session=None):
         try:
-            response = requests.get(self.base_url, headers=self.headers, params=self.params)
+            response = (session or requests).get(self.base_url, headers=self.headers, params=self.params,
+                                                 timeout=15)
             if response.status_code != 200:
                 print(f"Error {response.status_code} al obtener datos de Zalando")
                 print("Contenido devuelto:", response.text[:300])
                 return []
 
-            data = response.json()
-            productos = []
-
-            for item in data.get("articles", []):
-                nombre = item.get("name")
-                precio = item.get("price", {}).get("formatted")
-                imagen = item.get("media", {}).get("images", [{}])[0].get("smallUrl")
-                link = f"https://www.zalando.es{item.get('url')}"
-
-                productos.append({
-                    "nombre": nombre,
-                    "precio": precio,
-                    "imagen": imagen,
-                    "enlace": link
-                })
-
-            return productos
+            return self.parse_products(response.json())
 
         except Exception as e:
             print("Excepción capturada:", str(e))
             return []
 
+    def parse_products(self, data):
+        productos = []
+
+        for item in data.get("articles", []):
+            nombre = item.get("name")
+            precio = item.get("price", {}).get("formatted")
+            imagen = (item.get("media", {}).get("images") or [{}])[0].get("smallUrl")
+            link = f"https://www.zalando.es{item.get('url')}"
+
+            productos.append({
+                "nombre": nombre,
+                "precio": precio,
+                "imagen": imagen,
+                "enlace": link
+            })
+
+        return productos
+
     def to_dataframe(self, productos):
         return pd.DataFrame(productos)
 
@@ -60,6 +63,10 @@ class ZalandoScraper:
         df.to_excel(nombre_archivo, index=False, engine="openpyxl")
         print(f"Guardado en {nombre_archivo}")
 
+    def save_csv(self, productos, nombre_archivo="productos_zalando.csv"):
+        self.to_dataframe(productos).to_csv(nombre_archivo, index=False)
+        print(f"Guardado en {nombre_archivo}")
+
 
 
 # ======================
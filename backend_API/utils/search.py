@@ -0,0 +1,201 @@
+import os
+import time
+
+from sqlalchemy import case, func, or_
+
+from extensions import db
+from models import User, Grupo, GrupoUsuario
+from utils import grafo
+
+# 'trgm' usa los índices GIN de pg_trgm; 'memoria' un índice de trigramas
+# en el proceso (para tests o bases de datos sin la extensión). Por defecto
+# se elige según el motor de la base de datos.
+BACKEND = os.getenv("SEARCH_BACKEND")
+# Segundos que el índice en memoria se reutiliza antes de reconstruirse
+TTL_INDICE = float(os.getenv("SEARCH_INDEX_TTL", 30))
+# Similitud mínima para coincidencias aproximadas (la de pg_trgm por defecto)
+UMBRAL = 0.3
+
+# Pesos de la puntuación: coincidencia exacta, prefijo y cercanía al usuario
+PESO_EXACTO = 1.0
+PESO_PREFIJO = 0.5
+PESO_SUBCADENA = 0.25
+PESO_AMIGO = 0.3
+PESO_SEGUIDO = 0.2
+PESO_MIEMBRO = 0.3
+
+
+def _usa_trgm():
+    if BACKEND:
+        return BACKEND == 'trgm'
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _escapar(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _patron_prefijo(texto):
+    return f"{_escapar(texto)}%"
+
+
+def _patron_subcadena(texto):
+    return f"%{_escapar(texto)}%"
+
+
+def buscar_usuarios(texto, viewer_id, limite=20, offset=0):
+    """
+    Usuarios cuyo username empieza por `texto` o se le parece (tolera
+    erratas), ordenados por similitud y cercanía al usuario que busca.
+    Devuelve hasta `limite + 1` usuarios para saber si hay más páginas.
+    """
+    texto = texto.lower()
+    v = grafo.vecinos(viewer_id)
+
+    if not _usa_trgm():
+        def cercania(user_id):
+            if user_id in v.amigos:
+                return PESO_AMIGO
+            return PESO_SEGUIDO if user_id in v.seguidos else 0.0
+
+        ids = _indice_usuarios().buscar(texto, cercania, excluir={viewer_id})
+        pagina = ids[offset:offset + limite + 1]
+        usuarios = {u.id: u for u in User.query.filter(User.id.in_(pagina))} if pagina else {}
+        return [usuarios[i] for i in pagina if i in usuarios]
+
+    nombre = func.lower(User.username)
+    puntuacion = (
+        func.similarity(nombre, texto)
+        + case((nombre == texto, PESO_EXACTO), else_=0.0)
+        + case(
+            (nombre.like(_patron_prefijo(texto), escape='\\'), PESO_PREFIJO),
+            (nombre.like(_patron_subcadena(texto), escape='\\'), PESO_SUBCADENA),
+            else_=0.0
+        )
+        + case(
+            (User.id.in_(list(v.amigos)), PESO_AMIGO),
+            (User.id.in_(list(v.seguidos)), PESO_SEGUIDO),
+            else_=0.0
+        )
+    )
+
+    # Subcadena (incluye el prefijo) o parecido; ambas usan el índice GIN de
+    # trigramas sobre lower(username)
+    return User.query.filter(
+        or_(nombre.like(_patron_subcadena(texto), escape='\\'), nombre.op('%')(texto)),
+        User.id != viewer_id
+    ).order_by(puntuacion.desc(), func.length(User.username), User.id)\
+        .offset(offset).limit(limite + 1).all()
+
+
+def buscar_grupos(texto, viewer_id, limite=20, offset=0):
+    """Como `buscar_usuarios`, para grupos; los del usuario puntúan más."""
+    texto = texto.lower()
+
+    if not _usa_trgm():
+        mis_grupos = {
+            fila[0] for fila in db.session.query(GrupoUsuario.id_grupo)
+            .filter(GrupoUsuario.id_usuario == viewer_id)
+        }
+        ids = _indice_grupos().buscar(texto, lambda g: PESO_MIEMBRO if g in mis_grupos else 0.0)
+        pagina = ids[offset:offset + limite + 1]
+        grupos = {g.id: g for g in Grupo.query.filter(Grupo.id.in_(pagina))} if pagina else {}
+        return [grupos[i] for i in pagina if i in grupos]
+
+    nombre = func.lower(Grupo.nombre)
+    mis_grupos = db.session.query(GrupoUsuario.id_grupo)\
+        .filter(GrupoUsuario.id_usuario == viewer_id).scalar_subquery()
+    puntuacion = (
+        func.similarity(nombre, texto)
+        + case((nombre == texto, PESO_EXACTO), else_=0.0)
+        + case(
+            (nombre.like(_patron_prefijo(texto), escape='\\'), PESO_PREFIJO),
+            (nombre.like(_patron_subcadena(texto), escape='\\'), PESO_SUBCADENA),
+            else_=0.0
+        )
+        + case((Grupo.id.in_(mis_grupos), PESO_MIEMBRO), else_=0.0)
+    )
+
+    return Grupo.query.filter(
+        or_(nombre.like(_patron_subcadena(texto), escape='\\'), nombre.op('%')(texto))
+    ).order_by(puntuacion.desc(), func.length(Grupo.nombre), Grupo.id)\
+        .offset(offset).limit(limite + 1).all()
+
+
+def trigramas(texto):
+    """Trigramas de cada palabra al estilo de pg_trgm ('  ab' ... 'ab ')."""
+    resultado = set()
+    for palabra in texto.lower().split():
+        palabra = f"  {palabra} "
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return resultado
+
+
+class IndiceTrigramas:
+    """Índice invertido de trigramas en memoria para nombres cortos."""
+
+    def __init__(self, entradas):
+        self.nombres = {}
+        self.trigramas = {}
+        self.por_trigrama = {}
+        for id_, nombre in entradas:
+            nombre = nombre.lower()
+            self.nombres[id_] = nombre
+            self.trigramas[id_] = trigramas(nombre)
+            for t in self.trigramas[id_]:
+                self.por_trigrama.setdefault(t, set()).add(id_)
+        self.creado = time.monotonic()
+
+    def buscar(self, texto, cercania=lambda id_: 0.0, excluir=()):
+        """Ids ordenados por puntuación, con los mismos criterios que la búsqueda con pg_trgm."""
+        buscados = trigramas(texto)
+        candidatos = set()
+        for t in buscados:
+            candidatos |= self.por_trigrama.get(t, set())
+        # Subcadenas cortas (una o dos letras) no comparten trigramas completos
+        candidatos |= {id_ for id_, nombre in self.nombres.items() if texto in nombre}
+
+        puntuados = []
+        for id_ in candidatos - set(excluir):
+            nombre = self.nombres[id_]
+            propios = self.trigramas[id_]
+            union = len(buscados | propios)
+            similitud = len(buscados & propios) / union if union else 0.0
+            prefijo = nombre.startswith(texto)
+            subcadena = texto in nombre
+            if similitud < UMBRAL and not subcadena:
+                continue
+
+            puntuacion = similitud + cercania(id_)
+            if nombre == texto:
+                puntuacion += PESO_EXACTO
+            if prefijo:
+                puntuacion += PESO_PREFIJO
+            elif subcadena:
+                puntuacion += PESO_SUBCADENA
+            puntuados.append((-puntuacion, len(nombre), id_))
+
+        return [id_ for _, _, id_ in sorted(puntuados)]
+
+
+_indices = {}
+
+
+def _indice(clave, cargar):
+    indice = _indices.get(clave)
+    if indice is None or time.monotonic() - indice.creado > TTL_INDICE:
+        indice = _indices[clave] = IndiceTrigramas(cargar())
+    return indice
+
+
+def _indice_usuarios():
+    return _indice('usuarios', lambda: db.session.query(User.id, User.username).all())
+
+
+def _indice_grupos():
+    return _indice('grupos', lambda: db.session.query(Grupo.id, Grupo.nombre).all())
+
+
+def invalidar_indices():
+    """Fuerza la reconstrucción del índice en memoria (altas de usuarios o grupos)."""
+    _indices.clear()
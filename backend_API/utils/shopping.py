@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+import gevent
+import requests
+from gevent.event import AsyncResult
+from requests.adapters import HTTPAdapter
+
+from extensions import redis_client
+
+# Búsquedas de Google Shopping a través de SerpApi, cacheadas por consulta
+# normalizada. Pasado TTL se sirve el resultado antiguo mientras se refresca
+# en segundo plano; pasado TTL_MAX la entrada se descarta.
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+TTL = int(os.getenv("SHOPPING_CACHE_TTL", 3600))
+TTL_MAX = int(os.getenv("SHOPPING_CACHE_MAX_AGE", 86400))
+# Las respuestas vacías y los errores de SerpApi se recuerdan poco tiempo
+TTL_VACIO = int(os.getenv("SHOPPING_NEGATIVE_TTL", 60))
+TAM_LOCAL = int(os.getenv("SHOPPING_CACHE_SIZE", 1000))
+TIMEOUT = float(os.getenv("SERPAPI_TIMEOUT", 10))
+# Segundos que otro proceso espera a que termine la misma consulta
+ESPERA = float(os.getenv("SHOPPING_LOCK_WAIT", 10))
+
+CLAVE = 'shopping:{}'
+CLAVE_BLOQUEO = 'shopping:bloqueo:{}'
+
+_local = OrderedDict()
+_en_curso = {}
+
+# Conexiones reutilizadas con SerpApi entre peticiones
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=20))
+_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=20))
+
+
+def normalizar(consulta):
+    return ' '.join(consulta.lower().split())
+
+
+def _clave(consulta):
+    return hashlib.sha1(consulta.encode('utf-8')).hexdigest()
+
+
+def buscar(consulta):
+    """
+    Prendas de Google Shopping para `consulta`. Las consultas idénticas
+    concurrentes comparten una única llamada a SerpApi.
+    """
+    consulta = normalizar(consulta)
+    clave = _clave(consulta)
+
+    entrada = _leer(clave)
+    if entrada is not None:
+        if _caducada(entrada):
+            # Resultado caducado: se sirve igualmente y se refresca aparte
+            gevent.spawn(_refrescar, consulta, clave)
+        return entrada['prendas']
+
+    return _una_vez(consulta, clave)
+
+
+def _una_vez(consulta, clave):
+    """Single-flight: solo el primero que pide `clave` llama a SerpApi."""
+    pendiente = _en_curso.get(clave)
+    if pendiente is not None:
+        return pendiente.get()
+
+    pendiente = _en_curso[clave] = AsyncResult()
+    try:
+        prendas = _consultar_compartido(consulta, clave)
+        pendiente.set(prendas)
+        return prendas
+    except Exception as e:
+        pendiente.set_exception(e)
+        raise
+    finally:
+        del _en_curso[clave]
+
+
+def _refrescar(consulta, clave):
+    if clave in _en_curso:
+        return
+    try:
+        _una_vez(consulta, clave)
+    except Exception as e:
+        print(f"Error refrescando la búsqueda '{consulta}': {e}")
+
+
+def _caducada(entrada):
+    return time.time() - entrada['t'] > entrada.get('ttl', TTL)
+
+
+def _consultar_compartido(consulta, clave):
+    """Entre procesos, un bloqueo en Redis evita repetir la misma consulta."""
+    if redis_client is None:
+        return _consultar_y_guardar(consulta, clave)
+
+    bloqueo = CLAVE_BLOQUEO.format(clave)
+    try:
+        bloqueado = redis_client.set(bloqueo, 1, nx=True, ex=int(TIMEOUT) + 5)
+    except Exception as e:
+        print(f"Error con el bloqueo de Redis: {e}")
+        return _consultar_y_guardar(consulta, clave)
+
+    if bloqueado:
+        try:
+            return _consultar_y_guardar(consulta, clave)
+        finally:
+            try:
+                redis_client.delete(bloqueo)
+            except Exception:
+                pass
+
+    # Otro proceso ya la está pidiendo. Si hay un resultado antiguo se sirve
+    # ese; si no, se espera a que el otro proceso suelte el bloqueo
+    entrada = _leer(clave)
+    if entrada is not None:
+        return entrada['prendas']
+
+    limite = time.monotonic() + ESPERA
+    while time.monotonic() < limite:
+        gevent.sleep(0.1)
+        try:
+            if not redis_client.exists(bloqueo):
+                break
+        except Exception:
+            break
+
+    # Lo que haya dejado (también una respuesta vacía o un error recientes);
+    # solo si no dejó nada se consulta desde aquí
+    entrada = _leer(clave)
+    if entrada is not None:
+        return entrada['prendas']
+    return _consultar_y_guardar(consulta, clave)
+
+
+def _consultar_y_guardar(consulta, clave):
+    try:
+        prendas = consultar_serpapi(consulta)
+    except Exception:
+        # Un error se recuerda poco tiempo, sin pisar un resultado antiguo
+        anterior = _leer(clave)
+        if anterior is not None:
+            return anterior['prendas']
+        _guardar(clave, {'t': time.time(), 'prendas': [], 'ttl': TTL_VACIO})
+        raise
+
+    entrada = {'t': time.time(), 'prendas': prendas}
+    if not prendas:
+        # SerpApi puede no haber terminado todavía: se reintenta pronto
+        entrada['ttl'] = TTL_VACIO
+    _guardar(clave, entrada)
+    return prendas
+
+
+def consultar_serpapi(consulta):
+    params = {
+        "engine": "google",
+        "q": consulta,
+        "tbm": "shop",
+        "api_key": os.getenv('SERPAPI_KEY'),
+        "num": 30,
+        "async": "true"
+    }
+
+    response = _session.get(SERPAPI_URL, params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    productos = response.json().get("shopping_results", [])
+
+    return [{
+        "store": p.get("source", "Tienda"),
+        "product": p.get("title", "Producto"),
+        "price": p.get("price", "0 €"),
+        "imagen": p.get("thumbnail", ""),
+        "link": p.get("link") or p.get("product_link", "")
+    } for p in productos if p.get("link") or p.get("product_link")]
+
+
+def _leer(clave):
+    if redis_client is not None:
+        try:
+            datos = redis_client.get(CLAVE.format(clave))
+            if datos is not None:
+                return json.loads(datos)
+        except Exception as e:
+            print(f"Error leyendo la caché de búsquedas de Redis: {e}")
+
+    entrada = _local.get(clave)
+    if entrada is None:
+        return None
+    if time.time() - entrada['t'] > TTL_MAX:
+        del _local[clave]
+        return None
+    _local.move_to_end(clave)
+    return entrada
+
+
+def _guardar(clave, entrada):
+    if redis_client is not None:
+        try:
+            redis_client.setex(CLAVE.format(clave), TTL_MAX, json.dumps(entrada))
+            return
+        except Exception as e:
+            print(f"Error guardando la búsqueda en Redis: {e}")
+
+    _local[clave] = entrada
+    _local.move_to_end(clave)
+    while len(_local) > TAM_LOCAL:
+        _local.popitem(last=False)
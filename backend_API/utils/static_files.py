@@ -0,0 +1,63 @@
+import os
+
+from flask import current_app, send_file, abort, Response
+from werkzeug.security import safe_join
+
+from utils.storage import TIPOS_MIME
+from utils.image_variants import ruta_a_servir
+
+# Las imágenes subidas nunca cambian de contenido (nombres uuid o sha256)
+CACHE_INMUTABLE = 365 * 24 * 3600
+# Respuestas que pueden cambiar pronto (p. ej. la original servida en lugar
+# de una variante que aún se está generando)
+CACHE_PROVISIONAL = 60
+
+
+def enviar_imagen(carpeta, filename, etag=None, inmutable=True):
+    """
+    Sirve una imagen de `carpeta` con caché de larga duración, ETag, 304 y
+    rangos de bytes. Con STATIC_SENDFILE_MODE='nginx' solo se devuelve la
+    cabecera X-Accel-Redirect y nginx envía el fichero; con 'sendfile' se usa
+    X-Sendfile (Apache, lighttpd). `etag` permite fijar una ETag fuerte
+    propia (p. ej. el hash del contenido).
+    """
+    ruta = safe_join(carpeta, filename)
+    if ruta is None or not os.path.isfile(ruta):
+        abort(404)
+
+    extension = filename.rsplit('.', 1)[-1].lower()
+    mimetype = TIPOS_MIME.get(extension, 'application/octet-stream')
+    max_age = CACHE_INMUTABLE if inmutable else CACHE_PROVISIONAL
+
+    if current_app.config.get('STATIC_SENDFILE_MODE') == 'nginx':
+        respuesta = Response(mimetype=mimetype)
+        respuesta.headers['X-Accel-Redirect'] = _ruta_interna(ruta)
+        if etag:
+            respuesta.set_etag(etag)
+        respuesta.cache_control.public = True
+        respuesta.cache_control.max_age = max_age
+    else:
+        # send_file resuelve If-None-Match/If-Modified-Since y Range; con
+        # USE_X_SENDFILE delega el envío en el servidor web
+        respuesta = send_file(
+            ruta, mimetype=mimetype, conditional=True,
+            etag=etag if etag else True, max_age=max_age
+        )
+
+    respuesta.cache_control.immutable = inmutable
+    return respuesta
+
+
+def enviar_subida(carpeta, filename):
+    """Imagen de las carpetas de subidas; si falta la variante se sirve la original sin caché larga."""
+    nombre = ruta_a_servir(carpeta, filename)
+    return enviar_imagen(carpeta, nombre, inmutable=nombre == filename)
+
+
+def _ruta_interna(ruta):
+    # nginx debe tener una location interna (STATIC_ACCEL_PREFIX) con alias a
+    # la carpeta static de la aplicación
+    raiz = os.path.join(current_app.root_path, 'static')
+    relativa = os.path.relpath(ruta, raiz).replace(os.sep, '/')
+    prefijo = current_app.config.get('STATIC_ACCEL_PREFIX', '/protected').rstrip('/')
+    return f"{prefijo}/{relativa}"
@@ -0,0 +1,140 @@
+import hashlib
+import os
+
+# Almacenamiento de ficheros direccionado por contenido (sha256). Las claves
+# tienen la forma 'ab/cd/abcd...ef.jpg' para repartir los ficheros en
+# subdirectorios. Este módulo no depende de Flask para poder usarse también
+# desde el pool de procesos de imágenes.
+
+RAIZ_LOCAL = os.getenv(
+    "STORAGE_ROOT",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'media')
+)
+
+TIPOS_MIME = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+
+def hash_contenido(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def clave_de(nombre):
+    """'abcdef...jpg' o 'abcdef..._480.webp' -> 'ab/cd/<nombre>'"""
+    return f"{nombre[:2]}/{nombre[2:4]}/{nombre}"
+
+
+class StorageBackend:
+    """Interfaz común de los backends de almacenamiento."""
+
+    def put(self, clave, datos):
+        raise NotImplementedError
+
+    def get(self, clave):
+        raise NotImplementedError
+
+    def exists(self, clave):
+        raise NotImplementedError
+
+    def delete(self, clave):
+        raise NotImplementedError
+
+    def local_path(self, clave):
+        """Ruta en disco si el backend es local; None en otro caso."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, raiz=RAIZ_LOCAL):
+        self.raiz = raiz
+
+    def _ruta(self, clave):
+        return os.path.join(self.raiz, *clave.split('/'))
+
+    def put(self, clave, datos):
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: otro proceso nunca ve un fichero a medias
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+
+    def get(self, clave):
+        with open(self._ruta(clave), 'rb') as f:
+            return f.read()
+
+    def exists(self, clave):
+        return os.path.exists(self._ruta(clave))
+
+    def delete(self, clave):
+        ruta = self._ruta(clave)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    def local_path(self, clave):
+        return self._ruta(clave)
+
+
+class S3Storage(StorageBackend):
+    """
+    Backend para cualquier servicio compatible con S3 (AWS, MinIO...).
+    Acepta un cliente con la API de boto3 para poder usar un sustituto local.
+    """
+
+    def __init__(self, bucket, client=None, prefijo='', endpoint_url=None):
+        if client is None:
+            import boto3
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefijo = prefijo
+
+    def _clave(self, clave):
+        return f"{self.prefijo}{clave}"
+
+    def put(self, clave, datos):
+        extension = clave.rsplit('.', 1)[-1].lower()
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._clave(clave),
+            Body=datos,
+            ContentType=TIPOS_MIME.get(extension, 'application/octet-stream')
+        )
+
+    def get(self, clave):
+        respuesta = self.client.get_object(Bucket=self.bucket, Key=self._clave(clave))
+        return respuesta['Body'].read()
+
+    def exists(self, clave):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._clave(clave))
+            return True
+        except Exception:
+            return False
+
+    def delete(self, clave):
+        self.client.delete_object(Bucket=self.bucket, Key=self._clave(clave))
+
+
+_backend = None
+
+
+def get_storage():
+    """Backend configurado con STORAGE_BACKEND ('local' por defecto o 's3')."""
+    global _backend
+    if _backend is None:
+        if os.getenv("STORAGE_BACKEND", "local") == "s3":
+            _backend = S3Storage(
+                bucket=os.environ["S3_BUCKET"],
+                prefijo=os.getenv("S3_PREFIX", ""),
+                endpoint_url=os.getenv("S3_ENDPOINT_URL")
+            )
+        else:
+            _backend = LocalStorage()
+    return _backend
@@ -0,0 +1,145 @@
+from extensions import db, redis_client
+from models import Post, User
+from utils.feed import relaciones_del_usuario, consulta_feed
+from utils import grafo
+
+# Número máximo de publicaciones que se guardan por timeline en Redis
+TIMELINE_MAX = 500
+
+CLAVE_TIMELINE = 'timeline:{}'
+CLAVE_LISTO = 'timeline:{}:listo'
+
+
+def destinatarios(id_autor, visibilidad):
+    """Usuarios en cuyo feed debe aparecer una publicación del autor."""
+    if visibilidad not in ('publico', 'seguidores', 'amigos'):
+        return set()
+
+    v = grafo.vecinos(id_autor)
+    seguidores, amigos = set(v.seguidores), set(v.amigos)
+
+    if visibilidad == 'seguidores':
+        return seguidores
+    if visibilidad == 'amigos':
+        return amigos
+    return seguidores | amigos
+
+
+def publicar(post):
+    """Fan-out en escritura: añade la publicación a los timelines de sus lectores."""
+    if redis_client is None:
+        return
+
+    usuarios = destinatarios(post.id_usuario, post.visibilidad)
+    if not usuarios:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for usuario_id in usuarios:
+            clave = CLAVE_TIMELINE.format(usuario_id)
+            pipe.zadd(clave, {post.id: post.id})
+            pipe.zremrangebyrank(clave, 0, -(TIMELINE_MAX + 1))
+        pipe.execute()
+    except Exception as e:
+        print(f"Error publicando en timelines: {e}")
+
+
+def retirar(post):
+    """Elimina la publicación de los timelines donde se había repartido."""
+    if redis_client is None:
+        return
+
+    usuarios = destinatarios(post.id_usuario, post.visibilidad)
+    if not usuarios:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for usuario_id in usuarios:
+            pipe.zrem(CLAVE_TIMELINE.format(usuario_id), post.id)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error retirando de timelines: {e}")
+
+
+def leer(user_id, antes_de_id, limite):
+    """
+    Devuelve `(ids, frio)`. `ids` son hasta `limite + 1` publicaciones de más
+    reciente a más antigua, o None si hay que usar la consulta SQL: timeline
+    frío, Redis no disponible o página más allá de lo que guarda el timeline.
+    `frio` indica que el timeline no existe y conviene reconstruirlo.
+    """
+    if redis_client is None:
+        return None, False
+
+    clave = CLAVE_TIMELINE.format(user_id)
+    maximo = f"({antes_de_id}" if antes_de_id is not None else '+inf'
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.exists(CLAVE_LISTO.format(user_id))
+        pipe.zrevrangebyscore(clave, maximo, '-inf', start=0, num=limite + 1)
+        pipe.zcard(clave)
+        listo, ids, total = pipe.execute()
+    except Exception as e:
+        print(f"Error leyendo timeline: {e}")
+        return None, False
+
+    if not listo:
+        return None, True
+
+    # El timeline está recortado: las publicaciones más antiguas solo están en Postgres
+    if len(ids) <= limite and total >= TIMELINE_MAX:
+        return None, False
+
+    return [int(i) for i in ids], False
+
+
+def reconstruir(user_id, seguidos=None, amigos=None):
+    """Rellena el timeline de un usuario a partir de Postgres."""
+    if redis_client is None:
+        return
+
+    if seguidos is None or amigos is None:
+        seguidos, amigos, _ = relaciones_del_usuario(user_id)
+
+    ids = [fila[0] for fila in consulta_feed(seguidos, amigos)
+           .order_by(Post.fecha_publicacion.desc(), Post.id.desc())
+           .limit(TIMELINE_MAX)
+           .with_entities(Post.id)
+           .all()]
+
+    clave = CLAVE_TIMELINE.format(user_id)
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.delete(clave)
+        if ids:
+            pipe.zadd(clave, {post_id: post_id for post_id in ids})
+        pipe.set(CLAVE_LISTO.format(user_id), 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error reconstruyendo timeline: {e}")
+
+
+def reconstruir_todos():
+    """Rellena los timelines de todos los usuarios. Devuelve cuántos se procesaron."""
+    total = 0
+    for (user_id,) in db.session.query(User.id).order_by(User.id).all():
+        reconstruir(user_id)
+        total += 1
+    return total
+
+
+def invalidar(*user_ids):
+    """Marca los timelines como fríos tras un cambio en las relaciones."""
+    if redis_client is None:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.delete(CLAVE_TIMELINE.format(user_id), CLAVE_LISTO.format(user_id))
+        pipe.execute()
+    except Exception as e:
+        print(f"Error invalidando timelines: {e}")
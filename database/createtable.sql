@@ -1,3 +1,6 @@
+-- Similitud por trigramas para la búsqueda de usuarios y grupos
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Crear tipo ENUM para estaciones
 DO $$ BEGIN
     IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'estacion_enum') THEN
@@ -85,6 +88,11 @@ CREATE TABLE usuarios (
     reset_token_expiration TIMESTAMP,
     fecha_modificacion TIMESTAMP
 );
+-- Búsqueda de usuarios: prefijo (autocompletado) y similitud por trigramas
+CREATE INDEX ix_usuarios_username_trgm
+    ON usuarios USING gin (lower(username) gin_trgm_ops);
+CREATE INDEX ix_usuarios_username_prefijo
+    ON usuarios (lower(username) text_pattern_ops);
 
 -- Tabla categorias
 CREATE TABLE categorias (
@@ -105,7 +113,10 @@ CREATE TABLE prendas (
     fecha_agregado TIMESTAMP,
     fecha_modificacion TIMESTAMP,
     tipo tipo_prenda_enum NOT NULL DEFAULT 'Otro',
-    emocion emocion_enum NOT NULL DEFAULT 'neutro'
+    emocion emocion_enum NOT NULL DEFAULT 'neutro',
+    -- Estado del procesamiento en segundo plano de la imagen
+    estado_imagen VARCHAR(20) NOT NULL DEFAULT 'listo'
+        CHECK (estado_imagen IN ('procesando', 'listo', 'error'))
 );
 
 -- Tabla preferencias
@@ -123,8 +134,15 @@ CREATE TABLE publicaciones (
     imagen_url VARCHAR(255),
     fecha_publicacion TIMESTAMP,
     visibilidad VARCHAR(20) DEFAULT 'publico'
-        CHECK (visibilidad IN ('publico', 'privado', 'seguidores', 'amigos'))
+        CHECK (visibilidad IN ('publico', 'privado', 'seguidores', 'amigos')),
+    -- Contadores desnormalizados
+    likes_count INT NOT NULL DEFAULT 0,
+    comentarios_count INT NOT NULL DEFAULT 0,
+    guardados_count INT NOT NULL DEFAULT 0
 );
+-- Paginación por cursor del feed: (id_usuario, fecha_publicacion, id)
+CREATE INDEX ix_publicaciones_usuario_fecha
+    ON publicaciones (id_usuario, fecha_publicacion DESC, id DESC);
 
 -- Tabla comentarios
 CREATE TABLE comentarios (
@@ -134,6 +152,9 @@ CREATE TABLE comentarios (
     texto TEXT,
     fecha_comentario TIMESTAMP
 );
+-- Paginación por cursor de los comentarios de una publicación
+CREATE INDEX ix_comentarios_publicacion_fecha
+    ON comentarios (id_publicacion, fecha_comentario DESC, id DESC);
 
 -- Tabla mensajes
 CREATE TABLE mensajes_individuales (
@@ -142,8 +163,30 @@ CREATE TABLE mensajes_individuales (
     id_receptor INT REFERENCES usuarios(id) ON DELETE CASCADE,
     mensaje TEXT,
     id_publicacion INT REFERENCES publicaciones(id),
-    fecha_envio TIMESTAMP
+    fecha_envio TIMESTAMP,
+    -- Confirmaciones de entrega y lectura
+    fecha_entrega TIMESTAMP,
+    fecha_lectura TIMESTAMP
 );
+-- Historial de mensajes directos: ambos sentidos de la conversación en un solo rango del índice
+CREATE INDEX ix_mensajes_individuales_conversacion
+    ON mensajes_individuales (LEAST(id_emisor, id_receptor), GREATEST(id_emisor, id_receptor), fecha_envio DESC);
+
+-- Resumen de conversaciones directas para la bandeja de entrada
+CREATE TABLE conversaciones (
+    id_usuario_a INT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    id_usuario_b INT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    id_ultimo_mensaje INT REFERENCES mensajes_individuales(id) ON DELETE SET NULL,
+    id_emisor_ultimo INT,
+    ultimo_mensaje VARCHAR(200),
+    fecha_ultimo_mensaje TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    no_leidos_a INT NOT NULL DEFAULT 0,
+    no_leidos_b INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_usuario_a, id_usuario_b),
+    CONSTRAINT ck_conversaciones_par_ordenado CHECK (id_usuario_a < id_usuario_b)
+);
+CREATE INDEX ix_conversaciones_a_fecha ON conversaciones (id_usuario_a, fecha_ultimo_mensaje DESC);
+CREATE INDEX ix_conversaciones_b_fecha ON conversaciones (id_usuario_b, fecha_ultimo_mensaje DESC);
 
 -- Tabla grupos
 CREATE TABLE grupos (
@@ -153,6 +196,11 @@ CREATE TABLE grupos (
     creador INT REFERENCES usuarios(id) ON DELETE SET NULL,
     fecha_creacion TIMESTAMP
 );
+-- Búsqueda de grupos: prefijo y similitud por trigramas
+CREATE INDEX ix_grupos_nombre_trgm
+    ON grupos USING gin (lower(nombre) gin_trgm_ops);
+CREATE INDEX ix_grupos_nombre_prefijo
+    ON grupos (lower(nombre) text_pattern_ops);
 
 -- Tabla favoritos
 CREATE TABLE favoritos (
@@ -172,13 +220,17 @@ CREATE TABLE seguimientos (
     tipo VARCHAR(20),
     estado VARCHAR(20) DEFAULT 'pendiente' CHECK (estado IN ('pendiente', 'aceptada', 'rechazada'))
 );
+-- Solicitudes de seguimiento pendientes recibidas
+CREATE INDEX ix_seguimientos_seguido_estado
+    ON seguimientos (id_seguido, estado);
 
 -- Tabla likes
 CREATE TABLE likes (
     id SERIAL PRIMARY KEY,
     id_publicacion INT REFERENCES publicaciones(id) ON DELETE CASCADE,
     id_usuario INT REFERENCES usuarios(id) ON DELETE CASCADE,
-    fecha_creacion TIMESTAMP
+    fecha_creacion TIMESTAMP,
+    CONSTRAINT unique_like UNIQUE (id_usuario, id_publicacion)
 );
 
 -- Tabla grupo_usuarios
@@ -198,6 +250,9 @@ CREATE TABLE mensajes_grupo (
     mensaje TEXT,
     fecha_envio TIMESTAMP
 );
+-- Paginación por cursor del historial de cada grupo
+CREATE INDEX ix_mensajes_grupo_grupo_fecha
+    ON mensajes_grupo (id_grupo, fecha_envio DESC, id DESC);
 
 CREATE TABLE preferencias_color (
     id SERIAL PRIMARY KEY,
@@ -235,6 +290,32 @@ CREATE TABLE solicitudes_prenda (
     fecha_inicio TIMESTAMP,
     fecha_fin TIMESTAMP
 );
+-- Solicitudes de préstamo pendientes recibidas
+CREATE INDEX ix_solicitudes_prenda_prenda_estado
+    ON solicitudes_prenda (id_prenda, estado);
+
+-- Ficheros subidos direccionados por contenido (sha256) con contador de referencias
+CREATE TABLE blobs (
+    hash VARCHAR(64) PRIMARY KEY,
+    extension VARCHAR(10) NOT NULL,
+    tamano INTEGER NOT NULL,
+    referencias INTEGER NOT NULL DEFAULT 0,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Catálogo local de productos importado de los exports de los scrapers
+CREATE TABLE productos_catalogo (
+    id SERIAL PRIMARY KEY,
+    tienda VARCHAR(30) NOT NULL,
+    nombre VARCHAR(300) NOT NULL,
+    precio NUMERIC(10, 2),
+    precio_texto VARCHAR(50),
+    imagen TEXT,
+    enlace TEXT NOT NULL UNIQUE,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX ix_productos_catalogo_nombre
+    ON productos_catalogo USING gin (to_tsvector('simple', nombre));
 
 -- Tabla caracteristicas_publicacion
 CREATE TABLE caracteristicas_publicacion (
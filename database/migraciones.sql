@@ -0,0 +1,128 @@
+-- Cambios de esquema sobre bases de datos ya creadas con createtable.sql.
+-- Cada bloque es idempotente y puede ejecutarse más de una vez.
+
+-- Paginación por cursor del feed: (id_usuario, fecha_publicacion, id)
+CREATE INDEX IF NOT EXISTS ix_publicaciones_usuario_fecha
+    ON publicaciones (id_usuario, fecha_publicacion DESC, id DESC);
+
+-- Contadores desnormalizados en publicaciones
+ALTER TABLE publicaciones ADD COLUMN IF NOT EXISTS likes_count INT NOT NULL DEFAULT 0;
+ALTER TABLE publicaciones ADD COLUMN IF NOT EXISTS comentarios_count INT NOT NULL DEFAULT 0;
+ALTER TABLE publicaciones ADD COLUMN IF NOT EXISTS guardados_count INT NOT NULL DEFAULT 0;
+
+UPDATE publicaciones p SET
+    likes_count = (SELECT COUNT(*) FROM likes l WHERE l.id_publicacion = p.id),
+    comentarios_count = (SELECT COUNT(*) FROM comentarios c WHERE c.id_publicacion = p.id),
+    guardados_count = (SELECT COUNT(*) FROM favoritos f WHERE f.id_publicacion = p.id);
+
+-- Estado del procesamiento en segundo plano de la imagen de cada prenda
+ALTER TABLE prendas ADD COLUMN IF NOT EXISTS estado_imagen VARCHAR(20) NOT NULL DEFAULT 'listo'
+    CHECK (estado_imagen IN ('procesando', 'listo', 'error'));
+
+-- Ficheros subidos direccionados por contenido (sha256) con contador de referencias
+CREATE TABLE IF NOT EXISTS blobs (
+    hash VARCHAR(64) PRIMARY KEY,
+    extension VARCHAR(10) NOT NULL,
+    tamano INTEGER NOT NULL,
+    referencias INTEGER NOT NULL DEFAULT 0,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Paginación por cursor de los comentarios de una publicación
+CREATE INDEX IF NOT EXISTS ix_comentarios_publicacion_fecha
+    ON comentarios (id_publicacion, fecha_comentario DESC, id DESC);
+
+-- Historial de mensajes directos: ambos sentidos de la conversación en un solo rango del índice
+CREATE INDEX IF NOT EXISTS ix_mensajes_individuales_conversacion
+    ON mensajes_individuales (LEAST(id_emisor, id_receptor), GREATEST(id_emisor, id_receptor), fecha_envio DESC);
+
+-- Resumen de conversaciones directas para la bandeja de entrada
+CREATE TABLE IF NOT EXISTS conversaciones (
+    id_usuario_a INT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    id_usuario_b INT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    id_ultimo_mensaje INT REFERENCES mensajes_individuales(id) ON DELETE SET NULL,
+    id_emisor_ultimo INT,
+    ultimo_mensaje VARCHAR(200),
+    fecha_ultimo_mensaje TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    no_leidos_a INT NOT NULL DEFAULT 0,
+    no_leidos_b INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_usuario_a, id_usuario_b),
+    CONSTRAINT ck_conversaciones_par_ordenado CHECK (id_usuario_a < id_usuario_b)
+);
+CREATE INDEX IF NOT EXISTS ix_conversaciones_a_fecha ON conversaciones (id_usuario_a, fecha_ultimo_mensaje DESC);
+CREATE INDEX IF NOT EXISTS ix_conversaciones_b_fecha ON conversaciones (id_usuario_b, fecha_ultimo_mensaje DESC);
+
+-- Carga inicial con el último mensaje de cada par (los no leídos empiezan a cero)
+INSERT INTO conversaciones (id_usuario_a, id_usuario_b, id_ultimo_mensaje, id_emisor_ultimo,
+                            ultimo_mensaje, fecha_ultimo_mensaje)
+SELECT DISTINCT ON (LEAST(id_emisor, id_receptor), GREATEST(id_emisor, id_receptor))
+    LEAST(id_emisor, id_receptor),
+    GREATEST(id_emisor, id_receptor),
+    id,
+    id_emisor,
+    COALESCE(LEFT(mensaje, 200), CASE WHEN id_publicacion IS NOT NULL THEN 'Publicación compartida' ELSE '' END),
+    COALESCE(fecha_envio, CURRENT_TIMESTAMP)
+FROM mensajes_individuales
+WHERE id_emisor <> id_receptor
+ORDER BY LEAST(id_emisor, id_receptor), GREATEST(id_emisor, id_receptor), fecha_envio DESC, id DESC
+ON CONFLICT (id_usuario_a, id_usuario_b) DO NOTHING;
+
+-- Paginación por cursor del historial de cada grupo
+CREATE INDEX IF NOT EXISTS ix_mensajes_grupo_grupo_fecha
+    ON mensajes_grupo (id_grupo, fecha_envio DESC, id DESC);
+
+-- Confirmaciones de entrega y lectura de mensajes directos
+ALTER TABLE mensajes_individuales ADD COLUMN IF NOT EXISTS fecha_entrega TIMESTAMP;
+ALTER TABLE mensajes_individuales ADD COLUMN IF NOT EXISTS fecha_lectura TIMESTAMP;
+
+-- Solicitudes pendientes recibidas (seguimientos y préstamos de prendas)
+CREATE INDEX IF NOT EXISTS ix_solicitudes_prenda_prenda_estado
+    ON solicitudes_prenda (id_prenda, estado);
+CREATE INDEX IF NOT EXISTS ix_seguimientos_seguido_estado
+    ON seguimientos (id_seguido, estado);
+
+-- Búsqueda de usuarios y grupos: prefijo (autocompletado) y similitud por trigramas
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_usuarios_username_trgm
+    ON usuarios USING gin (lower(username) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_usuarios_username_prefijo
+    ON usuarios (lower(username) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_grupos_nombre_trgm
+    ON grupos USING gin (lower(nombre) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_grupos_nombre_prefijo
+    ON grupos (lower(nombre) text_pattern_ops);
+
+-- Catálogo local de productos importado de los exports de los scrapers
+CREATE TABLE IF NOT EXISTS productos_catalogo (
+    id SERIAL PRIMARY KEY,
+    tienda VARCHAR(30) NOT NULL,
+    nombre VARCHAR(300) NOT NULL,
+    precio NUMERIC(10, 2),
+    precio_texto VARCHAR(50),
+    imagen TEXT,
+    enlace TEXT NOT NULL UNIQUE,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_productos_catalogo_nombre
+    ON productos_catalogo USING gin (to_tsvector('simple', nombre));
+
+-- Un like por usuario y publicación (lo usan los ON CONFLICT de utils/likes.py):
+-- se borran los duplicados, conservando el más antiguo, y se recalcula el
+-- contador de las publicaciones afectadas antes de crear la restricción
+DO $$ BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_like') THEN
+        WITH borrados AS (
+            DELETE FROM likes l
+            USING likes otro
+            WHERE l.id_usuario = otro.id_usuario
+              AND l.id_publicacion = otro.id_publicacion
+              AND l.id > otro.id
+            RETURNING l.id_publicacion
+        )
+        UPDATE publicaciones p
+        SET likes_count = (SELECT COUNT(DISTINCT id_usuario) FROM likes l WHERE l.id_publicacion = p.id)
+        WHERE p.id IN (SELECT id_publicacion FROM borrados);
+
+        ALTER TABLE likes ADD CONSTRAINT unique_like UNIQUE (id_usuario, id_publicacion);
+    END IF;
+END $$;
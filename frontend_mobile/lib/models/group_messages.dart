@@ -19,14 +19,21 @@ class GroupMessage {
     this.publicacion,
   });
 
-  factory GroupMessage.fromJson(Map<String, dynamic> json) {
+  // En el historial paginado el autor llega en una tabla aparte (`autores`)
+  factory GroupMessage.fromJson(
+    Map<String, dynamic> json, [
+    Map<String, dynamic>? autores,
+  ]) {
     return GroupMessage(
       id: json['id'],
       idGrupo: json['id_grupo'],
       idUsuario: json['id_usuario'],
       mensaje: json['mensaje'],
       fechaEnvio: DateTime.parse(json['fecha_envio']),
-      autor: json['autor'] ?? 'Anónimo',
+      autor:
+          json['autor'] ??
+          autores?[json['id_usuario'].toString()]?['username'] ??
+          'Anónimo',
       publicacion:
           json['publicacion'] != null
               ? PostModel.fromJson(json['publicacion'])
@@ -1,3 +1,5 @@
+import 'dart:async';
+import 'package:shared_preferences/shared_preferences.dart';
 import 'package:socket_io_client/socket_io_client.dart' as IO;
 import '../env.dart';
 
@@ -8,6 +10,10 @@ class SocketService {
   late IO.Socket socket;
   bool _isConnected = false;
   int? _userId;
+  // Publicaciones cuyos comentarios se escuchan; se vuelven a suscribir al reconectar
+  final Set<int> _postsSuscritos = {};
+  // Latido periódico para que el servidor mantenga la presencia del dispositivo
+  Timer? _latido;
 
   Function(dynamic)? _onDirectMessage;
   Function(dynamic)? _onGroupMessage;
@@ -38,19 +44,36 @@ class SocketService {
 
     socket.connect();
 
-    socket.onConnect((_) {
+    socket.onConnect((_) async {
       print('🟢 Socket.IO conectado');
       _isConnected = true;
-      socket.emit('join', {'user_id': _userId});
+      // El servidor identifica al usuario por el JWT, no por su id
+      final prefs = await SharedPreferences.getInstance();
+      socket.emit('join', {
+        'user_id': _userId,
+        'token': prefs.getString('jwt_token'),
+      });
+      for (final postId in _postsSuscritos) {
+        socket.emit('suscribir_post', {'post_id': postId});
+      }
+      _latido?.cancel();
+      _latido = Timer.periodic(const Duration(seconds: 25), (_) {
+        socket.emit('latido');
+      });
     });
 
     socket.onDisconnect((_) {
       print('🔴 Socket.IO desconectado');
       _isConnected = false;
+      _latido?.cancel();
     });
 
     socket.on('nuevo_mensaje', (data) {
       print('📩 nuevo_mensaje: $data');
+      // Confirmación de entrega al emisor
+      socket.emit('mensajes_entregados', {
+        'ids': [data['id']],
+      });
       _onDirectMessage?.call(data);
     });
 
@@ -67,9 +90,21 @@ class SocketService {
   }
 
   void listenToComments(int postId, Function(dynamic) callback) {
+    _postsSuscritos.add(postId);
+    if (_isConnected) {
+      socket.emit('suscribir_post', {'post_id': postId});
+    }
     socket.on('nuevo_comentario_$postId', callback);
   }
 
+  void stopListeningToComments(int postId) {
+    _postsSuscritos.remove(postId);
+    if (_isConnected) {
+      socket.emit('desuscribir_post', {'post_id': postId});
+    }
+    socket.off('nuevo_comentario_$postId');
+  }
+
   void setCallbacks({
     Function(dynamic)? onDirectMessage,
     Function(dynamic)? onGroupMessage,
@@ -82,6 +117,7 @@ class SocketService {
     if (_isConnected) {
       socket.disconnect();
       _isConnected = false;
+      _latido?.cancel();
     }
     _onDirectMessage = null;
     _onGroupMessage = null;
@@ -91,6 +127,7 @@ class SocketService {
     if (_isConnected) {
       socket.dispose();
       _isConnected = false;
+      _latido?.cancel();
     }
     _onDirectMessage = null;
     _onGroupMessage = null;
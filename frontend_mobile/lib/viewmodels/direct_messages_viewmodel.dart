@@ -10,8 +10,13 @@ import '../services/http_auth_service.dart';
 class DirectMessagesViewModel extends ChangeNotifier {
   List<DirectMessage> mensajes = [];
   bool isLoading = false;
+  bool cargandoAnteriores = false;
   int? idUsuarioActual;
 
+  // Cursor de la página anterior (cabecera X-Next-Cursor); null si no hay más
+  String? _cursorAnteriores;
+  bool get hayAnteriores => _cursorAnteriores != null;
+
   bool _disposed = false;
 
   @override
@@ -62,6 +67,7 @@ class DirectMessagesViewModel extends ChangeNotifier {
         mensajes = List<DirectMessage>.from(
           data.map((e) => DirectMessage.fromJson(e)),
         );
+        _cursorAnteriores = res.headers['x-next-cursor'];
       }
     } catch (e) {
       print('Error al obtener mensajes: $e');
@@ -71,6 +77,38 @@ class DirectMessagesViewModel extends ChangeNotifier {
     notifyListeners();
   }
 
+  /// Carga la página de mensajes anterior a los ya mostrados y la antepone.
+  Future<void> cargarAnteriores(int otroUsuarioId) async {
+    if (_cursorAnteriores == null || cargandoAnteriores) return;
+
+    cargandoAnteriores = true;
+    notifyListeners();
+
+    final url = Uri.parse(
+      '$baseURL/mensajes/directo/$otroUsuarioId',
+    ).replace(queryParameters: {'before': _cursorAnteriores!});
+
+    try {
+      final res = await httpGetConAuth(url);
+
+      if (res.statusCode == 200) {
+        final data = jsonDecode(res.body);
+        mensajes = [
+          ...List<DirectMessage>.from(
+            data.map((e) => DirectMessage.fromJson(e)),
+          ),
+          ...mensajes,
+        ];
+        _cursorAnteriores = res.headers['x-next-cursor'];
+      }
+    } catch (e) {
+      print('Error al obtener mensajes anteriores: $e');
+    }
+
+    cargandoAnteriores = false;
+    notifyListeners();
+  }
+
   void initSocket() {
     print('initSocket llamado para usuario $idUsuarioActual o grupo ...');
     if (idUsuarioActual == null) return;
@@ -44,8 +44,9 @@ class GroupMessagesViewModel extends ChangeNotifier {
 
       if (res.statusCode == 200) {
         final data = jsonDecode(res.body);
+        final Map<String, dynamic> autores = data['autores'] ?? {};
         messages = List<GroupMessage>.from(
-          data.map((msg) => GroupMessage.fromJson(msg)),
+          data['mensajes'].map((msg) => GroupMessage.fromJson(msg, autores)),
         );
       } else {
         print("Error al cargar mensajes: ${res.body}");
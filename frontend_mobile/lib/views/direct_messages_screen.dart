@@ -15,6 +15,7 @@ class _DirectMessagesScreenState extends State<DirectMessagesScreen> {
   final TextEditingController _controller = TextEditingController();
   final ScrollController _scrollController = ScrollController();
   bool _hasNewMessages = false;
+  bool _cargandoAnteriores = false;
 
   void _scrollToBottom({bool animated = true}) {
     WidgetsBinding.instance.addPostFrameCallback((_) {
@@ -33,6 +34,33 @@ class _DirectMessagesScreenState extends State<DirectMessagesScreen> {
     });
   }
 
+  // Al llegar arriba del todo se pide la página anterior, conservando la
+  // posición visible
+  Future<void> _cargarAnterioresAlLlegarArriba() async {
+    final vm = Provider.of<DirectMessagesViewModel>(context, listen: false);
+    if (_cargandoAnteriores ||
+        !vm.hayAnteriores ||
+        _scrollController.position.pixels >
+            _scrollController.position.minScrollExtent + 50) {
+      return;
+    }
+
+    _cargandoAnteriores = true;
+    final extensionAntes = _scrollController.position.maxScrollExtent;
+    await vm.cargarAnteriores(widget.usuario.id);
+
+    WidgetsBinding.instance.addPostFrameCallback((_) {
+      if (_scrollController.hasClients) {
+        _scrollController.jumpTo(
+          _scrollController.position.pixels +
+              _scrollController.position.maxScrollExtent -
+              extensionAntes,
+        );
+      }
+      _cargandoAnteriores = false;
+    });
+  }
+
   @override
   void initState() {
     super.initState();
@@ -42,7 +70,10 @@ class _DirectMessagesScreenState extends State<DirectMessagesScreen> {
       _scrollToBottom(animated: false);
 
       vm.initSocket();
+      _scrollController.addListener(_cargarAnterioresAlLlegarArriba);
       vm.addListener(() {
+        // Al anteponer mensajes antiguos no se salta al final
+        if (_cargandoAnteriores) return;
         if (!_scrollController.hasClients ||
             _scrollController.position.pixels <
                 _scrollController.position.maxScrollExtent - 100) {
@@ -58,6 +89,7 @@ class _DirectMessagesScreenState extends State<DirectMessagesScreen> {
   void dispose() {
     final vm = Provider.of<DirectMessagesViewModel>(context, listen: false);
     vm.removeListener(_scrollToBottom);
+    _scrollController.removeListener(_cargarAnterioresAlLlegarArriba);
     _controller.dispose();
     _scrollController.dispose();
     super.dispose();